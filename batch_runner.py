@@ -0,0 +1,345 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import click
+from dotenv import load_dotenv
+
+from claude_client import AsyncClaudeClient, ClaudeTransport
+from json_extractor import extract_json
+from single_flight import get_single_flight
+from spec_pipeline import (
+    DISCOVERY_MAX_TOKENS,
+    SPEC_MAX_TOKENS,
+    build_spec_system_prompt,
+    generate_spec_candidates,
+    load_discovery_prompt,
+    parse_handoff,
+)
+
+load_dotenv()
+
+# Sent once the pre-supplied discovery answers run out
+AUTO_ANSWER = (
+    "I don't have more details to share. Please make reasonable, industry-standard "
+    "assumptions for anything still missing and output the Enhanced Use Case now."
+)
+
+
+class BatchRecordError(Exception):
+    """Raised when a single use case cannot be turned into a specification."""
+
+
+def read_usecases(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read use cases from a JSONL file.
+
+    Each line needs a use case text under "usecase" (or "body"/"text") and may
+    carry an "id" (or "request_id") and a list of discovery "answers".
+    Lines without an id are numbered by their position in the file.
+
+    Args:
+        path: Input JSONL file
+
+    Yields:
+        Records with "id", "usecase" and "answers" keys
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            raw = json.loads(line)
+            usecase = raw.get("usecase") or raw.get("body") or raw.get("text")
+            if not usecase:
+                raise click.ClickException(f"{path}:{line_no}: no use case text found")
+            yield {
+                "id": str(raw.get("id") or raw.get("request_id") or line_no),
+                "usecase": usecase,
+                "answers": list(raw.get("answers") or []),
+            }
+
+
+def load_checkpoint(path: str, retry_failed: bool = False) -> Set[str]:
+    """
+    Collect the ids already written to an output file.
+
+    Args:
+        path: Output JSONL file from a previous run
+        retry_failed: Only count successful records as done
+
+    Returns:
+        Ids to skip on resume
+    """
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash; the record is simply redone
+                continue
+            if retry_failed and record.get("status") != "ok":
+                continue
+            done.add(record["id"])
+    return done
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class BatchRunner:
+    """Headless discovery -> specification pipeline over many use cases."""
+
+    def __init__(
+        self,
+        output_path: str,
+        workers: int = 4,
+        max_concurrency: int = 8,
+        max_discovery_turns: int = 6,
+        timeout: Optional[float] = None,
+        candidates: int = 1,
+        candidate_deadline: float = 45.0,
+    ):
+        """
+        Initialize the batch runner.
+
+        Args:
+            output_path: JSONL file specs are appended to
+            workers: Number of use cases processed at the same time
+            max_concurrency: Maximum in-flight LLM requests across all workers
+            max_discovery_turns: Discovery replies allowed before giving up on a handoff
+            timeout: Per-call timeout in seconds
+            candidates: Specification candidates generated per use case;
+                the best-scoring one is kept
+            candidate_deadline: Seconds after which the first valid candidate is accepted
+        """
+        self.output_path = output_path
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.max_discovery_turns = max_discovery_turns
+        self.timeout = timeout
+        self.candidates = candidates
+        self.candidate_deadline = candidate_deadline
+
+        self.discovery_prompt = load_discovery_prompt()
+        self.transport: Optional[ClaudeTransport] = None
+        self.latencies: List[float] = []
+        self.counts = {"ok": 0, "error": 0, "skipped": 0, "llm_calls": 0}
+        # Replies continued past max_tokens, summed over every use case's client
+        self.continuations = {"continued_replies": 0, "continuations": 0, "continuation_s": 0.0, "truncated": 0}
+
+    async def _send(self, client: AsyncClaudeClient, message: str, system_prompt: Any, max_tokens: int) -> str:
+        """Send one turn; failures raise LLMError."""
+        self.counts["llm_calls"] += 1
+        return await client.send_message(message, system_prompt, max_tokens=max_tokens)
+
+    async def process(self, record: Dict[str, Any], semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        """
+        Run discovery and specification for one use case.
+
+        Mirrors StreamlitChatbot.handle_discovery_phase: discovery continues
+        until Claude hands off, answering follow-up questions from the record's
+        answers and then with AUTO_ANSWER.
+
+        Args:
+            record: Record from read_usecases
+            semaphore: Concurrency budget shared by all workers
+
+        Returns:
+            Output record for the JSONL file
+        """
+        started = time.perf_counter()
+        result: Dict[str, Any] = {"id": record["id"]}
+        client: Optional[AsyncClaudeClient] = None
+        try:
+            client = AsyncClaudeClient(
+                semaphore=semaphore, timeout=self.timeout, transport=self.transport
+            )
+            answers = list(record["answers"])
+
+            response = await self._send(client, record["usecase"], self.discovery_prompt, DISCOVERY_MAX_TOKENS)
+            turns = 1
+            enhanced_uc = parse_handoff(response)
+            while enhanced_uc is None:
+                if turns >= self.max_discovery_turns:
+                    raise BatchRecordError(f"no handoff after {turns} discovery turns")
+                answer = answers.pop(0) if answers else AUTO_ANSWER
+                response = await self._send(client, answer, self.discovery_prompt, DISCOVERY_MAX_TOKENS)
+                turns += 1
+                enhanced_uc = parse_handoff(response)
+
+            enhanced_uc_str = json.dumps(enhanced_uc, indent=4)
+            spec_system_prompt = build_spec_system_prompt(enhanced_uc_str)
+
+            # Clear client history for clean context, as the app does
+            client.clear_history()
+            if self.candidates > 1:
+                self.counts["llm_calls"] += self.candidates
+                selection = await generate_spec_candidates(
+                    client,
+                    enhanced_uc_str,
+                    spec_system_prompt,
+                    candidates=self.candidates,
+                    deadline=self.candidate_deadline,
+                )
+                if selection["response"] is None:
+                    raise BatchRecordError("no specification candidate succeeded")
+                spec_response = selection["response"]
+                spec_parsed = selection["spec"]
+                result["candidates"] = selection["scores"]
+                result["spec_errors"] = selection["score"]["errors"]
+            else:
+                spec_response = await self._send(client, enhanced_uc_str, spec_system_prompt, SPEC_MAX_TOKENS)
+                spec_parsed = extract_json(spec_response)
+
+            result.update(
+                {
+                    "status": "ok" if spec_parsed else "error",
+                    "discovery_turns": turns,
+                    "enhanced_usecase": enhanced_uc,
+                    "spec": spec_parsed,
+                }
+            )
+            if not spec_parsed:
+                result["error"] = "specification is not valid JSON"
+                result["raw_spec"] = spec_response
+        except Exception as e:
+            result.update({"status": "error", "error": str(e), "error_type": type(e).__name__})
+
+        if client is not None:
+            stats = client.continuation_stats
+            if stats["continuations"] or stats["truncated"]:
+                result.update(
+                    continuations=stats["continuations"],
+                    continuation_s=stats["continuation_s"],
+                    truncated=stats["truncated"],
+                )
+            for key, value in stats.items():
+                self.continuations[key] += value
+        result["latency_s"] = round(time.perf_counter() - started, 3)
+        return result
+
+    def _write(self, f, result: Dict[str, Any]) -> None:
+        """Append one result and make it durable before moving on."""
+        f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+        self.counts[result["status"]] += 1
+        self.latencies.append(result["latency_s"])
+
+    async def run(self, input_path: str, retry_failed: bool = False) -> Dict[str, Any]:
+        """
+        Process every use case in the input that is not already in the output.
+
+        Args:
+            input_path: Input JSONL file
+            retry_failed: Redo records that failed in a previous run
+
+        Returns:
+            Throughput and latency summary
+        """
+        done = load_checkpoint(self.output_path, retry_failed)
+        self.transport = ClaudeTransport(max_connections=self.max_concurrency)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(maxsize=self.workers * 2)
+        started = time.perf_counter()
+
+        # Terminate a line cut short by a crash so new records start cleanly
+        if os.path.exists(self.output_path) and os.path.getsize(self.output_path):
+            with open(self.output_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b"\n"
+        else:
+            needs_newline = False
+
+        with open(self.output_path, "a", encoding="utf-8") as out:
+            if needs_newline:
+                out.write("\n")
+
+            async def worker() -> None:
+                while True:
+                    record = await queue.get()
+                    if record is None:
+                        return
+                    result = await self.process(record, semaphore)
+                    self._write(out, result)
+                    print(f"[{result['status']}] {result['id']} in {result['latency_s']:.1f}s")
+
+            tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+            for record in read_usecases(input_path):
+                if record["id"] in done:
+                    self.counts["skipped"] += 1
+                    continue
+                await queue.put(record)
+            for _ in tasks:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+
+        return self.summary(time.perf_counter() - started)
+
+    def summary(self, wall_time: float) -> Dict[str, Any]:
+        """Build the end-of-run throughput and latency summary."""
+        processed = self.counts["ok"] + self.counts["error"]
+        return {
+            **self.counts,
+            "processed": processed,
+            "wall_time_s": round(wall_time, 3),
+            "throughput_per_min": round(processed / wall_time * 60, 2) if wall_time else 0.0,
+            "latency_p50_s": percentile(self.latencies, 50),
+            "latency_p95_s": percentile(self.latencies, 95),
+            "latency_p99_s": percentile(self.latencies, 99),
+            "latency_max_s": max(self.latencies, default=0.0),
+            **self.continuations,
+            "continuation_s": round(self.continuations["continuation_s"], 3),
+            "endpoints": self.transport.policy.get_stats() if self.transport is not None else {},
+            "single_flight": get_single_flight().get_stats(),
+        }
+
+
+@click.command()
+@click.argument("input_path", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output_path", type=click.Path(dir_okay=False))
+@click.option("--workers", default=4, show_default=True, help="Use cases processed concurrently.")
+@click.option("--max-concurrency", default=8, show_default=True, help="Maximum in-flight LLM requests.")
+@click.option("--max-discovery-turns", default=6, show_default=True, help="Discovery turns before giving up.")
+@click.option("--timeout", type=float, default=None, help="Per-call timeout in seconds.")
+@click.option("--candidates", default=1, show_default=True, help="Specification candidates per use case.")
+@click.option("--candidate-deadline", default=45.0, show_default=True, help="Seconds before the first valid candidate is accepted.")
+@click.option("--retry-failed", is_flag=True, help="Redo records that failed in a previous run.")
+@click.option("--summary-path", type=click.Path(dir_okay=False), default=None, help="Also write the summary as JSON.")
+def main(
+    input_path, output_path, workers, max_concurrency, max_discovery_turns, timeout,
+    candidates, candidate_deadline, retry_failed, summary_path,
+):
+    """Generate specifications for every use case in INPUT_PATH into OUTPUT_PATH."""
+    runner = BatchRunner(
+        output_path,
+        workers=workers,
+        max_concurrency=max_concurrency,
+        max_discovery_turns=max_discovery_turns,
+        timeout=timeout,
+        candidates=candidates,
+        candidate_deadline=candidate_deadline,
+    )
+    summary = asyncio.run(runner.run(input_path, retry_failed=retry_failed))
+
+    print(json.dumps(summary, indent=2))
+    if summary_path:
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""End-to-end load benchmark: N concurrent Streamlit sessions against local mocks.
+
+Each session drives StreamlitChatbot through streamlit.testing.v1.AppTest:
+the initial use case, discovery answers until the handoff and specification,
+then spec edits, optionally followed by Create App. The LLM is the local mock
+(synthetic, or a cassette recorded from the real model) and app authoring is
+the stub apps server, so no Vertex quota or apps-qa calls are used.
+
+Reports p50/p95/p99 turn latency per phase and the cost of an idle rerun
+(the script run that happens on every widget interaction) as history grows.
+
+    python -m benchmarks.bench_app_sessions --sessions 8 --edits 2
+    python -m benchmarks.bench_app_sessions --mode record --cassette runs.cassette.jsonl --sessions 1
+    python -m benchmarks.bench_app_sessions --mode replay --cassette runs.cassette.jsonl --sessions 16
+"""
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import click
+
+from batch_runner import percentile
+from benchmarks.mock_llm_server import make_server
+from benchmarks.stub_apps_server import StubAppsServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_ROOT, "streamlit_app.py")
+
+DISCOVERY_ANSWER = "It should speak Hindi and English. If someone else answers, ask for a callback time."
+EDIT_REQUEST = "Add a state that offers a payment link before ending the call."
+
+
+def run_session(
+    index: int,
+    usecase: str,
+    max_discovery_turns: int,
+    edits: int,
+    deploy: bool,
+    timeout: float,
+) -> Dict[str, Any]:
+    """
+    Drive one app session from first message to deployment.
+
+    Returns:
+        Per-turn latencies by phase, idle rerun costs and any errors
+    """
+    from streamlit.testing.v1 import AppTest
+
+    result: Dict[str, Any] = {"session": index, "turns": [], "reruns": [], "errors": []}
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    def idle_rerun() -> None:
+        started = time.perf_counter()
+        at.run()
+        result["reruns"].append(
+            {"history": len(at.session_state.chat_history), "s": time.perf_counter() - started}
+        )
+
+    def turn(phase: str, text: str) -> None:
+        started = time.perf_counter()
+        at.chat_input[0].set_value(text).run()
+        result["turns"].append({"phase": phase, "s": time.perf_counter() - started})
+        if at.exception:
+            result["errors"].extend(str(e.value) for e in at.exception)
+        idle_rerun()
+
+    try:
+        at.run()
+        turn("discovery", usecase)
+        turns = 1
+        while at.session_state.phase == "discovery" and turns < max_discovery_turns:
+            # The reply that carries the handoff also generates the spec
+            turn("discovery", DISCOVERY_ANSWER)
+            turns += 1
+        if at.session_state.phase != "specification":
+            result["errors"].append(f"no handoff after {turns} turns")
+            return result
+        # The handoff turn covers the handoff reply plus the full spec generation
+        result["turns"][-1]["phase"] = "handoff+spec"
+
+        for _ in range(edits):
+            turn("spec_edit", EDIT_REQUEST)
+
+        if deploy and at.session_state.spec_parsed:
+            at.text_input(key="app_name_input").set_value(f"bench-app-{index}").run()
+            started = time.perf_counter()
+            next(b for b in at.button if b.label == "Create App").click().run()
+            result["turns"].append({"phase": "deploy", "s": time.perf_counter() - started})
+    except Exception as e:
+        result["errors"].append(f"{type(e).__name__}: {e}")
+    return result
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "n": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 1),
+        "p95_ms": round(percentile(values, 95) * 1000, 1),
+        "p99_ms": round(percentile(values, 99) * 1000, 1),
+        "max_ms": round(max(values, default=0.0) * 1000, 1),
+    }
+
+
+@click.command()
+@click.option("--sessions", default=4, show_default=True, help="Concurrent app sessions.")
+@click.option("--max-discovery-turns", default=6, show_default=True)
+@click.option("--edits", default=2, show_default=True, help="Spec edit turns per session.")
+@click.option("--deploy/--no-deploy", default=True, show_default=True, help="Click Create App at the end.")
+@click.option("--mode", type=click.Choice(["synthetic", "replay", "record"]), default="synthetic", show_default=True)
+@click.option("--cassette", "cassette_path", type=click.Path(dir_okay=False), default=None)
+@click.option("--speed", default=1.0, show_default=True, help="Replay time scale (0 = no delays).")
+@click.option("--ttft", default=0.5, show_default=True, help="Synthetic time to first token.")
+@click.option("--tokens-per-second", default=80.0, show_default=True, help="Synthetic generation rate.")
+@click.option("--handoff-after", default=2, show_default=True, help="Synthetic discovery questions before the handoff.")
+@click.option("--apps-latency", default=0.05, show_default=True, help="Stub apps server latency in seconds.")
+@click.option("--timeout", default=300.0, show_default=True, help="AppTest timeout per script run.")
+@click.option("--report", type=click.Path(dir_okay=False), default=None, help="Also write the report as JSON.")
+def main(
+    sessions, max_discovery_turns, edits, deploy, mode, cassette_path, speed, ttft,
+    tokens_per_second, handoff_after, apps_latency, timeout, report,
+):
+    llm = make_server(
+        mode,
+        cassette_path,
+        ttft=ttft,
+        tokens_per_second=tokens_per_second,
+        handoff_after=handoff_after,
+        speed=speed,
+    ).start()
+    apps = StubAppsServer(latency=apps_latency).start()
+
+    # Read by ClaudeTransport and utils when the app script first imports them
+    os.environ.update(
+        {
+            "CLAUDE_PROVIDER": "openai",
+            "CLAUDE_API_BASE": llm.base_url,
+            "CLAUDE_MODEL": "mock-claude",
+            "APPS_BASE_URL": apps.base_url,
+            # Persist sessions like production, but not into the repo's database
+            "SESSION_DB_URL": f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'sessions.db')}",
+            # Every session sends the same use case; offering earlier results would skip discovery
+            "SIMILARITY_INDEX_PATH": "",
+        }
+    )
+    os.environ.pop("CLAUDE_RESPONSE_CACHE_PATH", None)
+
+    with open(os.path.join(REPO_ROOT, "initial_usecase.txt"), "r", encoding="utf-8") as f:
+        usecase = f.read().strip()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        results = list(
+            pool.map(
+                lambda i: run_session(i, usecase, max_discovery_turns, edits, deploy, timeout),
+                range(sessions),
+            )
+        )
+    wall = time.perf_counter() - started
+
+    turns = [t for r in results for t in r["turns"]]
+    reruns = [r for res in results for r in res["reruns"]]
+    phases = sorted({t["phase"] for t in turns})
+    summary = {
+        "sessions": sessions,
+        "mode": mode,
+        "wall_time_s": round(wall, 2),
+        "turn_latency": summarize([t["s"] for t in turns]),
+        "turn_latency_by_phase": {p: summarize([t["s"] for t in turns if t["phase"] == p]) for p in phases},
+        "rerun_cost": summarize([r["s"] for r in reruns]),
+        "rerun_cost_by_history": {
+            str(h): summarize([r["s"] for r in reruns if r["history"] == h])["p50_ms"]
+            for h in sorted({r["history"] for r in reruns})
+        },
+        "errors": [f"session {r['session']}: {e}" for r in results for e in r["errors"]],
+        "llm_server": dict(llm.counters),
+        "apps_server": dict(apps.counters),
+    }
+    if llm.cassette is not None:
+        summary["cassette"] = {"entries": len(llm.cassette), **llm.cassette.stats}
+
+    print(json.dumps(summary, indent=2))
+    if report:
+        with open(report, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Specifications cut off at max_tokens, with and without automatic continuation.
+
+Generates the mock LLM's specification with output limits below its size and
+reports, for each limit, how many replies parse as JSON, the continuation
+requests made and the latency they added. --max-continuations 0 shows the
+old behavior: every reply over the limit is broken half-JSON.
+
+    python -m benchmarks.bench_continuation --states 20 --max-tokens 1024 --max-tokens 4096
+"""
+import json
+import time
+from typing import Any, Dict, List
+
+import click
+
+from batch_runner import percentile
+from benchmarks.mock_llm_server import CHARS_PER_TOKEN, SPEC_MARKER, MockLLMServer, make_spec
+from claude_client import ClaudeClient, ClaudeTransport
+from json_extractor import extract_json
+from request_policy import Endpoint, RequestPolicy
+
+SYSTEM_PROMPT = f"Write the specification.\n\n{SPEC_MARKER}\n"
+
+
+def run_calls(transport: ClaudeTransport, calls: int, max_tokens: int, max_continuations: int, stream: bool) -> Dict[str, Any]:
+    latencies: List[float] = []
+    parsed = 0
+    client = ClaudeClient(transport=transport, max_continuations=max_continuations)
+    for i in range(calls):
+        client.clear_history()
+        started = time.perf_counter()
+        message = f"Use case #{i}"
+        if stream:
+            reply = "".join(client.stream_message(message, SYSTEM_PROMPT, use_cache=False, max_tokens=max_tokens))
+        else:
+            reply = client.send_message(message, SYSTEM_PROMPT, use_cache=False, max_tokens=max_tokens)
+        latencies.append(time.perf_counter() - started)
+        parsed += extract_json(reply) is not None
+
+    stats = client.continuation_stats
+    return {
+        "parsed": parsed,
+        "calls": calls,
+        "continuations": stats["continuations"],
+        "truncated": stats["truncated"],
+        "continuation_ms_per_call": round(stats["continuation_s"] / calls * 1000, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+    }
+
+
+@click.command()
+@click.option("--calls", default=20, show_default=True)
+@click.option("--states", default=20, show_default=True, help="States in the generated specification.")
+@click.option("--max-tokens", multiple=True, type=int, default=(1024, 2048, 8192), show_default=True)
+@click.option("--max-continuations", default=3, show_default=True)
+@click.option("--stream/--no-stream", default=True, show_default=True)
+@click.option("--ttft", default=0.3, show_default=True)
+@click.option("--tokens-per-second", default=2000.0, show_default=True)
+def main(calls, states, max_tokens, max_continuations, stream, ttft, tokens_per_second):
+    server = MockLLMServer(ttft=ttft, tokens_per_second=tokens_per_second, spec_states=states).start()
+    policy = RequestPolicy([Endpoint("mock-claude", api_base=server.base_url)], hedge_percentile=0)
+    transport = ClaudeTransport(provider="openai", api_key="unused", model="mock-claude", policy=policy)
+    spec_tokens = len(json.dumps(make_spec(states), indent=2)) // CHARS_PER_TOKEN
+
+    report: Dict[str, Any] = {"spec_tokens": spec_tokens}
+    for limit in max_tokens:
+        server.reset_counters()
+        report[str(limit)] = run_calls(transport, calls, limit, max_continuations, stream)
+        report[str(limit)]["requests"] = server.counters["requests"]
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
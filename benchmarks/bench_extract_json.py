@@ -0,0 +1,83 @@
+"""Micro-benchmark: json_extractor.extract_json vs the previous multi-pass extractor.
+
+    python -m benchmarks.bench_extract_json --repeat 200
+"""
+import json
+import re
+import timeit
+from typing import Optional
+
+import click
+
+from json_extractor import extract_json
+
+
+def legacy_extract_json(text: str) -> Optional[dict]:
+    """The extractor StreamlitChatbot used before json_extractor."""
+    try:
+        return json.loads(text)
+    except Exception:
+        pass
+
+    code_blocks = re.findall(r"```(?:json)?\s*([\s\S]*?)\s*```", text, flags=re.IGNORECASE)
+    for block in code_blocks:
+        try:
+            return json.loads(block)
+        except Exception:
+            continue
+
+    if "{" in text and "}" in text:
+        candidate = text[text.find("{") : text.rfind("}") + 1]
+        try:
+            return json.loads(candidate)
+        except Exception:
+            pass
+    return None
+
+
+def make_spec(states: int) -> dict:
+    return {
+        "overall_plan": {"overall_goal": "Collect overdue payments politely. {not a brace}"},
+        "agent_config": {
+            "global_prompt": "Be concise.\nNever share {{ account_number }}.",
+            "agent_variables": {
+                f"var_{i}": {"name": f"var_{i}", "value": "", "is_agent_updatable": True}
+                for i in range(states)
+            },
+            "states": {
+                f"state_{i}": {
+                    "name": f"state_{i}",
+                    "instructions": "Ask the user to confirm. If they say \"yes\", move on.\n" * 8,
+                }
+                for i in range(states)
+            },
+            "initial_state_name": "state_0",
+        },
+        "intro_message": "Hello, am I speaking with {{ user_name }}?",
+    }
+
+
+@click.command()
+@click.option("--repeat", default=200, show_default=True)
+@click.option("--states", default=12, show_default=True, help="States in the generated spec.")
+def main(repeat, states):
+    spec = json.dumps(make_spec(states), indent=2)
+    cases = {
+        "bare JSON": spec,
+        "fenced JSON": f"Here is the updated specification:\n\n```json\n{spec}\n```\n",
+        "prose + trailing brace": f"Sure! {spec}\n\nLet me know if the closing }} looks right.",
+        "no JSON": "Could you tell me which languages the bot should support? " * 40,
+    }
+
+    print(f"spec size: {len(spec)} chars, {repeat} runs per case")
+    print(f"{'case':<24}{'legacy us':>12}{'single-pass us':>16}{'legacy ok':>11}{'new ok':>8}")
+    for name, text in cases.items():
+        legacy = timeit.timeit(lambda: legacy_extract_json(text), number=repeat) / repeat * 1e6
+        new = timeit.timeit(lambda: extract_json(text), number=repeat) / repeat * 1e6
+        legacy_ok = legacy_extract_json(text) is not None
+        new_ok = extract_json(text) is not None
+        print(f"{name:<24}{legacy:>12.1f}{new:>16.1f}{str(legacy_ok):>11}{str(new_ok):>8}")
+
+
+if __name__ == "__main__":
+    main()
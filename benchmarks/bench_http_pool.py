@@ -0,0 +1,98 @@
+"""Compare per-call requests against the pooled app-authoring session in utils.py.
+
+Runs PUT /apps/{id} calls against a local stub server that injects 503s and
+slow responses, and reports connections opened, failures and latency
+percentiles for both clients.
+
+    python -m benchmarks.bench_http_pool --calls 200 --workers 8
+"""
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import click
+import requests
+
+from benchmarks.stub_apps_server import StubAppsServer
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_calls(call: Callable[[int], None], calls: int, workers: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    failures = 0
+
+    def timed(i: int) -> None:
+        nonlocal failures
+        started = time.perf_counter()
+        try:
+            call(i)
+        except Exception:
+            failures += 1
+        latencies.append(time.perf_counter() - started)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(timed, range(calls)))
+
+    return {
+        "failures": failures,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+@click.command()
+@click.option("--calls", default=200, show_default=True)
+@click.option("--workers", default=8, show_default=True)
+@click.option("--error-rate", default=0.05, show_default=True, help="Fraction of calls answered with 503.")
+@click.option("--slow-rate", default=0.02, show_default=True, help="Fraction of calls delayed by --slow-latency.")
+@click.option("--slow-latency", default=3.0, show_default=True)
+@click.option("--read-timeout", default=0.5, show_default=True, help="Read timeout for the pooled client.")
+def main(calls, workers, error_rate, slow_rate, slow_latency, read_timeout):
+    server = StubAppsServer(
+        error_rate=error_rate, slow_rate=slow_rate, slow_latency=slow_latency, seed=7
+    ).start()
+
+    # utils reads its configuration at import time
+    os.environ["APPS_BASE_URL"] = server.base_url
+    os.environ["APPS_READ_TIMEOUT"] = str(read_timeout)
+    os.environ["APPS_BACKOFF_FACTOR"] = "0.05"
+    os.environ["APPS_BACKOFF_JITTER"] = "0.05"
+    os.environ["APPS_POOL_SIZE"] = str(workers)
+    import utils
+
+    apps_url = f"{server.base_url}/api/app-authoring/orgs/{utils.org_id}/workspaces/{utils.workspace_id}/apps"
+
+    def baseline(i: int) -> None:
+        # The previous behaviour: a fresh login and a fresh connection per call
+        login = requests.post(f"{server.base_url}/api/auth/login", json={})
+        login.raise_for_status()
+        headers = {"authorization": "Bearer " + login.json()["access_token"]}
+        response = requests.put(f"{apps_url}/app-{i}", headers=headers, json={"app_name": f"app-{i}"})
+        response.raise_for_status()
+
+    def pooled(i: int) -> None:
+        utils._send_authorized("PUT", f"{apps_url}/app-{i}", {"app_name": f"app-{i}"})
+
+    for name, call in (("baseline", baseline), ("pooled", pooled)):
+        server.reset_counters()
+        result = run_calls(call, calls, workers)
+        print(
+            f"{name:>8}: connections={server.counters['connections']:<4} "
+            f"logins={server.counters['logins']:<4} failures={result['failures']:<3} "
+            f"p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms max={result['max_ms']:.1f}ms"
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Import-time budget check for the app's modules, using `python -X importtime`.
+
+    python -m benchmarks.bench_import_time --budget-ms 300
+
+Each module is imported in a fresh interpreter, and so are together the repo
+modules streamlit_app imports at the top (streamlit_app itself needs a
+Streamlit runtime). The run fails if a module takes longer than the budget or
+eagerly imports one of the heavy dependencies that are meant to load on first
+use.
+"""
+import ast
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+import click
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    "claude_client",
+    "utils",
+    "spec_pipeline",
+    "json_extractor",
+    "prompt_templates",
+    "history_manager",
+    "session_store",
+    "similarity_index",
+    "spec_validation",
+    "telemetry",
+    "single_flight",
+]
+
+# Loaded on first request / first deploy, or only when the feature is enabled,
+# never at import
+LAZY_DEPENDENCIES = [
+    "litellm",
+    "httpx",
+    "requests",
+    "pydantic",
+    "sarvam_agents_sdk",
+    "sarvam_datatypes",
+    "sqlalchemy",
+    "numpy",
+]
+
+# Optional features whose own module is the place the dependency loads;
+# the app imports these modules only when the feature is configured
+OWN_DEPENDENCIES = {"session_store": ["sqlalchemy"], "similarity_index": ["numpy"]}
+
+APP_MODULE = "streamlit_app"
+
+
+def app_imports() -> List[str]:
+    """Repo modules streamlit_app imports at module level."""
+    with open(os.path.join(REPO_ROOT, f"{APP_MODULE}.py"), "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            root = name.split(".")[0]
+            if os.path.exists(os.path.join(REPO_ROOT, f"{root}.py")) and root not in modules:
+                modules.append(root)
+    return modules
+
+
+def measure(modules: List[str]) -> Tuple[int, Dict[str, int], str]:
+    """
+    Import modules together in a fresh interpreter.
+
+    Args:
+        modules: Module names
+
+    Returns:
+        (cumulative import time of the modules in microseconds,
+         cumulative time per top-level package, error output if the import failed)
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    packages: Dict[str, int] = {}
+    pending: Dict[str, int] = {}
+    total = 0
+    error_lines: List[str] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            error_lines.append(line)
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        cumulative = int(fields[1])
+        name = fields[2].rstrip()
+        stripped = name.strip()
+        if name == f" {stripped}":
+            # A top-level import finished; only the modules' own subtrees count
+            if stripped in modules:
+                total += cumulative
+                for package, us in pending.items():
+                    packages[package] = max(packages.get(package, 0), us)
+            pending.clear()
+            continue
+        package = stripped.split(".")[0]
+        # Keep the outermost entry of each package, which carries its full cost
+        pending[package] = max(pending.get(package, 0), cumulative)
+    error = "\n".join(error_lines[-3:]) if proc.returncode else ""
+    return total, packages, error
+
+
+@click.command()
+@click.option("--budget-ms", default=300.0, show_default=True, help="Maximum cumulative import time per module.")
+@click.option("--top", default=5, show_default=True, help="Heaviest packages listed per module.")
+@click.option("--module", "modules", multiple=True, help="Module to check (repeatable). Defaults to the app's modules.")
+def main(budget_ms, top, modules):
+    failures = []
+    checks = [(module, [module]) for module in modules or MODULES]
+    if not modules:
+        checks.append((f"{APP_MODULE} imports", app_imports()))
+    for module, imported in checks:
+        total, packages, error = measure(imported)
+        if error:
+            print(f"{module:<18} import failed:\n{error}")
+            failures.append(f"{module}: import failed")
+            continue
+
+        allowed = OWN_DEPENDENCIES.get(module, [])
+        eager = [dep for dep in LAZY_DEPENDENCIES if dep in packages and dep not in allowed]
+        status = "ok"
+        if total / 1000 > budget_ms:
+            status = "OVER BUDGET"
+            failures.append(f"{module}: {total / 1000:.1f} ms > {budget_ms:.0f} ms")
+        if eager:
+            status = "EAGER IMPORT"
+            failures.append(f"{module}: imports {', '.join(eager)} at import time")
+
+        heaviest = sorted(
+            packages.items(),
+            key=lambda item: item[1],
+            reverse=True,
+        )[:top]
+        print(f"{module:<18}{total / 1000:>9.1f} ms  {status}")
+        for name, us in heaviest:
+            print(f"    {name:<24}{us / 1000:>9.1f} ms")
+
+    if failures:
+        print("\nImport budget check failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print(f"\nAll modules within {budget_ms:.0f} ms and no eager heavy imports.")
+
+
+if __name__ == "__main__":
+    main()
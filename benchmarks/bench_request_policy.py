@@ -0,0 +1,90 @@
+"""Tail latency and failures with and without the request policy's hedging and failover.
+
+Starts two mock LLM endpoints: a primary that answers some requests with 503
+or a very slow first token, and a healthy secondary. The same streamed calls
+are run against the primary alone and against both with hedging, and the
+report compares time to first token, failures by exception type and the
+policy's per-endpoint counters (hedges, wins, circuit state).
+
+    python -m benchmarks.bench_request_policy --calls 200 --workers 8 --slow-rate 0.05 --error-rate 0.05
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import click
+
+from batch_runner import percentile
+from benchmarks.mock_llm_server import MockLLMServer
+from claude_client import ClaudeClient, ClaudeTransport
+from request_policy import Endpoint, RequestPolicy
+
+MESSAGE = "Quick check: reply with a short greeting."
+
+
+def run_calls(transport: ClaudeTransport, calls: int, workers: int) -> Dict[str, Any]:
+    ttfts: List[float] = []
+    totals: List[float] = []
+    failures: Dict[str, int] = {}
+
+    def one(i: int) -> None:
+        client = ClaudeClient(transport=transport)
+        started = time.perf_counter()
+        first = None
+        try:
+            for _ in client.stream_message(f"{MESSAGE} #{i}", use_cache=False):
+                if first is None:
+                    first = time.perf_counter() - started
+        except Exception as e:
+            failures[type(e).__name__] = failures.get(type(e).__name__, 0) + 1
+            return
+        ttfts.append(first or 0.0)
+        totals.append(time.perf_counter() - started)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(one, range(calls)))
+
+    def summarize(values: List[float]) -> Dict[str, float]:
+        return {f"p{p}_ms": round(percentile(values, p) * 1000, 1) for p in (50, 95, 99)}
+
+    return {
+        "ok": len(totals),
+        "failures": failures,
+        "ttft": summarize(ttfts),
+        "total": summarize(totals),
+        "endpoints": transport.policy.get_stats(),
+    }
+
+
+@click.command()
+@click.option("--calls", default=200, show_default=True)
+@click.option("--workers", default=8, show_default=True)
+@click.option("--ttft", default=0.3, show_default=True, help="Normal time to first token.")
+@click.option("--slow-rate", default=0.05, show_default=True, help="Primary: fraction of slow first tokens.")
+@click.option("--slow-ttft", default=5.0, show_default=True, help="Primary: time to first token of a slow request.")
+@click.option("--error-rate", default=0.05, show_default=True, help="Primary: fraction of 503s.")
+@click.option("--hedge-percentile", default=95.0, show_default=True)
+@click.option("--timeout", default=30.0, show_default=True, help="Policy timeout in seconds.")
+def main(calls, workers, ttft, slow_rate, slow_ttft, error_rate, hedge_percentile, timeout):
+    options = {"ttft": ttft, "tokens_per_second": 400.0}
+    primary = MockLLMServer(slow_rate=slow_rate, slow_ttft=slow_ttft, error_rate=error_rate, **options).start()
+    secondary = MockLLMServer(**options).start()
+    endpoints = [Endpoint("mock-claude", api_base=primary.base_url), Endpoint("mock-claude", api_base=secondary.base_url)]
+
+    report = {}
+    for name, policy in (
+        ("single", RequestPolicy(endpoints[:1], hedge_percentile=0, timeout=timeout)),
+        ("hedged", RequestPolicy(endpoints, hedge_percentile=hedge_percentile, timeout=timeout)),
+    ):
+        transport = ClaudeTransport(provider="openai", api_key="unused", model="mock-claude", policy=policy)
+        primary.reset_counters()
+        secondary.reset_counters()
+        report[name] = run_calls(transport, calls, workers)
+        report[name]["servers"] = {"primary": dict(primary.counters), "secondary": dict(secondary.counters)}
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
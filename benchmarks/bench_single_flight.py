@@ -0,0 +1,75 @@
+"""Requests sent for repeated deploys with and without single-flight de-duplication.
+
+Simulates double clicks and reruns: for each of --apps apps, --duplicates
+identical PUTs are fired at the stub apps server within --spread seconds.
+Reports the requests the server saw and the callers' latency, first sending
+every PUT and then sending them through a SingleFlight as utils.update_app does.
+
+    python -m benchmarks.bench_single_flight --apps 50 --duplicates 3 --latency 0.3
+"""
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+import click
+
+from batch_runner import percentile
+from benchmarks.stub_apps_server import StubAppsServer
+from single_flight import SingleFlight
+
+
+def run_bursts(call: Callable[[int], None], apps: int, duplicates: int, spread: float, workers: int) -> List[float]:
+    latencies: List[float] = []
+
+    def click(job: int) -> None:
+        # Duplicates of one app arrive within the spread, like a double click
+        time.sleep(random.uniform(0, spread))
+        started = time.perf_counter()
+        call(job // duplicates)
+        latencies.append(time.perf_counter() - started)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(click, range(apps * duplicates)))
+    return latencies
+
+
+@click.command()
+@click.option("--apps", default=50, show_default=True)
+@click.option("--duplicates", default=3, show_default=True, help="Identical calls per app.")
+@click.option("--spread", default=0.2, show_default=True, help="Seconds over which an app's duplicates arrive.")
+@click.option("--latency", default=0.3, show_default=True, help="Server latency per request.")
+@click.option("--workers", default=16, show_default=True)
+def main(apps, duplicates, spread, latency, workers):
+    server = StubAppsServer(latency=latency, seed=7).start()
+    # utils reads its configuration at import time
+    os.environ["APPS_BASE_URL"] = server.base_url
+    os.environ["APPS_POOL_SIZE"] = str(workers)
+    import utils
+
+    apps_url = f"{server.base_url}/api/app-authoring/orgs/{utils.org_id}/workspaces/{utils.workspace_id}/apps"
+    utils.get_token()
+
+    def put(app: int) -> None:
+        utils._send_authorized("PUT", f"{apps_url}/app-{app}", {"app_name": f"app-{app}"})
+
+    flight = SingleFlight()
+
+    def coalesced(app: int) -> None:
+        flight.run("update_app", {"app": app}, lambda: put(app))
+
+    for name, call in (("direct", put), ("single-flight", coalesced)):
+        server.reset_counters()
+        latencies = run_bursts(call, apps, duplicates, spread, workers)
+        print(
+            f"{name:>13}: requests={server.counters['requests']:<5} "
+            f"p50={percentile(latencies, 50) * 1000:.1f}ms p99={percentile(latencies, 99) * 1000:.1f}ms"
+        )
+    print(flight.get_stats())
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Record/replay cassettes of LLM exchanges for the benchmark mock LLM server.
+
+A cassette is a JSONL file with one recorded completion per line. Requests are
+matched on their message text only, so cache_control blocks, sampling
+parameters and the model name do not change the key.
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+
+def message_text(content: Any) -> str:
+    """Flatten OpenAI-style message content (a string or a list of parts) to text."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return ""
+
+
+def request_key(messages: List[Dict[str, Any]]) -> str:
+    """Stable key for a chat request."""
+    normalized = [[m.get("role"), message_text(m.get("content"))] for m in messages]
+    return hashlib.sha256(json.dumps(normalized, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """Thread-safe, append-only store of recorded completions."""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Cassette JSONL file; loaded if it exists
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a recorded completion.
+
+        Returns:
+            Entry with "response", "finish_reason", "usage", "ttft_s" and
+            "duration_s", or None
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            self.stats["hits" if entry is not None else "misses"] += 1
+        return entry
+
+    def record(self, key: str, **entry: Any) -> None:
+        """Store a completion and append it to the file."""
+        entry = {"key": key, **entry}
+        with self._lock:
+            self.entries[key] = entry
+            self.stats["recorded"] += 1
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,466 @@
+"""Local OpenAI-compatible stand-in for Claude, for benchmarks and load tests.
+
+Point ClaudeClient at it with
+
+    CLAUDE_PROVIDER=openai CLAUDE_API_BASE=http://127.0.0.1:8001/v1 streamlit run streamlit_app.py
+    python -m benchmarks.mock_llm_server --port 8001 --ttft 0.8 --tokens-per-second 60
+
+Modes:
+    synthetic  canned discovery questions, a handoff after --handoff-after
+               user turns and a generated specification
+    replay     answers from a cassette with the recorded timing
+               (synthetic answers for requests not in the cassette unless --strict)
+    record     forwards to the real model through ClaudeTransport and records
+               every exchange in the cassette
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import click
+
+from benchmarks.cassette import Cassette, message_text, request_key
+from history_manager import SUMMARY_PROMPT
+
+# Markers that identify which of the app's system prompts a request carries
+DISCOVERY_MARKER = "Use Case Analysis Agent"
+SPEC_MARKER = "**Use Case Details:**"
+EDIT_MARKER = "**Edit Mode:**"
+
+CHARS_PER_TOKEN = 4
+
+
+def make_spec(states: int = 6, revision: int = 0) -> Dict[str, Any]:
+    """Build a structurally valid specification with a linear flow of states."""
+    names = [f"Step{i}" for i in range(states)]
+    spec_states = {}
+    for i, name in enumerate(names):
+        instructions = [
+            f"Greet the user and explain the purpose of step {i} in one sentence.",
+            f"If the user asks an unrelated question, answer briefly and return to step {i}.",
+            "If the user asks to talk later then transition to state:CallRescheduling",
+        ]
+        next_states = ["CallRescheduling"]
+        if i + 1 < states:
+            instructions.append(f"Once the user confirms, update variable:step_{i} to 'done' and transition to state:{names[i + 1]}")
+            next_states.insert(0, names[i + 1])
+        else:
+            instructions.append("Once the user confirms, thank the user and politely end the conversation.")
+        spec_states[name] = {"name": name, "instructions": "\n".join(instructions), "next_states": next_states}
+    spec_states["CallRescheduling"] = {
+        "name": "CallRescheduling",
+        "instructions": "Ask for a preferred date and time, update variable:callback_time, confirm it and politely end the conversation.",
+        "next_states": [],
+    }
+
+    variables = {
+        f"step_{i}": {"name": f"step_{i}", "value": "", "is_agent_updatable": True, "needs_initial_value": False}
+        for i in range(states)
+    }
+    variables["user_name"] = {"name": "user_name", "value": "", "is_agent_updatable": False, "needs_initial_value": True}
+    variables["callback_time"] = {"name": "callback_time", "value": "", "is_agent_updatable": True, "needs_initial_value": False}
+
+    return {
+        "overall_plan": {
+            "overall_goal": f"Walk the user through {states} steps (revision {revision}).",
+            "states_of_conversation": ", ".join(names),
+            "steps_in_each_state": "One confirmation per state.",
+            "variables_with_initial_values": "user_name",
+            "variables_to_capture": ", ".join(f"step_{i}" for i in range(states)),
+        },
+        "agent_config": {
+            "global_prompt": "Be concise and polite.\nAddress the user as {{ user_name }}.",
+            "response_style": "Friendly, short sentences.",
+            "agent_variables": variables,
+            "states": spec_states,
+            "initial_state_name": names[0],
+        },
+        "intro_message": "Hello, am I speaking with {{ user_name }}?",
+    }
+
+
+HANDOFF = {
+    "enhanced_use_case": {
+        "business_context": {
+            "company_name": "Acme Finance",
+            "industry": "Consumer lending",
+            "primary_objective": "Remind customers about upcoming EMI payments",
+            "target_audience": "Existing loan customers",
+        },
+        "conversation_design": {
+            "bot_primary_purpose": "Confirm the customer will pay on time",
+            "typical_flow": "Verify identity, remind, capture promise to pay",
+        },
+        "user_authentication": {"authentication_method": "Confirm name and last 4 digits of the loan account"},
+    },
+    "handoff": True,
+}
+
+
+def synthetic_reply(messages: List[Dict[str, Any]], handoff_after: int, spec_states: int) -> str:
+    """Canned reply chosen from the request's system prompt and turn count."""
+    system = message_text(messages[0].get("content")) if messages and messages[0].get("role") == "system" else ""
+    user_turns = sum(1 for m in messages if m.get("role") == "user")
+
+    if system.startswith(SUMMARY_PROMPT[:40]):
+        return "- The user wants an EMI reminder bot for Acme Finance.\n- Identity is verified with the account's last 4 digits."
+    if EDIT_MARKER in system:
+        patch = [
+            {
+                "op": "replace",
+                "path": "/agent_config/states/Step0/instructions",
+                "value": f"Greet the user, confirm their name and explain step 0 (edit {user_turns}).\n"
+                "Once the user confirms, update variable:step_0 to 'done' and transition to state:Step1",
+            }
+        ]
+        return json.dumps(patch)
+    if SPEC_MARKER in system:
+        return json.dumps(make_spec(spec_states, revision=user_turns - 1), indent=2)
+    if DISCOVERY_MARKER in system:
+        if user_turns > handoff_after:
+            return "Thanks, I have everything I need.\n\n```json\n" + json.dumps(HANDOFF, indent=2) + "\n```"
+        return (
+            f"Thanks for the details. Question {user_turns}: which languages should the bot speak, "
+            "and what should it do if someone other than the customer answers the call?"
+        )
+    return "OK."
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """Threaded HTTP/1.1 server speaking the OpenAI chat completions API."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int] = ("127.0.0.1", 0),
+        ttft: float = 0.5,
+        tokens_per_second: float = 80.0,
+        chunk_tokens: int = 4,
+        handoff_after: int = 2,
+        spec_states: int = 6,
+        mode: str = "synthetic",
+        cassette: Optional[Cassette] = None,
+        strict: bool = False,
+        speed: float = 1.0,
+        error_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_ttft: float = 10.0,
+    ):
+        """
+        Args:
+            address: Bind address; port 0 picks a free port
+            ttft: Seconds before the first token of a synthetic reply
+            tokens_per_second: Generation rate of synthetic replies
+            chunk_tokens: Tokens per streamed chunk
+            handoff_after: Discovery user turns answered with questions before the handoff
+            spec_states: States in the synthetic specification
+            mode: "synthetic", "replay" or "record"
+            cassette: Cassette used by replay and record modes
+            strict: In replay mode, answer requests missing from the cassette with 404
+            speed: Replay time scale; 2.0 replays twice as fast, 0 without delays
+            error_rate: Fraction of requests answered with 503, to exercise failover
+            slow_rate: Fraction of requests whose first token takes slow_ttft
+                seconds instead of ttft, to exercise hedging
+            slow_ttft: Time to first token of a slow request
+        """
+        super().__init__(address, _Handler)
+        if mode != "synthetic" and cassette is None:
+            raise ValueError(f"{mode} mode needs a cassette")
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.chunk_tokens = chunk_tokens
+        self.handoff_after = handoff_after
+        self.spec_states = spec_states
+        self.mode = mode
+        self.cassette = cassette
+        self.strict = strict
+        self.speed = speed
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_ttft = slow_ttft
+        self.upstream = None
+        self.lock = threading.Lock()
+        self.seen_prefixes = set()
+        self.counters = {"connections": 0, "requests": 0, "streams": 0, "replayed": 0, "recorded": 0, "misses": 0, "errors": 0, "slow": 0, "continuations": 0}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.counters[name] += 1
+
+    def reset_counters(self) -> None:
+        with self.lock:
+            for name in self.counters:
+                self.counters[name] = 0
+
+    def start(self) -> "MockLLMServer":
+        """Serve on a daemon thread and return self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def usage(self, messages: List[Dict[str, Any]], completion: str) -> Dict[str, Any]:
+        """Approximate usage, reporting a previously seen system prompt as cached."""
+        prompt_chars = sum(len(message_text(m.get("content"))) for m in messages)
+        cached = 0
+        if messages and messages[0].get("role") == "system":
+            system = message_text(messages[0].get("content"))
+            with self.lock:
+                if system in self.seen_prefixes:
+                    cached = len(system) // CHARS_PER_TOKEN
+                self.seen_prefixes.add(system)
+        prompt_tokens = prompt_chars // CHARS_PER_TOKEN + 1
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(completion) // CHARS_PER_TOKEN + 1,
+            "total_tokens": prompt_tokens + len(completion) // CHARS_PER_TOKEN + 1,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_event(self, body: Any) -> None:
+        payload = body if isinstance(body, str) else json.dumps(body)
+        self._write_chunk(f"data: {payload}\n\n".encode())
+
+    def do_POST(self):
+        server: MockLLMServer = self.server
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": "not found"}})
+        server.count("requests")
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if server.error_rate and random.random() < server.error_rate:
+            server.count("errors")
+            return self._send_json(503, {"error": {"message": "injected overload", "type": "overloaded_error"}})
+        messages = body.get("messages") or []
+        stream = bool(body.get("stream"))
+        key = request_key(messages)
+
+        if server.mode == "record":
+            return self._record(body, messages, key, stream)
+
+        entry = server.cassette.get(key) if server.mode == "replay" else None
+        if entry is not None:
+            server.count("replayed")
+            text = entry["response"]
+            finish_reason = entry.get("finish_reason") or "stop"
+            ttft = entry.get("ttft_s", 0.0)
+            rate = len(text) / CHARS_PER_TOKEN / max(entry.get("duration_s", 0.0) - ttft, 1e-6)
+            usage = entry.get("usage") or server.usage(messages, text)
+            if server.speed:
+                ttft, rate = ttft / server.speed, rate * server.speed
+            else:
+                ttft, rate = 0.0, 0.0
+        else:
+            if server.mode == "replay":
+                server.count("misses")
+                if server.strict:
+                    return self._send_json(404, {"error": {"message": f"request {key[:12]} not in cassette"}})
+            if messages and messages[-1].get("role") == "assistant":
+                # A continuation: send the rest of the reply the prefill started
+                prefill = message_text(messages[-1].get("content"))
+                text = synthetic_reply(messages[:-1], server.handoff_after, server.spec_states)
+                text = text[len(prefill):] if text.startswith(prefill) else text
+                server.count("continuations")
+            else:
+                text = synthetic_reply(messages, server.handoff_after, server.spec_states)
+            finish_reason = "stop"
+            max_chars = body.get("max_tokens", 0) * CHARS_PER_TOKEN
+            if max_chars and len(text) > max_chars:
+                text, finish_reason = text[:max_chars], "length"
+            ttft, rate = server.ttft, server.tokens_per_second
+            if server.slow_rate and random.random() < server.slow_rate:
+                server.count("slow")
+                ttft = server.slow_ttft
+            usage = server.usage(messages, text)
+
+        if stream:
+            server.count("streams")
+            self._begin_stream()
+            meta = {"finish_reason": finish_reason, "usage": usage}
+            self._stream_text(self._pace(text, ttft, rate, server.chunk_tokens), body, meta)
+        else:
+            time.sleep(ttft + (len(text) / CHARS_PER_TOKEN / rate if rate else 0.0))
+            self._send_json(200, self._completion(body, text, finish_reason, usage))
+
+    @staticmethod
+    def _pace(text: str, ttft: float, rate: float, chunk_tokens: int) -> Iterator[str]:
+        """Split text into chunks released at the configured token rate."""
+        time.sleep(ttft)
+        size = chunk_tokens * CHARS_PER_TOKEN
+        for start in range(0, len(text), size):
+            if start and rate:
+                time.sleep(chunk_tokens / rate)
+            yield text[start : start + size]
+
+    def _begin_stream(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _stream_text(self, deltas: Iterator[str], body: Dict[str, Any], meta: Dict[str, Any]) -> None:
+        """Relay deltas as SSE chunks; meta's finish_reason and usage are read once they are exhausted."""
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        base = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model")}
+        self._send_event({**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}]})
+        for delta in deltas:
+            self._send_event({**base, "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]})
+        self._send_event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": meta["finish_reason"]}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self._send_event({**base, "choices": [], "usage": meta["usage"]})
+        self._send_event("[DONE]")
+        self._write_chunk(b"")
+
+    @staticmethod
+    def _completion(body: Dict[str, Any], text: str, finish_reason: str, usage: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": finish_reason}],
+            "usage": usage,
+        }
+
+    def _record(self, body: Dict[str, Any], messages: List[Dict[str, Any]], key: str, stream: bool) -> None:
+        """Forward to the real model, relaying the stream and recording the exchange."""
+        server: MockLLMServer = self.server
+        upstream = server.upstream
+        params = {
+            "model": upstream.model_name,
+            "messages": messages,
+            "max_tokens": body.get("max_tokens", 4096),
+            "temperature": body.get("temperature", 0.7),
+            "stream_options": {"include_usage": True},
+            **upstream.provider_params(),
+        }
+        started = time.perf_counter()
+        ttft = None
+        parts: List[str] = []
+        meta: Dict[str, Any] = {"finish_reason": "stop", "usage": {}}
+        if stream:
+            server.count("streams")
+            self._begin_stream()
+
+        def relay() -> Iterator[str]:
+            nonlocal ttft
+            for chunk in upstream.stream(**params):
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                    meta["usage"] = usage.model_dump() if hasattr(usage, "model_dump") else dict(usage)
+                if not chunk.choices:
+                    continue
+                meta["finish_reason"] = chunk.choices[0].finish_reason or meta["finish_reason"]
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    parts.append(delta)
+                    yield delta
+
+        if stream:
+            self._stream_text(relay(), body, meta)
+        else:
+            for _ in relay():
+                pass
+        text = "".join(parts)
+        server.cassette.record(
+            key,
+            response=text,
+            finish_reason=meta["finish_reason"],
+            usage=meta["usage"],
+            ttft_s=round(ttft or 0.0, 4),
+            duration_s=round(time.perf_counter() - started, 4),
+        )
+        server.count("recorded")
+        if not stream:
+            usage = meta["usage"] or server.usage(messages, text)
+            self._send_json(200, self._completion(body, text, meta["finish_reason"], usage))
+
+
+def make_server(mode: str = "synthetic", cassette_path: Optional[str] = None, **options: Any) -> MockLLMServer:
+    """Build a mock LLM server, wiring the cassette and, for recording, the real transport."""
+    cassette = Cassette(cassette_path) if cassette_path else None
+    server = MockLLMServer(mode=mode, cassette=cassette, **options)
+    if mode == "record":
+        from claude_client import ClaudeTransport
+
+        server.upstream = ClaudeTransport(provider="vertex_ai")
+    return server
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8001, show_default=True)
+@click.option("--mode", type=click.Choice(["synthetic", "replay", "record"]), default="synthetic", show_default=True)
+@click.option("--cassette", "cassette_path", type=click.Path(dir_okay=False), default=None)
+@click.option("--strict", is_flag=True, help="Replay only: 404 for requests not in the cassette.")
+@click.option("--speed", default=1.0, show_default=True, help="Replay time scale (0 = no delays).")
+@click.option("--ttft", default=0.5, show_default=True)
+@click.option("--tokens-per-second", default=80.0, show_default=True)
+@click.option("--handoff-after", default=2, show_default=True)
+@click.option("--spec-states", default=6, show_default=True)
+@click.option("--error-rate", default=0.0, show_default=True, help="Fraction of requests answered with 503.")
+@click.option("--slow-rate", default=0.0, show_default=True, help="Fraction of requests with --slow-ttft.")
+@click.option("--slow-ttft", default=10.0, show_default=True)
+def main(
+    host, port, mode, cassette_path, strict, speed, ttft, tokens_per_second, handoff_after, spec_states,
+    error_rate, slow_rate, slow_ttft,
+):
+    """Serve the mock LLM until interrupted."""
+    server = make_server(
+        mode,
+        cassette_path,
+        address=(host, port),
+        strict=strict,
+        speed=speed,
+        ttft=ttft,
+        tokens_per_second=tokens_per_second,
+        handoff_after=handoff_after,
+        spec_states=spec_states,
+        error_rate=error_rate,
+        slow_rate=slow_rate,
+        slow_ttft=slow_ttft,
+    )
+    print(f"Mock LLM ({mode}) listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.counters))
+
+
+if __name__ == "__main__":
+    main()
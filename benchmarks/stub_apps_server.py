@@ -0,0 +1,146 @@
+"""Local stand-in for the apps-qa auth and app-authoring endpoints used by utils.py."""
+import base64
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+APPS_PATH = re.compile(r"^/api/app-authoring/orgs/[^/]+/workspaces/[^/]+/apps(?:/(?P<app_id>[^/]+))?$")
+
+
+def make_jwt(ttl_seconds: float) -> str:
+    """Build an unsigned JWT whose exp claim is ttl_seconds from now."""
+
+    def encode(data: Dict[str, Any]) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+    return f"{encode({'alg': 'none'})}.{encode({'exp': time.time() + ttl_seconds})}.stub"
+
+
+class StubAppsServer(ThreadingHTTPServer):
+    """Threaded HTTP/1.1 server with configurable latency and injected failures."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int] = ("127.0.0.1", 0),
+        latency: float = 0.005,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        slow_rate: float = 0.0,
+        slow_latency: float = 2.0,
+        token_ttl: float = 3600,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            address: Bind address; port 0 picks a free port
+            latency: Seconds added to every response
+            error_rate: Fraction of app-authoring calls answered with error_status
+            error_status: Status of the injected failures
+            slow_rate: Fraction of app-authoring calls delayed by slow_latency
+            slow_latency: Delay for slow calls in seconds
+            token_ttl: Lifetime of issued tokens in seconds
+            seed: Seed for the failure injection
+        """
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.token_ttl = token_ttl
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.apps: Dict[str, Dict[str, Any]] = {}
+        self.valid_tokens = set()
+        self.counters = {"connections": 0, "requests": 0, "logins": 0, "errors_injected": 0}
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.counters[name] += 1
+
+    def reset_counters(self) -> None:
+        with self.lock:
+            for name in self.counters:
+                self.counters[name] = 0
+
+    def start(self) -> "StubAppsServer":
+        """Serve on a daemon thread and return self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.count("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _handle(self) -> None:
+        server: StubAppsServer = self.server
+        server.count("requests")
+        body = self._read_json()
+        time.sleep(server.latency)
+
+        if self.path == "/api/auth/login" and self.command == "POST":
+            server.count("logins")
+            token = make_jwt(server.token_ttl)
+            with server.lock:
+                server.valid_tokens.add("Bearer " + token)
+            return self._send(200, {"access_token": token})
+
+        match = APPS_PATH.match(self.path)
+        if not match:
+            return self._send(404, {"detail": "not found"})
+        if self.headers.get("authorization") not in server.valid_tokens:
+            return self._send(401, {"detail": "invalid token"})
+
+        with server.lock:
+            roll = server.random.random()
+        if roll < server.error_rate:
+            server.count("errors_injected")
+            return self._send(server.error_status, {"detail": "injected failure"})
+        if roll < server.error_rate + server.slow_rate:
+            time.sleep(server.slow_latency)
+
+        app_id = match.group("app_id")
+        if self.command == "POST" and app_id is None:
+            app_id = body.get("app_name") or uuid.uuid4().hex
+            with server.lock:
+                server.apps[app_id] = body
+            return self._send(200, {"app_id": app_id, "app_name": body.get("app_name")})
+        if self.command == "PUT" and app_id is not None:
+            with server.lock:
+                server.apps[app_id] = body
+            return self._send(200, {"app_id": app_id, "app_name": body.get("app_name")})
+        return self._send(405, {"detail": "method not allowed"})
+
+    do_POST = _handle
+    do_PUT = _handle
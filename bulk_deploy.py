@@ -0,0 +1,199 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import click
+
+from utils import create_app, create_app_config, update_app
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces calls to at most `rate` per second."""
+
+    def __init__(self, rate: float):
+        """
+        Args:
+            rate: Maximum calls per second. 0 disables limiting.
+        """
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def acquire(self) -> None:
+        """Block until the caller may start its call."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def load_deployments(path: str) -> List[Dict[str, Any]]:
+    """
+    Load the specs to deploy.
+
+    A directory is read as one spec per *.json file, named after the file.
+    A JSONL file holds one record per line, wrapping the spec as
+    {"app_name", "app_id", "spec"}; batch_runner output is accepted as is,
+    using its id as the app name and skipping failed records. A JSONL record
+    without a name (a bare spec, say) gets app_name None, which
+    validate_deployments rejects.
+
+    Args:
+        path: Directory of spec files or a JSONL file
+
+    Returns:
+        Deployments with "app_name", "app_id" (None to create), "spec" and
+        "source", the file (and line) the deployment was read from
+    """
+    raw_records = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(path, name), "r", encoding="utf-8") as f:
+                raw_records.append((name, os.path.splitext(name)[0], json.load(f)))
+    else:
+        file_name = os.path.basename(path)
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                if line.strip():
+                    # Line numbers shift whenever the file is edited, so they never name an app
+                    raw_records.append((f"{file_name}:{line_no}", None, json.loads(line)))
+
+    deployments = []
+    for source, default_name, raw in raw_records:
+        if "spec" in raw or "status" in raw:
+            # Failed batch_runner records may carry no spec at all
+            if raw.get("status", "ok") != "ok":
+                continue
+            app_name = raw.get("app_name") or (str(raw["id"]) if raw.get("id") else default_name)
+            deployments.append(
+                {
+                    "app_name": app_name,
+                    "app_id": raw.get("app_id"),
+                    "spec": raw["spec"],
+                    "source": source,
+                }
+            )
+        else:
+            deployments.append({"app_name": default_name, "app_id": None, "spec": raw, "source": source})
+    return deployments
+
+
+def validate_deployments(deployments: List[Dict[str, Any]]) -> Dict[int, str]:
+    """
+    Build every app config locally before anything is sent.
+
+    Args:
+        deployments: Output of load_deployments
+
+    Returns:
+        Validation errors keyed by position in deployments
+    """
+    errors = {}
+    for index, deployment in enumerate(deployments):
+        if not deployment["app_name"]:
+            errors[index] = "record has no app_name"
+            continue
+        try:
+            create_app_config(deployment["spec"], deployment["app_name"], deployment["app_id"])
+        except Exception as e:
+            errors[index] = f"{type(e).__name__}: {e}"
+    return errors
+
+
+def deploy_all(
+    deployments: List[Dict[str, Any]],
+    concurrency: int = 4,
+    rate: float = 2.0,
+) -> List[Dict[str, Any]]:
+    """
+    Validate, then create or update every app concurrently.
+
+    One failing app never stops the others; its error is reported instead.
+
+    Args:
+        deployments: Output of load_deployments
+        concurrency: Maximum deploys in flight
+        rate: Maximum deploy requests started per second
+
+    Returns:
+        One result per deployment with status, latency and the API response or error
+    """
+    errors = validate_deployments(deployments)
+    limiter = RateLimiter(rate)
+
+    def deploy(index: int) -> Dict[str, Any]:
+        deployment = deployments[index]
+        app_name, app_id = deployment["app_name"], deployment["app_id"]
+        result: Dict[str, Any] = {
+            "app_name": app_name,
+            "source": deployment["source"],
+            "action": "update" if app_id else "create",
+        }
+        if index in errors:
+            result.update({"status": "invalid", "error": errors[index], "latency_s": 0.0})
+            return result
+
+        limiter.acquire()
+        started = time.perf_counter()
+        try:
+            if app_id:
+                response = update_app(app_name, app_id, deployment["spec"])
+            else:
+                response = create_app(app_name, deployment["spec"])
+            result.update({"status": "ok", "response": response})
+        except Exception as e:
+            result.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+        result["latency_s"] = round(time.perf_counter() - started, 3)
+        return result
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(deploy, range(len(deployments))))
+
+
+@click.command()
+@click.argument("source", type=click.Path(exists=True))
+@click.option("--concurrency", default=4, show_default=True, help="Maximum deploys in flight.")
+@click.option("--rate", default=2.0, show_default=True, help="Maximum deploy requests per second (0 = unlimited).")
+@click.option("--validate-only", is_flag=True, help="Only build the app configs locally.")
+@click.option("--report", "report_path", type=click.Path(dir_okay=False), default=None, help="Write per-app results as JSONL.")
+def main(source, concurrency, rate, validate_only, report_path):
+    """Create or update every app spec in SOURCE (a directory or JSONL file)."""
+    deployments = load_deployments(source)
+    if validate_only:
+        errors = validate_deployments(deployments)
+        for index, deployment in enumerate(deployments):
+            error: Optional[str] = errors.get(index)
+            label = deployment["app_name"] or deployment["source"]
+            print(f"[{'invalid' if error else 'valid'}] {label}" + (f": {error}" if error else ""))
+        raise SystemExit(1 if errors else 0)
+
+    started = time.perf_counter()
+    results = deploy_all(deployments, concurrency=concurrency, rate=rate)
+    wall_time = time.perf_counter() - started
+
+    for result in results:
+        detail = result.get("error") or ""
+        print(f"[{result['status']}] {result['action']} {result['app_name'] or result['source']} in {result['latency_s']:.2f}s {detail}")
+
+    ok = sum(1 for r in results if r["status"] == "ok")
+    print(f"{ok}/{len(results)} apps deployed in {wall_time:.1f}s")
+
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    raise SystemExit(0 if ok == len(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
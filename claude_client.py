@@ -1,43 +1,399 @@
+import asyncio
 import os
-from typing import List, Dict, Any, Optional
-import litellm
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Tuple, Union
 from dotenv import load_dotenv
+from history_manager import SUMMARY_PROMPT, HistoryManager
+from request_policy import (
+    AttemptAbandoned,
+    Endpoint,
+    LLMEmptyResponseError,
+    LLMError,
+    LLMTimeoutError,
+    LLMUnavailableError,
+    RequestPolicy,
+    attempt_abandoned,
+)
+from response_cache import ResponseCache
+from single_flight import get_single_flight
+from telemetry import Telemetry, current_session, get_telemetry
 
 load_dotenv()
 
+# Anthropic prompt-caching breakpoint, passed through by LiteLLM
+CACHE_CONTROL = {"type": "ephemeral"}
 
-class ClaudeClient:
-    """Client for interacting with Claude 3.7 LLM through Vertex AI."""
+# Output token limit for calls that do not set their own
+DEFAULT_MAX_TOKENS = 4096
+
+# Follow-up requests made for a reply that stops at its output token limit
+DEFAULT_MAX_CONTINUATIONS = 3
+
+_litellm = None
+_litellm_lock = threading.Lock()
+
+
+def get_litellm():
+    """
+    Import and configure LiteLLM on first use.
+    
+    LiteLLM takes most of this module's import time, and is only needed once
+    a request is actually sent, so it is kept out of module import.
+    """
+    global _litellm
+    if _litellm is None:
+        with _litellm_lock:
+            if _litellm is None:
+                import litellm
+                
+                # Configure LiteLLM for Vertex AI
+                litellm.set_verbose = False
+                _litellm = litellm
+    return _litellm
+
+
+def _hold_whitespace(text: str) -> Tuple[str, str]:
+    """Split text into what can be emitted now and its trailing whitespace."""
+    body = text.rstrip()
+    return body, text[len(body):]
+
+
+# A system prompt is either one string or a list of segments ordered from the
+# most stable (shared across sessions) to the most specific.
+SystemPrompt = Union[str, List[str]]
+
+
+class ClaudeTransport:
+    """
+    Process-wide, thread-safe connection to Claude on Vertex AI.
     
-    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
+    Holds credentials, model configuration, the response cache and one pooled
+    HTTP client, so conversations created for new users reuse warm
+    connections instead of paying a fresh TLS handshake.
+    """
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        prompt_caching: Optional[bool] = None,
+        cache: Optional[ResponseCache] = None,
+        max_connections: Optional[int] = None,
+        provider: Optional[str] = None,
+        api_base: Optional[str] = None,
+        policy: Optional[RequestPolicy] = None,
+    ):
         """
-        Initialize the Claude client.
+        Initialize the transport.
         
         Args:
             api_key: Google Cloud API key. If not provided, will try to get from environment.
             model: Claude model to use. Defaults to claude-3-7-sonnet-20250219.
+            prompt_caching: Mark the system prompt and history prefix as cacheable.
+                Defaults to the CLAUDE_PROMPT_CACHING environment variable.
+            cache: Local response cache. Defaults to a SQLite-backed cache at
+                CLAUDE_RESPONSE_CACHE_PATH when that variable is set.
+            max_connections: Maximum concurrent requests and pooled connections.
+                Defaults to CLAUDE_MAX_CONNECTIONS or 20.
+            provider: LiteLLM provider prefix. Defaults to CLAUDE_PROVIDER or vertex_ai.
+                Set it to openai with an api_base to use an OpenAI-compatible
+                server such as the benchmark mock LLM.
+            api_base: Base URL for non-Vertex providers. Defaults to CLAUDE_API_BASE.
+            policy: Endpoints, hedging, timeout and circuit breakers for every
+                call. Defaults to RequestPolicy.from_env for this model.
         """
-        
-        self.api_key = api_key or os.getenv("VERTEX_CREDENTIALS")
+        self.provider = provider or os.getenv("CLAUDE_PROVIDER", "vertex_ai")
+        self.api_base = api_base or os.getenv("CLAUDE_API_BASE")
+        if self.provider == "vertex_ai":
+            self.api_key = api_key or os.getenv("VERTEX_CREDENTIALS")
+        else:
+            self.api_key = api_key or os.getenv("CLAUDE_API_KEY", "unused")
         if not self.api_key:
             raise ValueError(
                 "Credentials not found. Set GOOGLE_API_KEY, VERTEX_CREDENTIALS, or "
                 "GOOGLE_APPLICATION_CREDENTIALS, or pass --api-key."
             )
-     
-        
         
         self.model = model or os.getenv("CLAUDE_MODEL", "claude-3-7-sonnet-20250219")
         self.location = os.getenv("GOOGLE_LOCATION", "us-east5")
+        if prompt_caching is None:
+            prompt_caching = os.getenv("CLAUDE_PROMPT_CACHING", "").lower() in ("1", "true", "yes")
+        self.prompt_caching = prompt_caching
         
-        # Configure LiteLLM for Vertex AI
-        litellm.set_verbose = False
-        self.conversation_history: List[Dict[str, str]] = []
+        if cache is None and os.getenv("CLAUDE_RESPONSE_CACHE_PATH"):
+            cache = ResponseCache(os.getenv("CLAUDE_RESPONSE_CACHE_PATH"))
+        self.cache = cache
+        
+        if max_connections is None:
+            max_connections = int(os.getenv("CLAUDE_MAX_CONNECTIONS", "20"))
+        self.max_connections = max_connections
+        self._http_handler = None
+        
+        if policy is None:
+            location = self.location if self.provider == "vertex_ai" else None
+            policy = RequestPolicy.from_env(self.model, location=location, api_base=self.api_base)
+        self.policy = policy
+        
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "in_flight": 0, "peak_in_flight": 0, "queued": 0, "errors": 0}
         
         # Debug info
-        print(f"Using model: {self.model}")
+        print(f"Using model: {self.model_name}")
         # print(f"Using location: {self.location}")
     
+    @property
+    def model_name(self) -> str:
+        """Model name with the LiteLLM provider prefix."""
+        return f"{self.provider}/{self.model}"
+    
+    def provider_params(self) -> Dict[str, Any]:
+        """Provider-specific keyword arguments for every completion call."""
+        if self.provider == "vertex_ai":
+            return {"vertex_location": self.location}
+        params: Dict[str, Any] = {"api_key": self.api_key}
+        if self.api_base:
+            params["api_base"] = self.api_base
+        return params
+    
+    @property
+    def http_handler(self) -> Any:
+        """LiteLLM handler over the pooled httpx client, created on first use."""
+        if self._http_handler is None:
+            with self._lock:
+                if self._http_handler is None:
+                    import httpx
+                    get_litellm()
+                    from litellm.llms.custom_httpx.http_handler import HTTPHandler
+                    
+                    self.http_client = httpx.Client(
+                        limits=httpx.Limits(
+                            max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_connections,
+                        ),
+                        timeout=httpx.Timeout(600.0, connect=10.0),
+                    )
+                    self._http_handler = HTTPHandler(client=self.http_client)
+        return self._http_handler
+    
+    def _acquire(self) -> float:
+        """
+        Take a connection slot, counting callers that had to wait.
+        
+        Returns:
+            Seconds spent waiting for the slot
+        """
+        waited = 0.0
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.stats["queued"] += 1
+            started = time.perf_counter()
+            self._slots.acquire()
+            waited = time.perf_counter() - started
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+        return waited
+    
+    def _release(self, failed: bool = False) -> None:
+        with self._lock:
+            self.stats["in_flight"] -= 1
+            if failed:
+                self.stats["errors"] += 1
+        self._slots.release()
+    
+    def _route(self, api_params: Dict[str, Any], endpoint: Endpoint) -> Dict[str, Any]:
+        """Completion parameters for one endpoint of the request policy."""
+        params = dict(api_params)
+        params["model"] = f"{self.provider}/{endpoint.model}"
+        if self.provider == "vertex_ai":
+            params["vertex_location"] = endpoint.location or self.location
+        elif endpoint.api_base:
+            params["api_base"] = endpoint.api_base
+        if self.policy.timeout:
+            # Bounds the HTTP request too, so abandoned hedges do not linger
+            params.setdefault("timeout", self.policy.timeout)
+        return params
+    
+    def completion(self, timing: Optional[Dict[str, Any]] = None, **api_params: Any) -> Any:
+        """
+        Run a blocking completion over the shared connection pool.
+        
+        The request policy picks the endpoint, hedges slow calls and fails
+        over on errors.
+        
+        Args:
+            timing: Optional telemetry record that receives the time spent
+                waiting for a connection slot as queue_s, and the policy's
+                endpoint, hedged and failovers
+            **api_params: Keyword arguments for litellm.completion
+            
+        Returns:
+            The LiteLLM response
+            
+        Raises:
+            LLMError: If no endpoint answered
+        """
+        def attempt(endpoint: Endpoint) -> Any:
+            queued = self._acquire()
+            if attempt_abandoned():
+                # A hedge that waited for its slot until another endpoint answered
+                self._release()
+                raise AttemptAbandoned()
+            if timing is not None:
+                timing.setdefault("queue_s", round(queued, 6))
+            failed = True
+            try:
+                response = get_litellm().completion(client=self.http_handler, **self._route(api_params, endpoint))
+                failed = False
+                return response
+            finally:
+                self._release(failed)
+        
+        return self.policy.run(attempt, timing)
+    
+    def stream(self, timing: Optional[Dict[str, Any]] = None, **api_params: Any) -> Iterator[Any]:
+        """
+        Run a streaming completion, holding a connection slot until it ends.
+        
+        Args:
+            timing: Optional telemetry record that receives the time spent
+                waiting for a connection slot as queue_s, and the policy's
+                endpoint, hedged and failovers
+            **api_params: Keyword arguments for litellm.completion
+            
+        Yields:
+            LiteLLM stream chunks
+            
+        Raises:
+            LLMError: If no endpoint started the stream, or it broke off
+        """
+        yield from self.policy.stream(lambda endpoint: self._stream_from(endpoint, timing, api_params), timing)
+    
+    def _stream_from(self, endpoint: Endpoint, timing: Optional[Dict[str, Any]], api_params: Dict[str, Any]) -> Iterator[Any]:
+        queued = self._acquire()
+        if attempt_abandoned():
+            self._release()
+            raise AttemptAbandoned()
+        if timing is not None:
+            timing.setdefault("queue_s", round(queued, 6))
+        failed = True
+        try:
+            yield from get_litellm().completion(
+                client=self.http_handler, stream=True, **self._route(api_params, endpoint)
+            )
+            failed = False
+        finally:
+            self._release(failed)
+    
+    async def acompletion(self, timing: Optional[Dict[str, Any]] = None, **api_params: Any) -> Any:
+        """
+        Run an async completion under the request policy.
+        
+        Async calls use LiteLLM's own per-event-loop client pool; they are
+        counted here but bounded by the caller's semaphore.
+        
+        Args:
+            timing: Optional telemetry record that receives the policy's
+                endpoint, hedged and failovers
+            **api_params: Keyword arguments for litellm.acompletion
+            
+        Returns:
+            The LiteLLM response, or an async stream when stream=True
+            
+        Raises:
+            LLMError: If no endpoint answered
+        """
+        if api_params.get("stream"):
+            return self.policy.astream(lambda endpoint: self._acall(endpoint, api_params), timing)
+        return await self.policy.arun(lambda endpoint: self._acall(endpoint, api_params), timing)
+    
+    async def _acall(self, endpoint: Endpoint, api_params: Dict[str, Any]) -> Any:
+        with self._lock:
+            self.stats["requests"] += 1
+        try:
+            return await get_litellm().acompletion(**self._route(api_params, endpoint))
+        except Exception:
+            with self._lock:
+                self.stats["errors"] += 1
+            raise
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get connection pool usage statistics and per-endpoint policy state."""
+        with self._lock:
+            stats = {"max_connections": self.max_connections, **self.stats}
+        stats["endpoints"] = self.policy.get_stats()
+        return stats
+
+
+class ClaudeClient:
+    """Client for interacting with Claude 3.7 LLM through Vertex AI."""
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        prompt_caching: Optional[bool] = None,
+        cache: Optional[ResponseCache] = None,
+        history_token_budget: Optional[int] = None,
+        transport: Optional[ClaudeTransport] = None,
+        telemetry: Optional[Telemetry] = None,
+        max_continuations: Optional[int] = None,
+    ):
+        """
+        Initialize the Claude client.
+        
+        The client holds one conversation. Credentials, configuration and
+        connections live in the transport, which can be shared between clients.
+        
+        Args:
+            api_key: Google Cloud API key. If not provided, will try to get from environment.
+            model: Claude model to use. Defaults to claude-3-7-sonnet-20250219.
+            prompt_caching: Mark the system prompt and history prefix as cacheable.
+                Defaults to the transport's setting.
+            cache: Local response cache. Defaults to the transport's cache.
+            history_token_budget: History size in tokens above which older turns
+                are summarized. Defaults to CLAUDE_HISTORY_TOKEN_BUDGET.
+            transport: Shared transport. If not provided, a private one is
+                created from api_key, model, prompt_caching and cache.
+            telemetry: Receives one "llm" record per call. Defaults to the
+                process-wide telemetry.
+            max_continuations: Follow-up requests made for a reply cut off at
+                max_tokens, each resuming from the partial reply. Defaults to
+                CLAUDE_MAX_CONTINUATIONS or 3; 0 returns truncated replies as they are.
+        """
+        if transport is None:
+            transport = ClaudeTransport(
+                api_key=api_key, model=model, prompt_caching=prompt_caching, cache=cache
+            )
+        self.transport = transport
+        
+        self.api_key = transport.api_key
+        self.model = transport.model
+        self.location = transport.location
+        self.temperature = 0.7
+        self.prompt_caching = transport.prompt_caching if prompt_caching is None else prompt_caching
+        self.cache = transport.cache if cache is None else cache
+        self.telemetry = telemetry or get_telemetry()
+        if max_continuations is None:
+            max_continuations = int(os.getenv("CLAUDE_MAX_CONTINUATIONS", str(DEFAULT_MAX_CONTINUATIONS)))
+        self.max_continuations = max_continuations
+        
+        # Token usage of the most recent call and running cache totals
+        self.last_usage: Dict[str, int] = {}
+        self.cache_stats = {"cache_read_tokens": 0, "cache_creation_tokens": 0}
+        # Replies continued after hitting max_tokens, the follow-up requests
+        # and their time, and replies still cut off after the last one
+        self.continuation_stats = {"continued_replies": 0, "continuations": 0, "continuation_s": 0.0, "truncated": 0}
+        
+        self.conversation_history: List[Dict[str, str]] = []
+        self.history_manager = HistoryManager(
+            self.model, token_budget=history_token_budget, summarizer=self._summarize
+        )
+    
     def add_message(self, role: str, content: str) -> None:
         """
         Add a message to the conversation history.
@@ -55,54 +411,575 @@ class ClaudeClient:
     def clear_history(self) -> None:
         """Clear the conversation history."""
         self.conversation_history.clear()
+        self.history_manager.reset()
+    
+    def compact_history(self) -> None:
+        """Summarize older turns if the history is over its token budget."""
+        self.conversation_history = self.history_manager.compact(self.conversation_history)
+    
+    def _summarize(self, messages: List[Dict[str, str]], previous_summary: Optional[str]) -> str:
+        """
+        Fold old messages into the rolling history summary.
+        
+        Args:
+            messages: Messages being removed from the verbatim history
+            previous_summary: Summary from the last compaction, if any
+            
+        Returns:
+            The updated summary
+        """
+        transcript = "\n\n".join(f"{m['role'].upper()}: {m['content']}" for m in messages)
+        if previous_summary:
+            transcript = f"PREVIOUS SUMMARY:\n{previous_summary}\n\nNEW MESSAGES:\n{transcript}"
+        
+        with self.telemetry.span("llm", operation="summarize", model=self.model) as call:
+            response = self.transport.completion(
+                timing=call,
+                model=self.transport.model_name,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": transcript},
+                ],
+                max_tokens=1024,
+                temperature=0,
+                **self.transport.provider_params(),
+            )
+            call.update(self._usage_fields(getattr(response, "usage", None)))
+            call["finish_reason"] = response.choices[0].finish_reason
+            return response.choices[0].message.content
+    
+    def _build_api_params(
+        self,
+        system_prompt: Optional[SystemPrompt] = None,
+        messages: Optional[List[Dict[str, str]]] = None,
+        max_tokens: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Build the LiteLLM completion parameters for a request.
+        
+        Args:
+            system_prompt: Optional system prompt, or list of segments, to prepend
+            messages: Messages to send. Defaults to the conversation history.
+            max_tokens: Output token limit. Defaults to DEFAULT_MAX_TOKENS.
+            
+        Returns:
+            Keyword arguments for litellm.completion
+        """
+        messages = list(messages) if messages is not None else self.get_messages()
+        
+        if self.prompt_caching and len(messages) > 1:
+            # Everything before the new user turn is identical to the previous
+            # request, so cache up to and including the last assistant reply
+            prefix_end = dict(messages[-2])
+            prefix_end["content"] = [
+                {"type": "text", "text": prefix_end["content"], "cache_control": CACHE_CONTROL}
+            ]
+            messages[-2] = prefix_end
+        
+        api_params = {
+            "model": self.transport.model_name,
+            "messages": messages,
+            "max_tokens": max_tokens or DEFAULT_MAX_TOKENS,
+            "temperature": self.temperature,
+            **self.transport.provider_params(),
+        }
+        
+        if system_prompt:
+            segments = [system_prompt] if isinstance(system_prompt, str) else list(system_prompt)
+            if self.prompt_caching:
+                system_content: Union[str, List[Dict[str, Any]]] = [
+                    {"type": "text", "text": segment} for segment in segments
+                ]
+                # Breakpoint after the leading static segment so it is shared
+                # across sessions, and after the full system prompt
+                system_content[0]["cache_control"] = CACHE_CONTROL
+                system_content[-1]["cache_control"] = CACHE_CONTROL
+            else:
+                system_content = "".join(segments)
+            
+            # Add system message at the beginning
+            messages_with_system = [{"role": "system", "content": system_content}] + messages
+            api_params["messages"] = messages_with_system
+        
+        return api_params
     
-    def send_message(self, message: str, system_prompt: Optional[str] = None) -> str:
+    @staticmethod
+    def _usage_fields(usage: Any) -> Dict[str, int]:
+        """
+        Normalize the token usage reported by the provider.
+        
+        Args:
+            usage: LiteLLM usage object from a response or final stream chunk
+            
+        Returns:
+            Input, output, cache read and cache creation token counts, or an
+            empty dict when no usage was reported
+        """
+        if usage is None:
+            return {}
+        
+        cache_read = getattr(usage, "cache_read_input_tokens", None)
+        if cache_read is None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            cache_read = getattr(details, "cached_tokens", None)
+        
+        return {
+            "input_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "output_tokens": getattr(usage, "completion_tokens", 0) or 0,
+            "cache_read_tokens": cache_read or 0,
+            "cache_creation_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+        }
+    
+    def _record_usage(self, usage: Any, accumulate: bool = False) -> None:
+        """
+        Record token usage reported by the provider for the last call.
+        
+        Args:
+            usage: LiteLLM usage object from a response or final stream chunk
+            accumulate: Add to last_usage instead of replacing it, for the
+                follow-up requests of a continued reply
+        """
+        if usage is None:
+            return
+        
+        fields = self._usage_fields(usage)
+        self.cache_stats["cache_read_tokens"] += fields["cache_read_tokens"]
+        self.cache_stats["cache_creation_tokens"] += fields["cache_creation_tokens"]
+        if accumulate:
+            fields = {key: self.last_usage.get(key, 0) + value for key, value in fields.items()}
+        self.last_usage = fields
+    
+    @staticmethod
+    def _response_text(response: Any, call: Dict[str, Any]) -> str:
+        """
+        Content of a completion response, recording its finish reason.
+        
+        Raises:
+            LLMEmptyResponseError: If the response has no content
+        """
+        if not response or not response.choices:
+            raise LLMEmptyResponseError("the model returned no choices")
+        call["finish_reason"] = response.choices[0].finish_reason
+        content = response.choices[0].message.content
+        if not content:
+            raise LLMEmptyResponseError(f"the model returned no content (finish reason {call['finish_reason']})")
+        return content
+    
+    def _should_continue(self, text: str, call: Dict[str, Any]) -> bool:
+        """
+        Whether a reply stopped at max_tokens and should be continued.
+        
+        A reply still cut off after max_continuations follow-ups is marked
+        truncated in the call record and returned as it is.
+        """
+        if call.get("finish_reason") != "length" or not text.strip():
+            return False
+        if call.get("continuations", 0) >= self.max_continuations:
+            call["truncated"] = True
+            self.continuation_stats["truncated"] += 1
+            print(f"Reply still cut off at max_tokens after {call.get('continuations', 0)} continuations")
+            return False
+        return True
+    
+    @staticmethod
+    def _continuation_params(api_params: Dict[str, Any], text: str) -> Dict[str, Any]:
+        """
+        Parameters for a request that resumes a reply cut off at max_tokens.
+        
+        The partial reply is sent as a trailing assistant message, which
+        Claude continues from instead of answering, so the pieces join into
+        one reply.
+        
+        Args:
+            api_params: Parameters of the original request
+            text: Reply so far
+            
+        Returns:
+            Keyword arguments for litellm.completion
+        """
+        params = dict(api_params)
+        # Claude rejects a final assistant message that ends in whitespace
+        params["messages"] = list(api_params["messages"]) + [{"role": "assistant", "content": text.rstrip()}]
+        return params
+    
+    def _record_continuation(self, call: Dict[str, Any], started: float) -> None:
+        """Count one follow-up request and its latency in the call record and totals."""
+        elapsed = time.perf_counter() - started
+        call["continuations"] = call.get("continuations", 0) + 1
+        call["continuation_s"] = round(call.get("continuation_s", 0.0) + elapsed, 6)
+        if call["continuations"] == 1:
+            self.continuation_stats["continued_replies"] += 1
+        self.continuation_stats["continuations"] += 1
+        self.continuation_stats["continuation_s"] = round(self.continuation_stats["continuation_s"] + elapsed, 6)
+    
+    def _complete_text(self, api_params: Dict[str, Any], call: Dict[str, Any], coalesce: bool = False) -> str:
+        """
+        Run a blocking completion, continuing the reply while it stops at max_tokens.
+        
+        Args:
+            api_params: Keyword arguments for litellm.completion
+            call: Telemetry record of the call
+            coalesce: Share the reply of an identical request in flight or
+                just answered in this process instead of sending another;
+                the record is then marked coalesced and gets the usage and
+                finish reason of the request that was sent
+            
+        Returns:
+            The complete reply
+            
+        Raises:
+            LLMError: If a request fails or the reply has no content
+        """
+        if coalesce:
+            def lead() -> Tuple[str, Dict[str, Any]]:
+                text = self._complete_text(api_params, call)
+                return text, self._call_outcome(call)
+            
+            (text, outcome), call["coalesced"] = get_single_flight().run(
+                "llm_completion", self._flight_payload(api_params), lead
+            )
+            if call["coalesced"]:
+                self._adopt_outcome(outcome, call)
+            return text
+        started = time.perf_counter()
+        response = self.transport.completion(timing=call, **api_params)
+        self._record_usage(getattr(response, "usage", None))
+        text = self._response_text(response, call)
+        while self._should_continue(text, call):
+            continued = time.perf_counter()
+            response = self.transport.completion(timing=call, **self._continuation_params(api_params, text))
+            self._record_usage(getattr(response, "usage", None), accumulate=True)
+            text = text.rstrip() + self._continuation_text(response, call)
+            self._record_continuation(call, continued)
+        call["llm_s"] = round(time.perf_counter() - started, 6)
+        return text
+    
+    def _flight_payload(self, api_params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        What identifies a request for sharing: its parameters, the continuation
+        limit and the session sending it.
+        
+        Replies are sampled, so two sessions that happen to send the same
+        request (the same first message, say) each get their own.
+        """
+        return {
+            "session": current_session.get(),
+            "request": api_params,
+            "max_continuations": self.max_continuations,
+        }
+    
+    def _shared_reply(self, shared: Tuple[str, Dict[str, Any]], call: Dict[str, Any]) -> List[str]:
+        """Record a reply streamed by another caller and return it as a single chunk."""
+        call["coalesced"] = True
+        self._adopt_outcome(shared[1], call)
+        return [shared[0]]
+    
+    def _call_outcome(self, call: Dict[str, Any]) -> Dict[str, Any]:
+        """What callers sharing a reply copy from the call that produced it."""
+        return {
+            "usage": dict(self.last_usage),
+            "call": {key: call[key] for key in ("finish_reason", "continuations", "truncated") if key in call},
+        }
+    
+    def _adopt_outcome(self, outcome: Dict[str, Any], call: Dict[str, Any]) -> None:
+        """
+        Record a shared reply's usage and finish reason for this call.
+        
+        The tokens were spent by the call that was sent; this record is
+        marked coalesced, so totals can leave it out.
+        """
+        self.last_usage = dict(outcome["usage"])
+        call.update(outcome["call"])
+    
+    @staticmethod
+    def _continuation_text(response: Any, call: Dict[str, Any]) -> str:
+        """Content of a follow-up response, which may be empty, recording its finish reason."""
+        if not response or not response.choices:
+            raise LLMEmptyResponseError("the model returned no choices")
+        call["finish_reason"] = response.choices[0].finish_reason
+        return response.choices[0].message.content or ""
+    
+    def _stream_text(self, api_params: Dict[str, Any], call: Dict[str, Any]) -> Iterator[str]:
+        """
+        Stream a reply, continuing it while it stops at max_tokens.
+        
+        Deltas of the follow-up requests are yielded after the first
+        request's, so the caller sees one uninterrupted reply.
+        
+        Args:
+            api_params: Keyword arguments for litellm.completion
+            call: Telemetry record of the call
+            
+        Yields:
+            Chunks of the reply text in arrival order
+        """
+        chunks: List[str] = []
+        # Trailing whitespace is held back until more text follows: a
+        # continuation resumes from the reply without it
+        held = ""
+        params = api_params
+        started = time.perf_counter()
+        while True:
+            continued = time.perf_counter()
+            call["finish_reason"] = None
+            for chunk in self.transport.stream(timing=call, **params):
+                self._record_usage(getattr(chunk, "usage", None), accumulate=params is not api_params)
+                if not chunk.choices:
+                    continue
+                if chunk.choices[0].finish_reason:
+                    call["finish_reason"] = chunk.choices[0].finish_reason
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if "ttft_s" not in call:
+                        call["ttft_s"] = round(time.perf_counter() - started, 6)
+                    delta, held = _hold_whitespace(held + delta)
+                    if delta:
+                        chunks.append(delta)
+                        yield delta
+            if params is not api_params:
+                self._record_continuation(call, continued)
+            text = "".join(chunks)
+            if not self._should_continue(text, call):
+                break
+            held = ""
+            params = self._continuation_params(api_params, text)
+        if held:
+            yield held
+        call["llm_s"] = round(time.perf_counter() - started, 6)
+    
+    @contextmanager
+    def _track_call(self, operation: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Emit one "llm" telemetry record for a call.
+        
+        The block fills in timings such as ttft_s and finish_reason; the
+        call's token usage is taken from last_usage when it ends.
+        
+        Args:
+            operation: Client method being measured
+            **fields: Initial record fields
+        """
+        with self.telemetry.span("llm", operation=operation, model=self.model, **fields) as call:
+            try:
+                yield call
+            finally:
+                call.update(self.last_usage)
+    
+    def _cache_key(
+        self,
+        system_prompt: Optional[SystemPrompt],
+        messages: Optional[List[Dict[str, str]]] = None,
+        max_tokens: Optional[int] = None,
+    ) -> Optional[str]:
+        """
+        Get the response cache key for a request.
+        
+        Args:
+            system_prompt: System prompt the request will be sent with
+            messages: Messages to send. Defaults to the conversation history.
+            max_tokens: Output token limit of the request. Defaults to DEFAULT_MAX_TOKENS.
+            
+        Returns:
+            The key, or None when no cache is configured
+        """
+        if self.cache is None:
+            return None
+        if messages is None:
+            messages = self.conversation_history
+        return ResponseCache.make_key(
+            self.model,
+            self.temperature,
+            system_prompt,
+            messages,
+            max_tokens=max_tokens or DEFAULT_MAX_TOKENS,
+            # A reply still cut off after fewer continuations is shorter
+            max_continuations=self.max_continuations,
+        )
+    
+    def complete(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[SystemPrompt] = None,
+        use_cache: bool = True,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """
+        Get a completion for explicit messages without touching the history.
+        
+        Args:
+            messages: Messages to send
+            system_prompt: Optional system prompt to guide Claude's behavior
+            use_cache: Set to False to bypass the local response cache and the sharing
+                of identical requests in flight
+            max_tokens: Output token limit. Defaults to DEFAULT_MAX_TOKENS.
+            
+        Returns:
+            Claude's response as a string
+            
+        Raises:
+            LLMError: If the call fails or returns no content
+        """
+        with self.telemetry.span("llm", operation="complete", model=self.model, stream=False) as call:
+            cache_key = self._cache_key(system_prompt, messages, max_tokens) if use_cache else None
+            call["response_cache_hit"] = False
+            if cache_key is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    call["response_cache_hit"] = True
+                    return cached
+            
+            api_params = self._build_api_params(system_prompt, messages, max_tokens)
+            self.last_usage = {}
+            assistant_message = self._complete_text(api_params, call, coalesce=use_cache)
+            call.update(self.last_usage)
+            if cache_key is not None:
+                self.cache.set(cache_key, assistant_message)
+            return assistant_message
+    
+    def send_message(
+        self,
+        message: str,
+        system_prompt: Optional[SystemPrompt] = None,
+        use_cache: bool = True,
+        max_tokens: Optional[int] = None,
+    ) -> str:
         """
         Send a message to Claude and get a response.
         
+        A reply cut off at max_tokens is continued until it ends, up to
+        max_continuations follow-up requests.
+        
         Args:
             message: User message to send
             system_prompt: Optional system prompt to guide Claude's behavior
+            use_cache: Set to False to bypass the local response cache and the sharing
+                of identical requests in flight
+            max_tokens: Output token limit per request. Defaults to DEFAULT_MAX_TOKENS.
             
         Returns:
             Claude's response as a string
+            
+        Raises:
+            LLMError: If the call fails; the user message is not kept in the history
         """
+        # Add user message to history
+        self.add_message("user", message)
+        self.last_usage = {}
         try:
-            # Add user message to history
-            self.add_message("user", message)
-            
-            # Prepare messages for API call
-            messages = self.get_messages()
-            
-            # Prepare the API call parameters
-            api_params = {
-                "model": f"vertex_ai/{self.model}",
-                "messages": messages,
-                "max_tokens": 4096,
-                "temperature": 0.7,
-                "vertex_location": self.location,
-            }
-            
-            if system_prompt:
-                # Add system message at the beginning
-                messages_with_system = [{"role": "system", "content": system_prompt}] + messages
-                api_params["messages"] = messages_with_system
-            
-            # Make API call through LiteLLM
-            response = litellm.completion(**api_params)
-            
-            # Extract response content
-            if response and response.choices and len(response.choices) > 0:
-                assistant_message = response.choices[0].message.content
+            with self._track_call("send_message", stream=False) as call:
+                started = time.perf_counter()
+                self.compact_history()
+                call["compact_s"] = round(time.perf_counter() - started, 6)
+                
+                cache_key = self._cache_key(system_prompt, max_tokens=max_tokens) if use_cache else None
+                call["response_cache_hit"] = False
+                if cache_key is not None:
+                    cached = self.cache.get(cache_key)
+                    if cached is not None:
+                        call["response_cache_hit"] = True
+                        self.add_message("assistant", cached)
+                        return cached
+                
+                # Prepare the API call parameters
+                api_params = self._build_api_params(system_prompt, max_tokens=max_tokens)
+                
+                # Make API call through the shared transport
+                assistant_message = self._complete_text(api_params, call, coalesce=use_cache)
                 self.add_message("assistant", assistant_message)
+                if cache_key is not None:
+                    self.cache.set(cache_key, assistant_message)
                 return assistant_message
-            else:
-                return "Sorry, I couldn't generate a response."
+        
+        except BaseException as e:
+            self._discard_last_user_message()
+            if isinstance(e, Exception) and not isinstance(e, LLMError):
+                raise LLMError(str(e)) from e
+            raise
+    
+    def stream_message(
+        self,
+        message: str,
+        system_prompt: Optional[SystemPrompt] = None,
+        use_cache: bool = True,
+        max_tokens: Optional[int] = None,
+    ) -> Iterator[str]:
+        """
+        Send a message to Claude and yield the response as it is generated.
+        
+        The complete reply is added to the conversation history once the
+        stream finishes, so the history matches what send_message would leave.
+        A reply cut off at max_tokens is continued in the same stream.
+        
+        Args:
+            message: User message to send
+            system_prompt: Optional system prompt to guide Claude's behavior
+            use_cache: Set to False to bypass the local response cache and the sharing
+                of identical requests in flight; a caller sharing another's
+                stream gets the whole reply as one chunk when it ends
+            max_tokens: Output token limit per request. Defaults to DEFAULT_MAX_TOKENS.
+            
+        Yields:
+            Chunks of Claude's response text in arrival order
+            
+        Raises:
+            LLMError: If the call fails; the user message is not kept in the history
+        """
+        # Add user message to history
+        self.add_message("user", message)
+        self.last_usage = {}
+        try:
+            with self._track_call("stream_message", stream=True) as call:
+                started = time.perf_counter()
+                self.compact_history()
+                call["compact_s"] = round(time.perf_counter() - started, 6)
+                
+                cache_key = self._cache_key(system_prompt, max_tokens=max_tokens) if use_cache else None
+                call["response_cache_hit"] = False
+                if cache_key is not None:
+                    cached = self.cache.get(cache_key)
+                    if cached is not None:
+                        call["response_cache_hit"] = True
+                        self.add_message("assistant", cached)
+                        yield cached
+                        return
+                
+                api_params = self._build_api_params(system_prompt, max_tokens=max_tokens)
+                api_params["stream_options"] = {"include_usage": True}
+                
+                if use_cache:
+                    call["coalesced"] = False
+                    deltas = get_single_flight().stream(
+                        "llm_completion",
+                        self._flight_payload(api_params),
+                        lambda: self._stream_text(api_params, call),
+                        lambda streamed: ("".join(streamed), self._call_outcome(call)),
+                        lambda shared: self._shared_reply(shared, call),
+                    )
+                else:
+                    deltas = self._stream_text(api_params, call)
+                
+                chunks: List[str] = []
+                for delta in deltas:
+                    chunks.append(delta)
+                    yield delta
                 
-        except Exception as e:
-            error_msg = f"Error communicating with Claude: {str(e)}"
-            print(f"Error: {error_msg}")
-            return error_msg
+                assistant_message = "".join(chunks)
+                if not assistant_message:
+                    raise LLMEmptyResponseError("the model returned no content")
+                self.add_message("assistant", assistant_message)
+                if cache_key is not None:
+                    self.cache.set(cache_key, assistant_message)
+        
+        except BaseException as e:
+            self._discard_last_user_message()
+            if isinstance(e, Exception) and not isinstance(e, LLMError):
+                raise LLMError(str(e)) from e
+            raise
+    
+    def _discard_last_user_message(self) -> None:
+        """Drop the pending user message after a failed or cancelled call."""
+        if self.conversation_history and self.conversation_history[-1]["role"] == "user":
+            self.conversation_history.pop()
     
     def get_model_info(self) -> Dict[str, Any]:
         """Get information about the current model."""
@@ -110,5 +987,330 @@ class ClaudeClient:
             "model": self.model,
             "api_key_set": bool(self.api_key),
             "location": self.location,
-            "history_length": len(self.conversation_history)
-        } 
\ No newline at end of file
+            "provider": self.transport.provider,
+            "history_length": len(self.conversation_history),
+            "history": self.history_manager.get_stats(),
+            "transport": self.transport.get_stats(),
+            "prompt_caching": self.prompt_caching,
+            "last_cache_read_tokens": self.last_usage.get("cache_read_tokens", 0),
+            **self.cache_stats,
+            "response_cache": self.cache.stats() if self.cache is not None else None,
+            "max_continuations": self.max_continuations,
+            "continuations": dict(self.continuation_stats),
+        }
+
+
+class AsyncClaudeClient(ClaudeClient):
+    """Asynchronous Claude client built on litellm.acompletion."""
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        prompt_caching: Optional[bool] = None,
+        cache: Optional[ResponseCache] = None,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        semaphore: Optional[asyncio.Semaphore] = None,
+        transport: Optional[ClaudeTransport] = None,
+        telemetry: Optional[Telemetry] = None,
+        max_continuations: Optional[int] = None,
+    ):
+        """
+        Initialize the async Claude client.
+        
+        Args:
+            api_key: Google Cloud API key. If not provided, will try to get from environment.
+            model: Claude model to use. Defaults to claude-3-7-sonnet-20250219.
+            prompt_caching: Mark the system prompt and history prefix as cacheable.
+            cache: Local response cache shared with the sync client.
+            max_concurrency: Maximum in-flight requests. Defaults to CLAUDE_MAX_CONCURRENCY or 8.
+            timeout: Default per-call timeout in seconds, including time queued
+                for the semaphore. Defaults to CLAUDE_TIMEOUT or no timeout.
+            semaphore: Semaphore shared with other clients. Overrides max_concurrency
+                so several conversations can draw from one concurrency budget.
+            transport: Shared transport holding credentials and configuration.
+            telemetry: Receives one "llm" record per call.
+            max_continuations: Follow-up requests made for a reply cut off at max_tokens.
+        """
+        super().__init__(
+            api_key=api_key,
+            model=model,
+            prompt_caching=prompt_caching,
+            cache=cache,
+            transport=transport,
+            telemetry=telemetry,
+            max_continuations=max_continuations,
+        )
+        
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("CLAUDE_MAX_CONCURRENCY", "8"))
+        if timeout is None and os.getenv("CLAUDE_TIMEOUT"):
+            timeout = float(os.getenv("CLAUDE_TIMEOUT"))
+        
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.semaphore = semaphore or asyncio.Semaphore(max_concurrency)
+    
+    async def _acomplete(self, api_params: Dict[str, Any], call: Dict[str, Any]) -> Any:
+        """Run one completion while holding a concurrency slot, adding both times to the record."""
+        started = time.perf_counter()
+        async with self.semaphore:
+            call["queue_s"] = round(call.get("queue_s", 0.0) + time.perf_counter() - started, 6)
+            started = time.perf_counter()
+            response = await self.transport.acompletion(timing=call, **api_params)
+            call["llm_s"] = round(call.get("llm_s", 0.0) + time.perf_counter() - started, 6)
+            return response
+    
+    async def _acomplete_text(
+        self, api_params: Dict[str, Any], call: Dict[str, Any], timeout: Optional[float], coalesce: bool = False
+    ) -> str:
+        """
+        Async _complete_text: each request, first or follow-up, gets the full timeout.
+        
+        Raises:
+            LLMTimeoutError: If a request does not finish within the timeout
+        """
+        if coalesce:
+            async def lead() -> Tuple[str, Dict[str, Any]]:
+                text = await self._acomplete_text(api_params, call, timeout)
+                return text, self._call_outcome(call)
+            
+            (text, outcome), call["coalesced"] = await get_single_flight().arun(
+                "llm_completion", self._flight_payload(api_params), lead
+            )
+            if call["coalesced"]:
+                self._adopt_outcome(outcome, call)
+            return text
+        try:
+            response = await asyncio.wait_for(self._acomplete(api_params, call), timeout)
+            self._record_usage(getattr(response, "usage", None))
+            text = self._response_text(response, call)
+            while self._should_continue(text, call):
+                continued = time.perf_counter()
+                response = await asyncio.wait_for(
+                    self._acomplete(self._continuation_params(api_params, text), call), timeout
+                )
+                self._record_usage(getattr(response, "usage", None), accumulate=True)
+                text = text.rstrip() + self._continuation_text(response, call)
+                self._record_continuation(call, continued)
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(f"no answer within {timeout:g}s") from None
+        return text
+    
+    async def _astream_text(self, api_params: Dict[str, Any], call: Dict[str, Any]) -> AsyncIterator[str]:
+        """Async _stream_text, holding a concurrency slot for the whole reply."""
+        chunks: List[str] = []
+        held = ""
+        params = api_params
+        started = time.perf_counter()
+        async with self.semaphore:
+            call["queue_s"] = round(time.perf_counter() - started, 6)
+            started = time.perf_counter()
+            while True:
+                continued = time.perf_counter()
+                call["finish_reason"] = None
+                async for chunk in await self.transport.acompletion(timing=call, **params):
+                    self._record_usage(getattr(chunk, "usage", None), accumulate=params is not api_params)
+                    if not chunk.choices:
+                        continue
+                    if chunk.choices[0].finish_reason:
+                        call["finish_reason"] = chunk.choices[0].finish_reason
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if "ttft_s" not in call:
+                            call["ttft_s"] = round(time.perf_counter() - started, 6)
+                        delta, held = _hold_whitespace(held + delta)
+                        if delta:
+                            chunks.append(delta)
+                            yield delta
+                if params is not api_params:
+                    self._record_continuation(call, continued)
+                if not self._should_continue("".join(chunks), call):
+                    break
+                held = ""
+                params = self._continuation_params(api_params, "".join(chunks))
+            if held:
+                yield held
+            call["llm_s"] = round(time.perf_counter() - started, 6)
+    
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[SystemPrompt] = None,
+        use_cache: bool = True,
+        timeout: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """
+        Get a completion for explicit messages without touching the history.
+        
+        Use this to fan out independent requests, such as several candidates
+        for the same prompt, from one client.
+        
+        Args:
+            messages: Messages to send
+            system_prompt: Optional system prompt to guide Claude's behavior
+            use_cache: Set to False to bypass the local response cache and the sharing
+                of identical requests in flight
+            timeout: Per-request timeout in seconds. Defaults to the client timeout.
+            max_tokens: Output token limit per request. Defaults to DEFAULT_MAX_TOKENS.
+            
+        Returns:
+            Claude's response as a string, continued past max_tokens
+            
+        Raises:
+            LLMTimeoutError: If a request does not finish within the timeout
+            LLMError: If the call fails or returns no content
+        """
+        with self.telemetry.span("llm", operation="complete", model=self.model, stream=False) as call:
+            cache_key = self._cache_key(system_prompt, messages, max_tokens) if use_cache else None
+            call["response_cache_hit"] = False
+            if cache_key is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    call["response_cache_hit"] = True
+                    return cached
+            
+            api_params = self._build_api_params(system_prompt, messages, max_tokens)
+            timeout = timeout if timeout is not None else self.timeout
+            self.last_usage = {}
+            assistant_message = await self._acomplete_text(api_params, call, timeout, coalesce=use_cache)
+            call.update(self.last_usage)
+            if cache_key is not None:
+                self.cache.set(cache_key, assistant_message)
+            return assistant_message
+    
+    async def send_message(
+        self,
+        message: str,
+        system_prompt: Optional[SystemPrompt] = None,
+        use_cache: bool = True,
+        timeout: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """
+        Send a message to Claude and get a response.
+        
+        History is updated exactly as in ClaudeClient.send_message. If the
+        call is cancelled, the user message is removed again so the
+        conversation can be retried cleanly.
+        
+        Args:
+            message: User message to send
+            system_prompt: Optional system prompt to guide Claude's behavior
+            use_cache: Set to False to bypass the local response cache and the sharing
+                of identical requests in flight
+            timeout: Per-request timeout in seconds. Defaults to the client timeout.
+            max_tokens: Output token limit per request. Defaults to DEFAULT_MAX_TOKENS.
+            
+        Returns:
+            Claude's response as a string
+            
+        Raises:
+            LLMError: If the call fails; the user message is not kept in the history
+        """
+        self.add_message("user", message)
+        self.last_usage = {}
+        try:
+            await asyncio.to_thread(self.compact_history)
+            assistant_message = await self.complete(
+                self.get_messages(), system_prompt, use_cache=use_cache, timeout=timeout, max_tokens=max_tokens
+            )
+            self.add_message("assistant", assistant_message)
+            return assistant_message
+        
+        except BaseException as e:
+            self._discard_last_user_message()
+            if isinstance(e, Exception) and not isinstance(e, LLMError):
+                raise LLMError(str(e)) from e
+            raise
+    
+    async def stream_message(
+        self,
+        message: str,
+        system_prompt: Optional[SystemPrompt] = None,
+        use_cache: bool = True,
+        timeout: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Send a message to Claude and yield the response as it is generated.
+        
+        A reply cut off at max_tokens is continued in the same stream.
+        
+        Args:
+            message: User message to send
+            system_prompt: Optional system prompt to guide Claude's behavior
+            use_cache: Set to False to bypass the local response cache and the sharing
+                of identical requests in flight
+            timeout: Request timeout in seconds passed to LiteLLM
+            max_tokens: Output token limit per request. Defaults to DEFAULT_MAX_TOKENS.
+            
+        Yields:
+            Chunks of Claude's response text in arrival order
+            
+        Raises:
+            LLMError: If the call fails; the user message is not kept in the history
+        """
+        self.add_message("user", message)
+        self.last_usage = {}
+        try:
+            with self._track_call("stream_message", stream=True) as call:
+                started = time.perf_counter()
+                await asyncio.to_thread(self.compact_history)
+                call["compact_s"] = round(time.perf_counter() - started, 6)
+                
+                cache_key = self._cache_key(system_prompt, max_tokens=max_tokens) if use_cache else None
+                call["response_cache_hit"] = False
+                if cache_key is not None:
+                    cached = self.cache.get(cache_key)
+                    if cached is not None:
+                        call["response_cache_hit"] = True
+                        self.add_message("assistant", cached)
+                        yield cached
+                        return
+                
+                api_params = self._build_api_params(system_prompt, max_tokens=max_tokens)
+                api_params["stream"] = True
+                api_params["stream_options"] = {"include_usage": True}
+                timeout = timeout if timeout is not None else self.timeout
+                if timeout is not None:
+                    api_params["timeout"] = timeout
+                
+                if use_cache:
+                    call["coalesced"] = False
+                    deltas = get_single_flight().astream(
+                        "llm_completion",
+                        self._flight_payload(api_params),
+                        lambda: self._astream_text(api_params, call),
+                        lambda streamed: ("".join(streamed), self._call_outcome(call)),
+                        lambda shared: self._shared_reply(shared, call),
+                    )
+                else:
+                    deltas = self._astream_text(api_params, call)
+                
+                chunks: List[str] = []
+                async for delta in deltas:
+                    chunks.append(delta)
+                    yield delta
+                
+                assistant_message = "".join(chunks)
+                if not assistant_message:
+                    raise LLMEmptyResponseError("the model returned no content")
+                self.add_message("assistant", assistant_message)
+                if cache_key is not None:
+                    self.cache.set(cache_key, assistant_message)
+        
+        except BaseException as e:
+            self._discard_last_user_message()
+            if isinstance(e, Exception) and not isinstance(e, LLMError):
+                raise LLMError(str(e)) from e
+            raise
+    
+    def get_model_info(self) -> Dict[str, Any]:
+        """Get information about the current model."""
+        info = super().get_model_info()
+        info["max_concurrency"] = self.max_concurrency
+        info["timeout"] = self.timeout
+        return info
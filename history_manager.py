@@ -0,0 +1,163 @@
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+# Summarizer signature: (messages to fold in, previous summary or None) -> summary
+Summarizer = Callable[[List[Dict[str, str]], Optional[str]], str]
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an assistant that is gathering requirements for a conversational AI bot.
+
+Update the previous summary (if any) with the new messages. Preserve every concrete fact the user has stated or confirmed, because the final use case is written from this summary:
+- company/organization, industry, business objective, target audience and business process
+- information to collect, variables, verification and authentication steps
+- conversation flow, edge cases, wrong-person and escalation handling
+- languages, tone, compliance constraints and any decisions or corrections the user made
+- questions the assistant asked that are still unanswered
+
+Drop greetings, repetition and the assistant's reasoning. If a specification JSON appears, keep only what changed and why, not the JSON itself.
+Output only the updated summary as concise bullet points."""
+
+SUMMARY_HEADER = "Summary of our conversation so far:"
+SUMMARY_ACK = "Understood. I'll continue from this summary."
+
+
+class HistoryManager:
+    """Keeps a conversation history within a token budget by compacting old turns."""
+
+    def __init__(
+        self,
+        model: str,
+        token_budget: Optional[int] = None,
+        keep_turns: Optional[int] = None,
+        summarizer: Optional[Summarizer] = None,
+    ):
+        """
+        Initialize the history manager.
+
+        Args:
+            model: Model name used to pick the tokenizer
+            token_budget: History size in tokens that triggers compaction.
+                Defaults to CLAUDE_HISTORY_TOKEN_BUDGET or 60000. 0 disables compaction.
+            keep_turns: Most recent user/assistant turns kept verbatim.
+                Defaults to CLAUDE_HISTORY_KEEP_TURNS or 4.
+            summarizer: Function that folds old messages into the rolling summary
+        """
+        if token_budget is None:
+            token_budget = int(os.getenv("CLAUDE_HISTORY_TOKEN_BUDGET", "60000"))
+        if keep_turns is None:
+            keep_turns = int(os.getenv("CLAUDE_HISTORY_KEEP_TURNS", "4"))
+
+        self.model = model
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summarizer = summarizer
+
+        self.summary: Optional[str] = None
+        self._token_counts: Dict[str, int] = {}
+        self.stats = {
+            "compactions": 0,
+            "history_tokens": 0,
+            "tokens_before_last_compaction": 0,
+            "tokens_after_last_compaction": 0,
+            "tokens_removed": 0,
+        }
+
+    def reset(self) -> None:
+        """Forget the rolling summary, e.g. when the history is cleared."""
+        self.summary = None
+        self._token_counts.clear()
+        self.stats["history_tokens"] = 0
+
+    def count_message_tokens(self, message: Dict[str, str]) -> int:
+        """
+        Count the tokens in one message, memoized by content.
+
+        Args:
+            message: Chat message
+
+        Returns:
+            Token count
+        """
+        content = message["content"]
+        count = self._token_counts.get(content)
+        if count is None:
+            try:
+                from claude_client import get_litellm
+
+                count = get_litellm().token_counter(model=self.model, text=content)
+            except Exception:
+                # Rough local estimate when no tokenizer is available
+                count = len(content) // 4 + 1
+            self._token_counts[content] = count
+        return count
+
+    def count_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """Count the tokens in a list of messages."""
+        return sum(self.count_message_tokens(message) for message in messages)
+
+    def compact(self, messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Compact the history if it is over budget.
+
+        The first user message (the original use case) is kept verbatim and
+        carries the rolling summary; the last keep_turns turns and any pending
+        user message are kept as they are.
+
+        Args:
+            messages: Conversation history, oldest first
+
+        Returns:
+            The history to use, which is `messages` itself when under budget
+        """
+        tokens = self.count_tokens(messages)
+        self.stats["history_tokens"] = tokens
+        if not self.token_budget or self.summarizer is None or tokens <= self.token_budget:
+            return messages
+
+        # Verbatim tail: the last keep_turns turns, starting on a user message
+        tail_start = len(messages) - 2 * self.keep_turns
+        if messages and messages[-1]["role"] == "user":
+            tail_start -= 1
+        tail_start = max(tail_start, 0)
+        while tail_start < len(messages) and messages[tail_start]["role"] != "user":
+            tail_start += 1
+
+        # A compacted history starts with [pinned + summary, acknowledgement]
+        first = 2 if self.summary is not None else 1
+        if tail_start <= first:
+            return messages
+
+        pinned = messages[0]["content"]
+        if self.summary is not None:
+            pinned = pinned.split(f"\n\n{SUMMARY_HEADER}\n", 1)[0]
+        old = messages[first:tail_start]
+
+        try:
+            self.summary = self.summarizer(old, self.summary)
+        except Exception as e:
+            print(f"Error compacting history: {e}")
+            return messages
+
+        compacted = [
+            {"role": "user", "content": f"{pinned}\n\n{SUMMARY_HEADER}\n{self.summary}"},
+            {"role": "assistant", "content": SUMMARY_ACK},
+        ] + messages[tail_start:]
+
+        after = self.count_tokens(compacted)
+        self.stats["compactions"] += 1
+        self.stats["history_tokens"] = after
+        self.stats["tokens_before_last_compaction"] = tokens
+        self.stats["tokens_after_last_compaction"] = after
+        self.stats["tokens_removed"] += tokens - after
+
+        # Drop memoized counts for messages that are gone
+        live = {message["content"] for message in compacted}
+        self._token_counts = {k: v for k, v in self._token_counts.items() if k in live}
+        return compacted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the budget and compaction statistics."""
+        return {
+            "token_budget": self.token_budget,
+            "keep_turns": self.keep_turns,
+            **self.stats,
+        }
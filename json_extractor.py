@@ -0,0 +1,207 @@
+import json
+import re
+import time
+from typing import Any, Optional, Tuple
+
+from telemetry import get_telemetry
+
+# Inside an object: a complete string literal, a brace, or the quote opening
+# a string that has not been fully received yet
+_OBJECT_TOKENS = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}]|"')
+# How a real JSON object opens, as opposed to a "{" in prose
+_OBJECT_START = re.compile(r'\{\s*["}]')
+# The same for an array of objects, such as a JSON Patch
+_ARRAY_TOKENS = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]]|"')
+_ARRAY_START = re.compile(r'\[\s*[{\]]')
+
+
+class JsonExtractor:
+    """
+    Single-pass scanner for the first top-level JSON object in model output,
+    or with kind=list the first array of objects.
+
+    The scanner tracks brace depth and string state, so braces inside string
+    values and prose around the object (code fences, explanations, a stray
+    trailing "}") do not confuse it. Text can be fed in chunks while a reply
+    is streaming; the object is reported as soon as its closing brace arrives.
+    Each candidate span is parsed once with json.loads. A candidate that
+    opens like an object but does not parse is skipped whole, so the nested
+    values of a malformed spec are never returned in its place.
+    """
+
+    def __init__(self, kind: type = dict):
+        """
+        Initialize the scanner.
+
+        Args:
+            kind: dict to find an object, list to find an array of objects
+        """
+        self.kind = kind
+        if kind is list:
+            self._open, self._close, self._tokens, self._start = "[", "]", _ARRAY_TOKENS, _ARRAY_START
+        else:
+            self._open, self._close, self._tokens, self._start = "{", "}", _OBJECT_TOKENS, _OBJECT_START
+        self.text = ""
+        self.result: Optional[Any] = None
+        self.start: Optional[int] = None
+        self.end: Optional[int] = None
+
+        self._pos = 0
+        self._depth = 0
+        self._candidate_start = -1
+
+    @property
+    def done(self) -> bool:
+        """Whether a complete object has been found."""
+        return self.result is not None
+
+    @property
+    def in_object(self) -> bool:
+        """Whether the scanner is inside a not yet closed candidate object."""
+        return self._depth > 0
+
+    def feed(self, chunk: str) -> Optional[Any]:
+        """
+        Add text and continue scanning.
+
+        Args:
+            chunk: Next piece of the response
+
+        Returns:
+            The object once it is complete, otherwise None
+        """
+        if self.result is not None:
+            return self.result
+        self.text += chunk
+        self._scan()
+        return self.result
+
+    def finish(self) -> Optional[Any]:
+        """
+        Signal the end of the text.
+
+        An unbalanced "{" in prose before the object leaves the scanner inside
+        a candidate that never closes; rescan from just after each such brace.
+        A candidate that opens like a JSON object is a truncated object, and
+        its nested values are not reported in its place.
+
+        Returns:
+            The object, or None if the text contains none
+        """
+        while self.result is None and self._depth > 0:
+            if self._start.match(self.text, self._candidate_start):
+                break
+            self._pos = self._candidate_start + 1
+            self._depth = 0
+            self._scan()
+        return self.result
+
+    def _scan(self) -> None:
+        text = self.text
+        pos = self._pos
+        length = len(text)
+
+        while pos < length and self.result is None:
+            if self._depth == 0:
+                start = text.find(self._open, pos)
+                if start < 0:
+                    pos = length
+                    break
+                self._candidate_start = start
+                self._depth = 1
+                pos = start + 1
+
+            for match in self._tokens.finditer(text, pos):
+                token = match.group()
+                if token == '"':
+                    # Unterminated string: wait for the rest of it
+                    pos = match.start()
+                    self._pos = pos
+                    return
+                pos = match.end()
+                if token == self._open:
+                    self._depth += 1
+                elif token == self._close:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._close_candidate(pos)
+                        if self.result is None and not self._start.match(text, self._candidate_start):
+                            # Not JSON (e.g. "{name}" in prose): look for the next "{"
+                            pos = self._candidate_start + 1
+                        break
+            else:
+                pos = length
+
+        self._pos = pos
+
+    def _close_candidate(self, end: int) -> None:
+        """Parse a balanced candidate span once and keep it if it is of the wanted kind."""
+        if not self._start.match(self.text, self._candidate_start):
+            # "[1]" or "{x}" in prose
+            return
+        try:
+            parsed = json.loads(self.text[self._candidate_start : end])
+        except ValueError:
+            return
+        if isinstance(parsed, self.kind):
+            self.result = parsed
+            self.start = self._candidate_start
+            self.end = end
+
+
+def find_json_object(text: str) -> Optional[Tuple[dict, int, int]]:
+    """
+    Find the first top-level JSON object in text.
+
+    Args:
+        text: Model output
+
+    Returns:
+        (object, start offset, end offset) or None if there is no object
+    """
+    # Fast path for the common reply that is nothing but the object
+    stripped = text.strip()
+    if stripped.startswith("{") and stripped.endswith("}"):
+        try:
+            parsed = json.loads(stripped)
+        except ValueError:
+            parsed = None
+        if isinstance(parsed, dict):
+            start = text.index("{")
+            return parsed, start, start + len(stripped)
+
+    extractor = JsonExtractor()
+    extractor.feed(text)
+    if extractor.finish() is None:
+        return None
+    return extractor.result, extractor.start, extractor.end
+
+
+def find_json_array(text: str) -> Optional[Tuple[list, int, int]]:
+    """
+    Find the first top-level JSON array of objects in text.
+
+    Args:
+        text: Model output
+
+    Returns:
+        (array, start offset, end offset) or None if there is no such array
+    """
+    extractor = JsonExtractor(kind=list)
+    extractor.feed(text)
+    if extractor.finish() is None:
+        return None
+    return extractor.result, extractor.start, extractor.end
+
+
+def extract_json(text: str) -> Optional[dict]:
+    """Extract the first top-level JSON object from Claude's response."""
+    started = time.perf_counter()
+    found = find_json_object(text)
+    get_telemetry().emit(
+        "extract_json",
+        wall_s=round(time.perf_counter() - started, 6),
+        chars=len(text),
+        found=found is not None,
+    )
+    return found[0] if found else None
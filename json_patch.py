@@ -0,0 +1,128 @@
+import copy
+from typing import Any, List, Tuple
+
+OPERATIONS = ("add", "remove", "replace", "move", "copy", "test")
+
+
+class JsonPatchError(ValueError):
+    """Raised when a JSON Patch is malformed or does not apply to the document."""
+
+
+def parse_pointer(pointer: str) -> List[str]:
+    """
+    Split an RFC 6901 JSON Pointer into unescaped reference tokens.
+
+    Args:
+        pointer: Pointer such as "/agent_config/states/Greeting"
+
+    Returns:
+        Reference tokens; empty for the whole document ("")
+    """
+    if pointer == "":
+        return []
+    if not isinstance(pointer, str) or not pointer.startswith("/"):
+        raise JsonPatchError(f"invalid JSON pointer: {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _index(container: list, token: str, allow_end: bool) -> int:
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise JsonPatchError(f"invalid array index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise JsonPatchError(f"array index out of range: {index}")
+    return index
+
+
+def _resolve(doc: Any, tokens: List[str]) -> Any:
+    for token in tokens:
+        if isinstance(doc, dict):
+            if token not in doc:
+                raise JsonPatchError(f"path not found: {token!r}")
+            doc = doc[token]
+        elif isinstance(doc, list):
+            doc = doc[_index(doc, token, allow_end=False)]
+        else:
+            raise JsonPatchError(f"cannot index into a scalar with {token!r}")
+    return doc
+
+
+def _parent(doc: Any, pointer: str) -> Tuple[Any, str]:
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        raise JsonPatchError("operation on the whole document is not supported")
+    parent = _resolve(doc, tokens[:-1])
+    if not isinstance(parent, (dict, list)):
+        raise JsonPatchError(f"parent of {pointer!r} is not a container")
+    return parent, tokens[-1]
+
+
+def _add(doc: Any, pointer: str, value: Any) -> None:
+    parent, token = _parent(doc, pointer)
+    if isinstance(parent, dict):
+        parent[token] = value
+    else:
+        parent.insert(_index(parent, token, allow_end=True), value)
+
+
+def _remove(doc: Any, pointer: str) -> Any:
+    parent, token = _parent(doc, pointer)
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise JsonPatchError(f"path not found: {pointer!r}")
+        return parent.pop(token)
+    return parent.pop(_index(parent, token, allow_end=False))
+
+
+def apply_patch(doc: Any, patch: List[dict]) -> Any:
+    """
+    Apply an RFC 6902 JSON Patch.
+
+    The patch is applied to a copy, so a failing operation leaves the
+    original untouched and no partial result is ever returned.
+
+    Args:
+        doc: Document to patch
+        patch: List of operations ({"op", "path", ...})
+
+    Returns:
+        The patched copy of the document
+
+    Raises:
+        JsonPatchError: If the patch is malformed, a path does not exist or a
+            test operation fails
+    """
+    if not isinstance(patch, list):
+        raise JsonPatchError("a JSON Patch must be an array of operations")
+
+    doc = copy.deepcopy(doc)
+    for number, operation in enumerate(patch):
+        if not isinstance(operation, dict) or operation.get("op") not in OPERATIONS or "path" not in operation:
+            raise JsonPatchError(f"operation {number} is malformed: {operation!r}")
+        op, path = operation["op"], operation["path"]
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise JsonPatchError(f"operation {number} ({op}) has no value")
+        if op in ("move", "copy") and "from" not in operation:
+            raise JsonPatchError(f"operation {number} ({op}) has no from")
+
+        try:
+            if op == "add":
+                _add(doc, path, copy.deepcopy(operation["value"]))
+            elif op == "remove":
+                _remove(doc, path)
+            elif op == "replace":
+                _remove(doc, path)
+                _add(doc, path, copy.deepcopy(operation["value"]))
+            elif op == "move":
+                if path.startswith(operation["from"] + "/"):
+                    raise JsonPatchError("cannot move a value into one of its children")
+                _add(doc, path, _remove(doc, operation["from"]))
+            elif op == "copy":
+                _add(doc, path, copy.deepcopy(_resolve(doc, parse_pointer(operation["from"]))))
+            elif _resolve(doc, parse_pointer(path)) != operation["value"]:
+                raise JsonPatchError(f"test failed at {path!r}")
+        except JsonPatchError as e:
+            raise JsonPatchError(f"operation {number} ({op} {path}): {e}") from None
+    return doc
@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined
+
+
+class TemplateRegistry:
+    """
+    Process-wide registry of compiled prompt templates.
+
+    Each template is compiled once and recompiled only when its file's mtime
+    changes (Jinja's auto_reload check). Rendered prompts are memoized by
+    template, file mtime and render variables, so repeated renders of the
+    same inputs are a dictionary lookup.
+    """
+
+    def __init__(self, search_path: str = ".", max_rendered: int = 128):
+        """
+        Initialize the registry.
+
+        Args:
+            search_path: Directory the templates are loaded from
+            max_rendered: Number of rendered prompts kept
+        """
+        self.search_path = search_path
+        self.max_rendered = max_rendered
+        self.env = Environment(
+            loader=FileSystemLoader(search_path),
+            auto_reload=True,
+            keep_trailing_newline=True,
+            undefined=StrictUndefined,
+        )
+        self._lock = threading.Lock()
+        self._rendered: "OrderedDict[tuple, str]" = OrderedDict()
+        self.stats = {"renders": 0, "render_hits": 0}
+
+    def render(self, name: str, **variables: Any) -> str:
+        """
+        Render a template.
+
+        Args:
+            name: Template file name relative to the search path
+            **variables: Template variables
+
+        Returns:
+            The rendered prompt
+
+        Raises:
+            jinja2.TemplateNotFound: If the template file does not exist
+        """
+        # get_template recompiles the template if the file changed on disk
+        template = self.env.get_template(name)
+        mtime = os.path.getmtime(template.filename)
+        key = (name, mtime, json.dumps(variables, sort_keys=True, default=str))
+
+        with self._lock:
+            rendered = self._rendered.get(key)
+            if rendered is not None:
+                self._rendered.move_to_end(key)
+                self.stats["render_hits"] += 1
+                return rendered
+
+        rendered = template.render(**variables)
+
+        with self._lock:
+            self._rendered[key] = rendered
+            while len(self._rendered) > self.max_rendered:
+                self._rendered.popitem(last=False)
+            self.stats["renders"] += 1
+        return rendered
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get render counters and cache size."""
+        with self._lock:
+            return {**self.stats, "rendered_cached": len(self._rendered)}
+
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+
+def get_registry() -> TemplateRegistry:
+    """Return the process-wide registry for the repository's prompt templates."""
+    global _default_registry
+    if _default_registry is None:
+        with _default_lock:
+            if _default_registry is None:
+                _default_registry = TemplateRegistry(os.path.dirname(os.path.abspath(__file__)))
+    return _default_registry
@@ -0,0 +1,629 @@
+import asyncio
+import contextvars
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# Seconds before the first hedge while an endpoint has too few latency samples
+DEFAULT_HEDGE_DELAYS = {"stream": 10.0, "completion": 60.0}
+
+# Latency samples kept per endpoint and call kind
+LATENCY_WINDOW = 200
+
+# Provider errors that would fail the same way everywhere; they are raised at
+# once instead of failing over, and do not count against an endpoint
+NON_RETRYABLE_STATUS = (400, 401, 403, 413, 422)
+
+
+class LLMError(Exception):
+    """A model call failed."""
+
+    def __init__(self, message: str, endpoint: Optional[str] = None):
+        super().__init__(message)
+        self.endpoint = endpoint
+
+
+class LLMTimeoutError(LLMError):
+    """No endpoint answered within the timeout."""
+
+
+class LLMUnavailableError(LLMError):
+    """Every endpoint failed or has an open circuit."""
+
+    def __init__(self, message: str, errors: Optional[List[str]] = None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+class LLMEmptyResponseError(LLMError):
+    """The model returned no content."""
+
+
+class AttemptAbandoned(Exception):
+    """Raised by an attempt whose race another endpoint already won; not held against its endpoint."""
+
+
+# Set while a racing attempt runs; see attempt_abandoned
+_race_settled: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("race_settled", default=None)
+
+
+def attempt_abandoned() -> bool:
+    """
+    Whether another endpoint already answered the call the current attempt belongs to.
+
+    An attempt checks this before sending (after waiting for a connection
+    slot, say) and raises AttemptAbandoned instead of sending a request
+    nobody will read.
+    """
+    settled = _race_settled.get()
+    return settled is not None and settled.is_set()
+
+
+class Endpoint(NamedTuple):
+    """A model served from one location (Vertex) or base URL (other providers)."""
+
+    model: str
+    location: Optional[str] = None
+    api_base: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.model}@{self.location or self.api_base or 'default'}"
+
+
+def parse_endpoints(value: str, model: str) -> List[Endpoint]:
+    """
+    Parse a comma-separated endpoint list.
+
+    Each item is "model@target" or just "target" for the default model. A
+    target starting with http is an API base URL, anything else a location,
+    e.g. "us-east5,claude-3-7-sonnet@20250219@europe-west1".
+
+    Args:
+        value: Endpoint list
+        model: Model for items without one
+
+    Returns:
+        Endpoints in priority order
+    """
+    endpoints = []
+    for item in (part.strip() for part in value.split(",")):
+        if not item:
+            continue
+        item_model, target = item.rsplit("@", 1) if "@" in item else (model, item)
+        if target.startswith("http"):
+            endpoints.append(Endpoint(item_model, api_base=target))
+        else:
+            endpoints.append(Endpoint(item_model, location=target))
+    return endpoints
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(int(round(pct / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+class CircuitBreaker:
+    """Stops sending requests to an endpoint after repeated failures."""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before one trial request
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """"closed", "open" or "half_open"."""
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def ready(self) -> bool:
+        """Whether a request could be sent now, without taking the half-open trial."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            return time.monotonic() - self.opened_at >= self.reset_timeout and not self._trial
+
+    def allow(self) -> bool:
+        """Whether a request may be sent; in half-open state only one trial is let through."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def cancel_trial(self) -> None:
+        """Give the half-open trial back after its request was cancelled."""
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                # A failed trial re-opens the circuit for another reset_timeout
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class RequestPolicy:
+    """
+    Routes model calls across endpoints with hedging, failover and circuit breakers.
+
+    A call goes to the first endpoint whose circuit is closed. If it has not
+    answered (or, for streams, sent its first chunk) by the endpoint's
+    hedge_percentile latency, a duplicate goes to the next endpoint and the
+    first answer wins. A failed attempt fails over to the next endpoint at
+    once. Each endpoint has a circuit breaker that skips it after repeated
+    failures.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[Endpoint],
+        hedge_percentile: float = 95.0,
+        hedge_min_samples: int = 10,
+        timeout: Optional[float] = None,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+    ):
+        """
+        Initialize the policy.
+
+        Args:
+            endpoints: Endpoints in priority order
+            hedge_percentile: Latency percentile of the current endpoint after
+                which a hedge is sent. 0 disables hedging.
+            hedge_min_samples: Samples needed before the percentile is used
+                instead of DEFAULT_HEDGE_DELAYS
+            timeout: Seconds to wait for an answer (the first chunk, for streams)
+            failure_threshold: Consecutive failures that open an endpoint's circuit
+            reset_timeout: Seconds before an open circuit lets a trial request through
+        """
+        if not endpoints:
+            raise ValueError("at least one endpoint is required")
+        self.endpoints = list(endpoints)
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.timeout = timeout
+        self.breakers = {e: CircuitBreaker(failure_threshold, reset_timeout) for e in self.endpoints}
+        self._latencies: Dict[Tuple[Endpoint, str], deque] = {}
+        self._lock = threading.Lock()
+        self.stats = {e.name: {"attempts": 0, "wins": 0, "failures": 0, "hedges": 0} for e in self.endpoints}
+
+    @classmethod
+    def from_env(cls, model: str, location: Optional[str] = None, api_base: Optional[str] = None) -> "RequestPolicy":
+        """
+        Build the policy from the environment.
+
+        CLAUDE_ENDPOINTS lists the endpoints (see parse_endpoints) and defaults
+        to the single configured model and location. CLAUDE_HEDGE_PERCENTILE,
+        CLAUDE_TIMEOUT, CLAUDE_BREAKER_FAILURES and CLAUDE_BREAKER_RESET_S set
+        the other options.
+        """
+        endpoints = parse_endpoints(os.getenv("CLAUDE_ENDPOINTS", ""), model)
+        if not endpoints:
+            endpoints = [Endpoint(model, location=location, api_base=api_base)]
+        return cls(
+            endpoints,
+            hedge_percentile=float(os.getenv("CLAUDE_HEDGE_PERCENTILE", "95")),
+            timeout=float(os.getenv("CLAUDE_TIMEOUT", "300")),
+            failure_threshold=int(os.getenv("CLAUDE_BREAKER_FAILURES", "3")),
+            reset_timeout=float(os.getenv("CLAUDE_BREAKER_RESET_S", "30")),
+        )
+
+    def hedge_delay(self, endpoint: Endpoint, kind: str) -> float:
+        """
+        Seconds to wait for an endpoint before hedging.
+
+        Args:
+            endpoint: Endpoint of the running attempt
+            kind: "stream" (time to first chunk) or "completion" (total time)
+        """
+        with self._lock:
+            samples = list(self._latencies.get((endpoint, kind), ()))
+        if len(samples) < self.hedge_min_samples:
+            return DEFAULT_HEDGE_DELAYS[kind]
+        return _percentile(samples, self.hedge_percentile)
+
+    def available(self) -> List[Endpoint]:
+        """Endpoints whose circuit would let a request through, in priority order."""
+        return [e for e in self.endpoints if self.breakers[e].ready()]
+
+    def _take(self, endpoints: List[Endpoint]) -> Optional[Endpoint]:
+        """Pop the next endpoint whose circuit admits a request now."""
+        while endpoints:
+            endpoint = endpoints.pop(0)
+            if self.breakers[endpoint].allow():
+                return endpoint
+        return None
+
+    def run(self, call: Callable[[Endpoint], Any], timing: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Run a blocking completion under the policy.
+
+        Args:
+            call: Sends the request to one endpoint and returns the response
+            timing: Telemetry record that receives endpoint, hedged and failovers
+
+        Returns:
+            The first successful response
+
+        Raises:
+            LLMError: A subclass describing why no endpoint answered
+        """
+        return self._race(call, "completion", timing)
+
+    def stream(self, open_stream: Callable[[Endpoint], Iterator[Any]], timing: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """
+        Run a streaming completion under the policy.
+
+        Hedging and failover apply until the first chunk arrives; after that
+        the stream stays on the winning endpoint.
+
+        Args:
+            open_stream: Returns a chunk iterator (a generator, so the losing
+                stream can be closed) for one endpoint
+            timing: Telemetry record that receives endpoint, hedged and failovers
+
+        Yields:
+            Chunks of the winning stream
+
+        Raises:
+            LLMError: A subclass describing why the stream failed
+        """
+        def first_chunk(endpoint: Endpoint) -> Tuple[Any, Iterator[Any]]:
+            chunks = open_stream(endpoint)
+            try:
+                return next(chunks), chunks
+            except StopIteration:
+                return None, chunks
+
+        endpoint, (first, chunks) = self._race(first_chunk, "stream", timing, with_endpoint=True)
+        try:
+            if first is not None:
+                yield first
+                yield from chunks
+        except GeneratorExit:
+            raise
+        except Exception as e:
+            self._record(endpoint, None)
+            raise LLMError(f"{endpoint.name}: stream failed: {e}", endpoint.name) from e
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    def _race(
+        self,
+        attempt: Callable[[Endpoint], Any],
+        kind: str,
+        timing: Optional[Dict[str, Any]],
+        with_endpoint: bool = False,
+    ) -> Any:
+        endpoints = self.available()
+        if not endpoints:
+            raise LLMUnavailableError("every endpoint's circuit is open")
+        timing = timing if timing is not None else {}
+        # A call continued over several requests shares one record
+        timing.setdefault("hedged", False)
+        timing.setdefault("failovers", 0)
+        if not self.hedge_percentile or len(endpoints) == 1:
+            return self._run_inline(attempt, kind, endpoints, timing, with_endpoint)
+
+        results: "queue.Queue[Tuple[Endpoint, Any, Optional[BaseException]]]" = queue.Queue()
+        settled = threading.Event()
+        settle_lock = threading.Lock()
+
+        def run_attempt(endpoint: Endpoint) -> None:
+            _race_settled.set(settled)
+            started = time.perf_counter()
+            try:
+                result, error = attempt(endpoint), None
+            except AttemptAbandoned:
+                self.breakers[endpoint].cancel_trial()
+                return
+            except BaseException as e:
+                result, error = None, e
+            self._finish(endpoint, kind, started, error)
+            with settle_lock:
+                if not settled.is_set():
+                    results.put((endpoint, result, error))
+                    return
+            # Another endpoint already won
+            _discard(result)
+
+        def launch(endpoint: Endpoint) -> None:
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(run_attempt, endpoint), daemon=True).start()
+
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        pending = list(endpoints)
+        first = self._take(pending)
+        if first is None:
+            raise LLMUnavailableError("every endpoint's circuit is open")
+        launch(first)
+        in_flight = 1
+        hedge_at = time.monotonic() + self.hedge_delay(first, kind) if self.hedge_percentile else None
+        errors: List[str] = []
+        try:
+            while True:
+                now = time.monotonic()
+                waits = [t - now for t in (deadline, hedge_at if pending else None) if t is not None]
+                try:
+                    endpoint, result, error = results.get(timeout=max(min(waits), 0) if waits else None)
+                except queue.Empty:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise LLMTimeoutError(f"no answer within {self.timeout:g}s")
+                    # The current attempt is slower than usual: send a duplicate
+                    hedge = self._take(pending)
+                    if hedge is not None:
+                        self._count(hedge, "hedges")
+                        timing["hedged"] = True
+                        launch(hedge)
+                        in_flight += 1
+                        hedge_at = time.monotonic() + self.hedge_delay(hedge, kind)
+                    continue
+
+                in_flight -= 1
+                if error is None:
+                    self._count(endpoint, "wins")
+                    timing["endpoint"] = endpoint.name
+                    return (endpoint, result) if with_endpoint else result
+                if _status_code(error) in NON_RETRYABLE_STATUS:
+                    raise LLMError(f"{endpoint.name}: {error}", endpoint.name) from error
+                errors.append(f"{endpoint.name}: {error}")
+                failover = self._take(pending)
+                if failover is not None:
+                    timing["failovers"] += 1
+                    launch(failover)
+                    in_flight += 1
+                elif not in_flight:
+                    raise LLMUnavailableError("all endpoints failed: " + "; ".join(errors), errors)
+        finally:
+            with settle_lock:
+                settled.set()
+            while not results.empty():
+                _discard(results.get_nowait()[1])
+
+    def _run_inline(
+        self,
+        attempt: Callable[[Endpoint], Any],
+        kind: str,
+        endpoints: List[Endpoint],
+        timing: Dict[str, Any],
+        with_endpoint: bool,
+    ) -> Any:
+        """
+        _race() without threads, for calls with nothing to race.
+
+        Endpoints are tried one after another on the caller's thread. The
+        timeout cannot interrupt an attempt here; the transport's own request
+        timeout bounds it, and a failure after the deadline is reported as a
+        timeout.
+        """
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        endpoint = self._take(endpoints)
+        if endpoint is None:
+            raise LLMUnavailableError("every endpoint's circuit is open")
+        errors: List[str] = []
+        while True:
+            started = time.perf_counter()
+            try:
+                result = attempt(endpoint)
+            except Exception as error:
+                self._finish(endpoint, kind, started, error)
+                if _status_code(error) in NON_RETRYABLE_STATUS:
+                    raise LLMError(f"{endpoint.name}: {error}", endpoint.name) from error
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise LLMTimeoutError(f"no answer within {self.timeout:g}s") from error
+                errors.append(f"{endpoint.name}: {error}")
+                endpoint = self._take(endpoints)
+                if endpoint is None:
+                    raise LLMUnavailableError("all endpoints failed: " + "; ".join(errors), errors) from error
+                timing["failovers"] += 1
+                continue
+            except BaseException:
+                # Interrupted, not failed
+                self.breakers[endpoint].cancel_trial()
+                raise
+            self._finish(endpoint, kind, started, None)
+            self._count(endpoint, "wins")
+            timing["endpoint"] = endpoint.name
+            return (endpoint, result) if with_endpoint else result
+
+    async def arun(self, call: Callable[[Endpoint], Awaitable[Any]], timing: Optional[Dict[str, Any]] = None) -> Any:
+        """Async run(); losing attempts are cancelled instead of left to finish."""
+        return await self._arace(call, "completion", timing)
+
+    async def astream(
+        self,
+        open_stream: Callable[[Endpoint], Awaitable[AsyncIterator[Any]]],
+        timing: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[Any]:
+        """Async stream(); the losing stream is cancelled and closed."""
+        async def first_chunk(endpoint: Endpoint) -> Tuple[Any, AsyncIterator[Any]]:
+            chunks = (await open_stream(endpoint)).__aiter__()
+            try:
+                return await chunks.__anext__(), chunks
+            except StopAsyncIteration:
+                return None, chunks
+
+        endpoint, (first, chunks) = await self._arace(first_chunk, "stream", timing, with_endpoint=True)
+        try:
+            if first is not None:
+                yield first
+                async for chunk in chunks:
+                    yield chunk
+        except (GeneratorExit, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            self._record(endpoint, None)
+            raise LLMError(f"{endpoint.name}: stream failed: {e}", endpoint.name) from e
+        finally:
+            await _adiscard(chunks)
+
+    async def _arace(
+        self,
+        attempt: Callable[[Endpoint], Awaitable[Any]],
+        kind: str,
+        timing: Optional[Dict[str, Any]],
+        with_endpoint: bool = False,
+    ) -> Any:
+        endpoints = self.available()
+        if not endpoints:
+            raise LLMUnavailableError("every endpoint's circuit is open")
+        timing = timing if timing is not None else {}
+        timing.setdefault("hedged", False)
+        timing.setdefault("failovers", 0)
+
+        async def run_attempt(endpoint: Endpoint) -> Any:
+            started = time.perf_counter()
+            try:
+                result = await attempt(endpoint)
+            except asyncio.CancelledError:
+                self.breakers[endpoint].cancel_trial()
+                raise
+            except BaseException as e:
+                self._finish(endpoint, kind, started, e)
+                raise
+            self._finish(endpoint, kind, started, None)
+            return result
+
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        pending = list(endpoints)
+        first = self._take(pending)
+        if first is None:
+            raise LLMUnavailableError("every endpoint's circuit is open")
+        tasks = {asyncio.ensure_future(run_attempt(first)): first}
+        hedge_at = time.monotonic() + self.hedge_delay(first, kind) if self.hedge_percentile else None
+        errors: List[str] = []
+        try:
+            while True:
+                now = time.monotonic()
+                waits = [t - now for t in (deadline, hedge_at if pending else None) if t is not None]
+                done, _ = await asyncio.wait(
+                    tasks, timeout=max(min(waits), 0) if waits else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise LLMTimeoutError(f"no answer within {self.timeout:g}s")
+                    hedge = self._take(pending)
+                    if hedge is not None:
+                        self._count(hedge, "hedges")
+                        timing["hedged"] = True
+                        tasks[asyncio.ensure_future(run_attempt(hedge))] = hedge
+                        hedge_at = time.monotonic() + self.hedge_delay(hedge, kind)
+                    continue
+
+                for task in done:
+                    endpoint = tasks.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        self._count(endpoint, "wins")
+                        timing["endpoint"] = endpoint.name
+                        return (endpoint, task.result()) if with_endpoint else task.result()
+                    if _status_code(error) in NON_RETRYABLE_STATUS:
+                        raise LLMError(f"{endpoint.name}: {error}", endpoint.name) from error
+                    errors.append(f"{endpoint.name}: {error}")
+                    failover = self._take(pending)
+                    if failover is not None:
+                        timing["failovers"] += 1
+                        tasks[asyncio.ensure_future(run_attempt(failover))] = failover
+                if not tasks:
+                    raise LLMUnavailableError("all endpoints failed: " + "; ".join(errors), errors)
+        finally:
+            for task in tasks:
+                task.cancel()
+            for task in tasks:
+                try:
+                    result = await task
+                except BaseException:
+                    continue
+                # A losing stream that got its first chunk just as another won
+                await _adiscard(result)
+
+    def _finish(self, endpoint: Endpoint, kind: str, started: float, error: Optional[BaseException]) -> None:
+        """Update the breaker, latency samples and counters after an attempt."""
+        self._count(endpoint, "attempts")
+        if error is not None and _status_code(error) in NON_RETRYABLE_STATUS:
+            # The endpoint answered; the request itself was bad
+            self.breakers[endpoint].record_success()
+            return
+        self._record(endpoint, None if error is not None else (kind, time.perf_counter() - started))
+
+    def _record(self, endpoint: Endpoint, latency: Optional[Tuple[str, float]]) -> None:
+        if latency is None:
+            self.breakers[endpoint].record_failure()
+            self._count(endpoint, "failures")
+            return
+        self.breakers[endpoint].record_success()
+        with self._lock:
+            self._latencies.setdefault((endpoint, latency[0]), deque(maxlen=LATENCY_WINDOW)).append(latency[1])
+
+    def _count(self, endpoint: Endpoint, name: str) -> None:
+        with self._lock:
+            self.stats[endpoint.name][name] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-endpoint counters, circuit state and hedge delays."""
+        stats = {}
+        for endpoint in self.endpoints:
+            with self._lock:
+                counters = dict(self.stats[endpoint.name])
+            counters["circuit"] = self.breakers[endpoint].state
+            counters["hedge_delay_s"] = {kind: round(self.hedge_delay(endpoint, kind), 3) for kind in DEFAULT_HEDGE_DELAYS}
+            stats[endpoint.name] = counters
+        return stats
+
+
+def _discard(result: Any) -> None:
+    """Close the stream held by a losing attempt's result."""
+    if isinstance(result, tuple):
+        result = result[-1]
+    close = getattr(result, "close", None)
+    if callable(close):
+        try:
+            close()
+        except Exception:
+            pass
+
+
+async def _adiscard(result: Any) -> None:
+    if isinstance(result, tuple):
+        result = result[-1]
+    close = getattr(result, "aclose", None)
+    if callable(close):
+        try:
+            await close()
+        except Exception:
+            pass
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Disk eviction trims to this fraction of the limits, so it runs once per
+# batch of writes rather than on every write at capacity
+DISK_LOW_WATER = 0.9
+
+
+class ResponseCache:
+    """Two-tier cache for LLM responses: an in-memory LRU in front of SQLite."""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_memory_entries: int = 256,
+        max_disk_entries: int = 10000,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+        ttl_seconds: float = 7 * 24 * 3600,
+    ):
+        """
+        Initialize the response cache.
+
+        Args:
+            path: SQLite file for the disk tier. None keeps the cache in memory only.
+            max_memory_entries: Number of responses kept in the LRU tier
+            max_disk_entries: Number of responses kept on disk
+            max_disk_bytes: Total size of responses kept on disk
+            ttl_seconds: Age after which an entry is treated as missing
+        """
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stats = {
+            "hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0,
+            "memory_evictions": 0, "disk_evictions": 0,
+        }
+
+        self._conn: Optional[sqlite3.Connection] = None
+        # Running totals of the disk tier, so a write does not scan the table
+        self._disk_entries = 0
+        self._disk_bytes = 0
+        if path:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+            )
+            self._conn.commit()
+            self._count_disk()
+
+    @staticmethod
+    def make_key(
+        model: str,
+        temperature: float,
+        system_prompt: Any,
+        messages: List[Dict[str, Any]],
+        max_tokens: Optional[int] = None,
+        **generation_params: Any,
+    ) -> str:
+        """
+        Build the cache key for a request.
+
+        Args:
+            model: Model name
+            temperature: Sampling temperature
+            system_prompt: System prompt string or list of segments
+            messages: Conversation messages including the new user turn
+            max_tokens: Output token limit; a reply generated under a smaller
+                limit may be shorter
+            **generation_params: Any other settings that change the reply
+
+        Returns:
+            Hex digest identifying the request
+        """
+        payload = json.dumps(
+            {
+                "model": model,
+                "temperature": temperature,
+                "system_prompt": system_prompt,
+                "messages": messages,
+                "max_tokens": max_tokens,
+                **generation_params,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response.
+
+        Args:
+            key: Key from make_key
+
+        Returns:
+            The cached response, or None on a miss or expired entry
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created = row
+                    if now - created <= self.ttl_seconds:
+                        self._conn.execute(
+                            "UPDATE responses SET accessed = ? WHERE key = ?", (now, key)
+                        )
+                        self._conn.commit()
+                        self._remember(key, value, created)
+                        self._stats["hits"] += 1
+                        self._stats["disk_hits"] += 1
+                        return value
+                    self._delete_disk(key)
+                    self._conn.commit()
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Store a response in both tiers.
+
+        Args:
+            key: Key from make_key
+            value: Response text
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._conn is not None:
+                size = len(value.encode("utf-8"))
+                self._delete_disk(key)
+                self._conn.execute(
+                    "INSERT INTO responses (key, value, size, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now, now),
+                )
+                self._disk_entries += 1
+                self._disk_bytes += size
+                if self._disk_entries > self.max_disk_entries or self._disk_bytes > self.max_disk_bytes:
+                    self._evict_disk(now)
+                self._conn.commit()
+
+    def clear(self) -> None:
+        """Remove every cached response."""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM responses")
+                self._conn.commit()
+                self._disk_entries = self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and tier sizes."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+            stats["memory_entries"] = len(self._memory)
+            if self._conn is not None:
+                count, size = self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()
+                stats["disk_entries"] = count
+                stats["disk_bytes"] = size
+            return stats
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        """Insert into the LRU tier, evicting the least recently used entry."""
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._stats["memory_evictions"] += 1
+
+    def _count_disk(self) -> None:
+        """Recount the disk tier's running totals from the table."""
+        self._disk_entries, self._disk_bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+
+    def _delete_disk(self, key: str) -> None:
+        """Delete one row, keeping the running totals in step."""
+        row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._disk_entries -= 1
+            self._disk_bytes -= row[0]
+
+    def _evict_disk(self, now: float) -> None:
+        """
+        Drop expired rows, then least recently used rows down to the low-water mark.
+
+        Called only once a write takes the disk tier over a limit. Totals are
+        recounted first, as other processes may share the file.
+        """
+        cursor = self._conn.execute(
+            "DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,)
+        )
+        self._stats["disk_evictions"] += max(cursor.rowcount, 0)
+        self._count_disk()
+
+        max_entries = int(self.max_disk_entries * DISK_LOW_WATER)
+        max_bytes = int(self.max_disk_bytes * DISK_LOW_WATER)
+        count, size = self._disk_entries, self._disk_bytes
+
+        doomed = []
+        # Walks the accessed index and stops as soon as enough rows are found
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC")
+        for key, row_size in rows:
+            if count <= max_entries and size <= max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            size -= row_size
+        rows.close()
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self._stats["disk_evictions"] += len(doomed)
+        self._disk_entries, self._disk_bytes = count, size
@@ -0,0 +1,360 @@
+import atexit
+import json
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    Column,
+    Float,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    event,
+    func,
+    insert,
+    select,
+    update,
+)
+
+from telemetry import get_telemetry
+
+metadata = MetaData()
+
+# One row per session: phase, spec and the epoch of each message stream
+sessions = Table(
+    "sessions",
+    metadata,
+    Column("id", String(64), primary_key=True),
+    Column("state", Text, nullable=False),
+    Column("created_at", Float, nullable=False),
+    Column("updated_at", Float, nullable=False),
+)
+
+# Append-only message log. A stream is "chat" (what the user sees) or
+# "client" (what is sent to the model). Clearing or compacting a stream bumps
+# its epoch instead of deleting rows; readers only see the current epoch.
+messages = Table(
+    "messages",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("session_id", String(64), nullable=False),
+    Column("stream", String(16), nullable=False),
+    Column("epoch", Integer, nullable=False),
+    Column("seq", Integer, nullable=False),
+    Column("role", String(16), nullable=False),
+    Column("content", Text, nullable=False),
+    Column("message_type", String(16)),
+    Column("timestamp", String(32)),
+    Index("messages_by_stream", "session_id", "stream", "epoch", "seq"),
+)
+
+
+class SessionStore:
+    """Durable app sessions in SQL, written in batches by a background thread."""
+
+    def __init__(self, url: str, flush_interval: float = 0.05, max_batch: int = 500):
+        """
+        Initialize the session store.
+
+        Args:
+            url: SQLAlchemy database URL, e.g. "sqlite:///sessions.db". SQLite
+                files are opened in WAL mode so readers never block the writer.
+            flush_interval: Seconds the writer waits to gather more writes into
+                one transaction
+            max_batch: Most writes committed in one transaction
+        """
+        self.url = url
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+        self.engine = create_engine(url, connect_args=connect_args)
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", _sqlite_pragmas)
+        metadata.create_all(self.engine)
+
+        self._queue: "queue.Queue[Optional[Tuple[str, Dict[str, Any]]]]" = queue.Queue()
+        self._pending = 0
+        self._pending_lock = threading.Condition()
+        self._closed = False
+        self.stats = {"messages_written": 0, "states_written": 0, "flushes": 0, "flush_errors": 0}
+        self._writer = threading.Thread(target=self._write_loop, name="session-store-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def append(
+        self,
+        session_id: str,
+        stream: str,
+        epoch: int,
+        seq: int,
+        role: str,
+        content: str,
+        message_type: Optional[str] = None,
+        timestamp: Optional[str] = None,
+    ) -> None:
+        """
+        Queue a message for writing. Returns immediately.
+
+        Args:
+            session_id: Session the message belongs to
+            stream: "chat" or "client"
+            epoch: Current epoch of the stream
+            seq: Position of the message in the epoch
+            role: Message role
+            content: Message text
+            message_type: Chat message type ("text" or "json")
+            timestamp: Display timestamp of a chat message
+        """
+        self._put(
+            "message",
+            {
+                "session_id": session_id,
+                "stream": stream,
+                "epoch": epoch,
+                "seq": seq,
+                "role": role,
+                "content": content,
+                "message_type": message_type,
+                "timestamp": timestamp,
+            },
+        )
+
+    def save(self, session_id: str, state: Dict[str, Any]) -> None:
+        """
+        Queue the session's state for writing. Returns immediately.
+
+        Args:
+            session_id: Session to save
+            state: JSON-serializable session state; replaces the saved state
+        """
+        self._put("state", {"id": session_id, "state": json.dumps(state), "updated_at": time.time()})
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a session's saved state, after writing anything still queued.
+
+        Args:
+            session_id: Session to load
+
+        Returns:
+            The saved state, or None for an unknown session
+        """
+        self.flush()
+        with self.engine.connect() as conn:
+            row = conn.execute(select(sessions.c.state).where(sessions.c.id == session_id)).first()
+        return json.loads(row.state) if row is not None else None
+
+    def load_messages(
+        self,
+        session_id: str,
+        stream: str,
+        epoch: int,
+        before: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Load messages of one stream epoch, newest page first when limited.
+
+        Args:
+            session_id: Session to read
+            stream: "chat" or "client"
+            epoch: Stream epoch to read
+            before: Only messages with seq below this
+            limit: Most recent messages to return; None returns all
+
+        Returns:
+            Messages in seq order, each with seq, role, content, message_type and timestamp
+        """
+        self.flush()
+        query = select(
+            messages.c.seq, messages.c.role, messages.c.content, messages.c.message_type, messages.c.timestamp
+        ).where(
+            messages.c.session_id == session_id,
+            messages.c.stream == stream,
+            messages.c.epoch == epoch,
+        )
+        if before is not None:
+            query = query.where(messages.c.seq < before)
+        query = query.order_by(messages.c.seq.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).fetchall()
+        return [row._asdict() for row in reversed(rows)]
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Wait until every queued write is committed.
+
+        Args:
+            timeout: Most seconds to wait
+
+        Returns:
+            True if the queue drained in time
+        """
+        deadline = time.monotonic() + timeout
+        with self._pending_lock:
+            while self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._writer.is_alive():
+                    return False
+                self._pending_lock.wait(remaining)
+        return True
+
+    def count_sessions(self) -> int:
+        """Number of saved sessions."""
+        self.flush()
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(sessions)).scalar_one()
+
+    def close(self) -> None:
+        """Write everything queued and stop the writer."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout=10.0)
+        self.engine.dispose()
+
+    def _put(self, kind: str, row: Dict[str, Any]) -> None:
+        if self._closed:
+            raise RuntimeError("session store is closed")
+        with self._pending_lock:
+            self._pending += 1
+        self._queue.put((kind, row))
+
+    def _write_loop(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            # Gather whatever arrives shortly after, so a turn's writes share one commit
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+        # Drain anything queued after the stop marker
+        remaining = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                remaining.append(item)
+        if remaining:
+            self._write(remaining)
+
+    def _write(self, batch: List[Tuple[str, Dict[str, Any]]]) -> None:
+        rows = [row for kind, row in batch if kind == "message"]
+        # Only the latest state of each session needs writing
+        states = {row["id"]: row for kind, row in batch if kind == "state"}
+        started = time.perf_counter()
+        try:
+            with self.engine.begin() as conn:
+                if rows:
+                    conn.execute(insert(messages), rows)
+                for row in states.values():
+                    result = conn.execute(
+                        update(sessions)
+                        .where(sessions.c.id == row["id"])
+                        .values(state=row["state"], updated_at=row["updated_at"])
+                    )
+                    if result.rowcount == 0:
+                        conn.execute(insert(sessions).values(created_at=row["updated_at"], **row))
+            self.stats["messages_written"] += len(rows)
+            self.stats["states_written"] += len(states)
+            self.stats["flushes"] += 1
+        except Exception as e:
+            self.stats["flush_errors"] += 1
+            print(f"Session store write failed ({len(batch)} writes dropped): {e}")
+        finally:
+            get_telemetry().emit(
+                "session_store",
+                wall_s=time.perf_counter() - started,
+                messages=len(rows),
+                states=len(states),
+            )
+            with self._pending_lock:
+                self._pending -= len(batch)
+                self._pending_lock.notify_all()
+
+
+def _sqlite_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # WAL with synchronous=NORMAL is durable across app crashes; only an OS
+    # crash can lose the last commits
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+class HistoryRecorder:
+    """Mirrors a message list that may be rewritten into an append-only stream."""
+
+    def __init__(
+        self,
+        store: SessionStore,
+        session_id: str,
+        stream: str,
+        epoch: int = 0,
+        persisted: Optional[List[Dict[str, str]]] = None,
+    ):
+        """
+        Initialize the recorder.
+
+        Args:
+            store: Session store to write to
+            session_id: Session the stream belongs to
+            stream: Stream name
+            epoch: Current epoch of the stream
+            persisted: Messages already stored in this epoch
+        """
+        self.store = store
+        self.session_id = session_id
+        self.stream = stream
+        self.epoch = epoch
+        self._persisted: List[Tuple[str, str]] = [(m["role"], m["content"]) for m in persisted or []]
+
+    def sync(self, history: List[Dict[str, str]]) -> int:
+        """
+        Queue whatever changed in the history since the last sync.
+
+        Messages appended since then are written as they are. If earlier
+        messages changed (compaction, clearing, a discarded turn), the stream
+        moves to a new epoch and the whole history is written again.
+
+        Args:
+            history: Current message list
+
+        Returns:
+            Number of messages queued
+        """
+        current = [(m["role"], m["content"]) for m in history]
+        known = len(self._persisted)
+        if current[:known] != self._persisted:
+            self.epoch += 1
+            self._persisted = []
+            known = 0
+        for seq in range(known, len(current)):
+            role, content = current[seq]
+            self.store.append(self.session_id, self.stream, self.epoch, seq, role, content)
+        self._persisted = current
+        return len(current) - known
@@ -0,0 +1,259 @@
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+DEFAULT_FEATURES = 4096
+
+VECTORS_FILE = "vectors.f32"
+ENTRIES_FILE = "entries.jsonl"
+
+# Superseded lines the entries log may hold before it is rewritten
+COMPACT_AFTER = 256
+
+
+class HashingVectorizer:
+    """Bag of hashed word unigrams and bigrams; needs no vocabulary or network."""
+
+    def __init__(self, n_features: int = DEFAULT_FEATURES):
+        """
+        Initialize the vectorizer.
+
+        Args:
+            n_features: Width of the hashed feature space
+        """
+        self.n_features = n_features
+
+    def tokens(self, text: str) -> List[str]:
+        words = [w for w in _TOKEN.findall(text.lower()) if len(w) > 1]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def transform(self, text: str) -> np.ndarray:
+        """
+        Term frequencies of a text, sublinearly scaled (1 + log tf).
+
+        Args:
+            text: Text to vectorize
+
+        Returns:
+            float32 vector of length n_features
+        """
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        # crc32 is stable across processes, unlike hash()
+        columns = [zlib.crc32(token.encode("utf-8")) % self.n_features for token in self.tokens(text)]
+        if columns:
+            np.add.at(vector, columns, 1.0)
+            nonzero = vector > 0
+            vector[nonzero] = 1.0 + np.log(vector[nonzero])
+        return vector
+
+
+class SimilarityIndex:
+    """TF-IDF cosine-similarity index over texts with JSON payloads, persisted as a memory-mapped matrix."""
+
+    def __init__(self, path: Optional[str] = None, n_features: int = DEFAULT_FEATURES, initial_capacity: int = 256):
+        """
+        Initialize the index, loading any entries saved under path.
+
+        Args:
+            path: Directory holding the term-frequency matrix (memory-mapped)
+                and the entries log. None keeps the index in memory only.
+            n_features: Width of the hashed feature space
+            initial_capacity: Rows allocated before the matrix first grows
+        """
+        self.path = path
+        self.vectorizer = HashingVectorizer(n_features)
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        self._keys: Dict[str, int] = {}
+        self._weighted: Optional[np.ndarray] = None
+        self._log_lines = 0
+        self.stats = {"searches": 0, "matches": 0, "adds": 0, "compactions": 0}
+
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self._load_entries()
+            if self._log_lines > len(self._keys):
+                self._compact()
+        capacity = max(initial_capacity, len(self._entries))
+        self._matrix = self._open_matrix(capacity)
+        self._df = (self._matrix[: len(self._entries)] > 0).sum(axis=0).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, key: str, text: str, payload: Dict[str, Any]) -> int:
+        """
+        Add a text, or replace the text and payload stored under key.
+
+        Args:
+            key: Caller's identifier, e.g. the session id
+            text: Text that later queries are compared with
+            payload: JSON-serializable data returned with matches
+
+        Returns:
+            Row number of the entry
+        """
+        vector = self.vectorizer.transform(text)
+        with self._lock:
+            row = self._keys.get(key)
+            if row is None:
+                row = len(self._entries)
+                if row == self._matrix.shape[0]:
+                    self._matrix = self._open_matrix(2 * row)
+                self._entries.append({})
+                self._keys[key] = row
+            else:
+                self._df -= self._matrix[row] > 0
+            self._matrix[row] = vector
+            self._df += vector > 0
+            self._weighted = None
+            entry = {"row": row, "key": key, "text": text, "payload": payload, "updated": time.time()}
+            self._entries[row] = entry
+            self._append_entry(entry)
+            self.stats["adds"] += 1
+            return row
+
+    def update(self, key: str, **payload: Any) -> bool:
+        """
+        Merge fields into the payload stored under key.
+
+        Args:
+            key: Identifier passed to add
+            **payload: Fields to set
+
+        Returns:
+            False if nothing is stored under key
+        """
+        with self._lock:
+            row = self._keys.get(key)
+            if row is None:
+                return False
+            entry = self._entries[row]
+            merged = {**entry["payload"], **payload}
+            if merged == entry["payload"]:
+                # Nothing changed; called on every rerun, so do not log it again
+                return True
+            entry["payload"] = merged
+            entry["updated"] = time.time()
+            self._append_entry(entry)
+            return True
+
+    def search(self, text: str, k: int = 3, min_score: float = 0.0, exclude: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Find the stored texts most similar to text.
+
+        Args:
+            text: Query text
+            k: Most matches returned
+            min_score: Lowest cosine similarity returned
+            exclude: Key to leave out, e.g. the caller's own entry
+
+        Returns:
+            Matches, best first, each {"key", "score", "text", "payload"}
+        """
+        query = self.vectorizer.transform(text)
+        with self._lock:
+            self.stats["searches"] += 1
+            count = len(self._entries)
+            if not count or not query.any():
+                return []
+            idf = self._idf(count)
+            if self._weighted is None:
+                weighted = self._matrix[:count] * idf
+                norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+                self._weighted = weighted / np.maximum(norms, 1e-12)
+            query = query * idf
+            query /= max(float(np.linalg.norm(query)), 1e-12)
+            scores = self._weighted @ query
+
+            matches = []
+            for row in np.argsort(-scores):
+                if len(matches) == k or scores[row] < min_score:
+                    break
+                entry = self._entries[row]
+                if entry["key"] == exclude:
+                    continue
+                matches.append(
+                    {"key": entry["key"], "score": float(scores[row]), "text": entry["text"], "payload": entry["payload"]}
+                )
+            self.stats["matches"] += bool(matches)
+            return matches
+
+    def flush(self) -> None:
+        """Write the memory-mapped matrix to disk."""
+        with self._lock:
+            if isinstance(self._matrix, np.memmap):
+                self._matrix.flush()
+
+    def _idf(self, count: int) -> np.ndarray:
+        return np.log((1.0 + count) / (1.0 + self._df)) + 1.0
+
+    def _open_matrix(self, capacity: int) -> np.ndarray:
+        """The term-frequency matrix with room for capacity rows, grown in place on disk."""
+        n_features = self.vectorizer.n_features
+        if not self.path:
+            matrix = np.zeros((capacity, n_features), dtype=np.float32)
+            if getattr(self, "_matrix", None) is not None:
+                matrix[: self._matrix.shape[0]] = self._matrix
+            return matrix
+
+        file_path = os.path.join(self.path, VECTORS_FILE)
+        if getattr(self, "_matrix", None) is not None:
+            self._matrix.flush()
+            del self._matrix
+        row_bytes = n_features * np.dtype(np.float32).itemsize
+        size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        capacity = max(capacity, size // row_bytes)
+        if size < capacity * row_bytes:
+            # Extending the file leaves the new rows zero-filled
+            with open(file_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        return np.memmap(file_path, dtype=np.float32, mode="r+", shape=(capacity, n_features))
+
+    def _load_entries(self) -> None:
+        entries_path = os.path.join(self.path, ENTRIES_FILE)
+        if not os.path.exists(entries_path):
+            return
+        with open(entries_path, "r", encoding="utf-8") as f:
+            for line in f:
+                self._log_lines += 1
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A write cut short by a crash; the entry is rewritten on its next update
+                    continue
+                row = entry["row"]
+                while len(self._entries) <= row:
+                    self._entries.append({"row": len(self._entries), "key": None, "text": "", "payload": {}})
+                self._entries[row] = entry
+                self._keys[entry["key"]] = row
+
+    def _append_entry(self, entry: Dict[str, Any]) -> None:
+        if not self.path:
+            return
+        with open(os.path.join(self.path, ENTRIES_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._log_lines += 1
+        if self._log_lines - len(self._keys) > COMPACT_AFTER:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite the entries log with only the latest line of each key."""
+        entries_path = os.path.join(self.path, ENTRIES_FILE)
+        temp_path = entries_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for entry in self._entries:
+                if entry.get("key") is not None:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        # Atomic, so a crash leaves either the old log or the new one
+        os.replace(temp_path, entries_path)
+        self._log_lines = len(self._keys)
+        self.stats["compactions"] += 1
@@ -0,0 +1,289 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Results of successful calls kept this long for identical calls that follow
+DEFAULT_MEMO_TTL = 5.0
+
+
+class _Abandoned(Exception):
+    """Set on a call's future when the caller running it was interrupted or cancelled."""
+
+
+def flight_key(operation: str, payload: Any) -> str:
+    """Key of a call: the operation and a hash of its payload, independent of key order."""
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    return f"{operation}:{hashlib.sha256(encoded).hexdigest()}"
+
+
+class SingleFlight:
+    """
+    Runs concurrent identical calls once and hands every caller the result.
+
+    A call is identified by its operation and a hash of its payload. The
+    first caller runs it; callers that arrive while it is in flight wait on
+    its future instead of repeating the work. A successful result is also
+    kept for memo_ttl seconds, so the same call repeated right after it
+    finished (a double click, a rerun) gets that result. Failures are not
+    kept: callers already waiting get the exception, the next call runs
+    again. Results are shared between callers, not copied.
+    """
+
+    def __init__(self, memo_ttl: float = DEFAULT_MEMO_TTL, max_memoized: int = 256):
+        """
+        Initialize the single-flight group.
+
+        Args:
+            memo_ttl: Seconds a successful result is reused; 0 only joins
+                calls still in flight
+            max_memoized: Most results kept at once
+        """
+        self.memo_ttl = memo_ttl
+        self.max_memoized = max_memoized
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._memo: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def run(self, operation: str, payload: Any, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Call fn, unless an identical call is in flight or just finished.
+
+        Args:
+            operation: Name of the operation, e.g. "create_app"
+            payload: JSON-serializable arguments that identify the call
+            fn: Does the work
+
+        Returns:
+            (result, shared), shared being True when the result came from
+            another caller's call
+
+        Raises:
+            Exception: Whatever fn raised, in this caller or the one running it
+        """
+        key = flight_key(operation, payload)
+        retry = False
+        while True:
+            role, value = self._join(operation, key, retry)
+            if role == "memo":
+                return value, True
+            if role == "wait":
+                try:
+                    return value.result(), True
+                except _Abandoned:
+                    # The caller running it was interrupted; run it here instead
+                    retry = True
+                    continue
+            try:
+                result = fn()
+            except BaseException as e:
+                self._settle(operation, key, value, error=e)
+                raise
+            self._settle(operation, key, value, result)
+            return result, False
+
+    async def arun(self, operation: str, payload: Any, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Async run(); identical calls are joined across threads and event loops.
+
+        Cancelling a caller that waits on another's call leaves that call
+        running for the others.
+        """
+        key = flight_key(operation, payload)
+        retry = False
+        while True:
+            role, value = self._join(operation, key, retry)
+            if role == "memo":
+                return value, True
+            if role == "wait":
+                try:
+                    # Shielded so a cancelled waiter does not cancel the shared future
+                    return await asyncio.shield(asyncio.wrap_future(value)), True
+                except _Abandoned:
+                    retry = True
+                    continue
+            try:
+                result = await fn()
+            except BaseException as e:
+                self._settle(operation, key, value, error=e)
+                raise
+            self._settle(operation, key, value, result)
+            return result, False
+
+    def stream(
+        self,
+        operation: str,
+        payload: Any,
+        fn: Callable[[], Iterator[Any]],
+        reduce: Callable[[List[Any]], Any],
+        replay: Callable[[Any], Iterable[Any]],
+    ) -> Iterator[Any]:
+        """
+        run() for a call whose items are passed on as they arrive, such as a streamed reply.
+
+        The caller running it yields fn()'s items and shares reduce(items)
+        once they are all in. Callers sharing its call yield replay(result)
+        when it is done. A caller that stops iterating early abandons the
+        call, and a waiting caller runs it instead.
+
+        Args:
+            operation: Name of the operation
+            payload: JSON-serializable arguments that identify the call
+            fn: Produces the items
+            reduce: Builds the shared result from all items
+            replay: Items a caller sharing the result yields
+
+        Yields:
+            The items, live or replayed
+        """
+        key = flight_key(operation, payload)
+        retry = False
+        while True:
+            role, value = self._join(operation, key, retry)
+            if role == "memo":
+                yield from replay(value)
+                return
+            if role == "wait":
+                try:
+                    result = value.result()
+                except _Abandoned:
+                    retry = True
+                    continue
+                yield from replay(result)
+                return
+            items: List[Any] = []
+            try:
+                for item in fn():
+                    items.append(item)
+                    yield item
+                result = reduce(items)
+            except BaseException as e:
+                self._settle(operation, key, value, error=e)
+                raise
+            self._settle(operation, key, value, result)
+            return
+
+    async def astream(
+        self,
+        operation: str,
+        payload: Any,
+        fn: Callable[[], AsyncIterator[Any]],
+        reduce: Callable[[List[Any]], Any],
+        replay: Callable[[Any], Iterable[Any]],
+    ) -> AsyncIterator[Any]:
+        """Async stream(); fn returns an async iterator."""
+        key = flight_key(operation, payload)
+        retry = False
+        while True:
+            role, value = self._join(operation, key, retry)
+            if role == "memo":
+                for item in replay(value):
+                    yield item
+                return
+            if role == "wait":
+                try:
+                    result = await asyncio.shield(asyncio.wrap_future(value))
+                except _Abandoned:
+                    retry = True
+                    continue
+                for item in replay(result):
+                    yield item
+                return
+            items: List[Any] = []
+            try:
+                async for item in fn():
+                    items.append(item)
+                    yield item
+                result = reduce(items)
+            except BaseException as e:
+                self._settle(operation, key, value, error=e)
+                raise
+            self._settle(operation, key, value, result)
+            return
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-operation counts of calls, calls run, calls coalesced onto others, and failures."""
+        with self._lock:
+            return {operation: dict(counts) for operation, counts in self.stats.items()}
+
+    def _count(self, operation: str, name: str) -> None:
+        counts = self.stats.setdefault(operation, {"calls": 0, "runs": 0, "coalesced": 0, "memo_hits": 0, "errors": 0})
+        counts[name] += 1
+
+    def _join(self, operation: str, key: str, retry: bool = False) -> Tuple[str, Any]:
+        """
+        Find how a new call proceeds.
+
+        Args:
+            operation: Name of the operation
+            key: flight_key of the call
+            retry: The call joined one that was abandoned and is not counted again
+
+        Returns:
+            ("memo", result), ("wait", future of the call in flight) or
+            ("lead", new future this caller must settle)
+        """
+        with self._lock:
+            if not retry:
+                self._count(operation, "calls")
+            memoized = self._memo.get(key)
+            if memoized is not None:
+                if memoized[0] > time.monotonic():
+                    self._memo.move_to_end(key)
+                    self._count(operation, "memo_hits")
+                    return "memo", memoized[1]
+                del self._memo[key]
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._count(operation, "coalesced")
+                return "wait", future
+            future = Future()
+            self._in_flight[key] = future
+            self._count(operation, "runs")
+            return "lead", future
+
+    def _settle(
+        self,
+        operation: str,
+        key: str,
+        future: Future,
+        result: Any = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+            if error is None and self.memo_ttl > 0:
+                self._memo[key] = (time.monotonic() + self.memo_ttl, result)
+                self._memo.move_to_end(key)
+                while len(self._memo) > self.max_memoized:
+                    self._memo.popitem(last=False)
+            elif isinstance(error, Exception):
+                self._count(operation, "errors")
+        if error is None:
+            future.set_result(result)
+        elif isinstance(error, Exception):
+            future.set_exception(error)
+        else:
+            # KeyboardInterrupt, cancellation: another caller takes over
+            future.set_exception(_Abandoned())
+
+
+_default_flight = None
+_default_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Return the process-wide single-flight group; results are reused for SINGLE_FLIGHT_TTL_S (default 5) seconds."""
+    global _default_flight
+    if _default_flight is None:
+        with _default_lock:
+            if _default_flight is None:
+                _default_flight = SingleFlight(float(os.getenv("SINGLE_FLIGHT_TTL_S", str(DEFAULT_MEMO_TTL))))
+    return _default_flight
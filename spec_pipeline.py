@@ -0,0 +1,513 @@
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import re
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from claude_client import AsyncClaudeClient, ClaudeClient, ClaudeTransport, LLMError
+from json_extractor import JsonExtractor, extract_json, find_json_array
+from json_patch import JsonPatchError, apply_patch
+from prompt_templates import TemplateRegistry, get_registry
+from spec_validation import check_structure, score_spec
+from telemetry import get_telemetry
+
+DISCOVERY_PROMPT_PATH = "question_generation_prompt.j2"
+SPEC_PROMPT_PATH = "v2v.j2"
+SPEC_PATCH_PROMPT_PATH = "spec_patch_prompt.j2"
+
+# Output token limits per request in each phase. A reply cut off at its limit
+# is continued (ClaudeClient.max_continuations), so a limit that is too low
+# costs extra requests rather than a broken specification. A JSON Patch edit
+# needs a fraction of a full spec.
+DISCOVERY_MAX_TOKENS = int(os.getenv("DISCOVERY_MAX_TOKENS", "2048"))
+SPEC_MAX_TOKENS = int(os.getenv("SPEC_MAX_TOKENS", "8192"))
+PATCH_MAX_TOKENS = int(os.getenv("PATCH_MAX_TOKENS", "2048"))
+
+# What the patch prompt asks the model to send when an edit needs a full rewrite
+FULL_REGENERATION = "FULL_REGENERATION"
+
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+# Rendered in place of the use case to find where the static prefix ends
+_SEGMENT_MARK = "\x00usecase_details\x00"
+
+
+def load_discovery_prompt(registry: Optional[TemplateRegistry] = None) -> str:
+    """
+    Render the discovery system prompt.
+
+    Args:
+        registry: Template registry. Defaults to the process-wide one.
+
+    Returns:
+        The discovery system prompt
+    """
+    registry = registry or get_registry()
+    return registry.render(DISCOVERY_PROMPT_PATH)
+
+
+def parse_handoff(response: str) -> Optional[dict]:
+    """
+    Detect the end of the discovery phase.
+
+    Args:
+        response: Claude's discovery-phase reply
+
+    Returns:
+        The enhanced use case without the handoff flag, or None if discovery
+        should continue
+    """
+    return handoff_payload(extract_json(response))
+
+
+def handoff_payload(parsed: Any) -> Optional[dict]:
+    """
+    Get the enhanced use case from a parsed discovery-phase object.
+
+    Args:
+        parsed: Object extracted from a discovery reply, or None
+
+    Returns:
+        The enhanced use case without the handoff flag, or None if the
+        object is not a handoff
+    """
+    if isinstance(parsed, dict) and parsed.get("handoff") is True:
+        enhanced_uc = parsed.copy()
+        enhanced_uc.pop("handoff", None)
+        return enhanced_uc
+    return None
+
+
+def build_spec_system_prompt(
+    usecase_details: str, registry: Optional[TemplateRegistry] = None
+) -> List[str]:
+    """
+    Render the specification system prompt as cacheable segments.
+
+    The use case details sit at the end of v2v.j2, so everything before
+    them is identical for every session and forms the shared cache prefix.
+
+    Args:
+        usecase_details: Enhanced use case JSON from the discovery phase
+        registry: Template registry. Defaults to the process-wide one.
+
+    Returns:
+        [static instructions, use-case-specific tail]
+    """
+    registry = registry or get_registry()
+    rendered = registry.render(SPEC_PROMPT_PATH, usecase_details=usecase_details)
+    static = registry.render(SPEC_PROMPT_PATH, usecase_details=_SEGMENT_MARK).partition(_SEGMENT_MARK)[0]
+    if not rendered.startswith(static):
+        return [rendered]
+    return [static, rendered[len(static):]]
+
+
+def parse_patch(response: str) -> Optional[list]:
+    """
+    Extract a JSON Patch (an array of operations) from Claude's reply.
+
+    Args:
+        response: Edit-mode reply
+
+    Returns:
+        The operations, or None if the reply holds no JSON array
+    """
+    text = _CODE_FENCE.sub("", response.strip())
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        parsed = None
+    if isinstance(parsed, list):
+        return parsed
+    # Prose around the array, with brackets of its own
+    found = find_json_array(text)
+    if found is not None:
+        return found[0]
+    # Tolerate {"patch": [...]} wrappers
+    wrapped = extract_json(response)
+    if isinstance(wrapped, dict) and isinstance(wrapped.get("patch"), list):
+        return wrapped["patch"]
+    return None
+
+
+def edit_spec_with_patch(
+    client: ClaudeClient,
+    spec: dict,
+    request: str,
+    system_prompt: List[str],
+    registry: Optional[TemplateRegistry] = None,
+    max_tokens: int = PATCH_MAX_TOKENS,
+) -> Tuple[Optional[dict], str]:
+    """
+    Apply a requested change to a specification as a JSON Patch.
+
+    The model sees the current specification and the request and returns
+    only the RFC 6902 operations, which are applied and checked locally. On
+    success the client history records the request and the full patched
+    specification, as if the model had re-emitted it, so a later full
+    regeneration continues from the right state.
+
+    Args:
+        client: Client holding the specification conversation
+        spec: Current specification
+        request: The user's change request
+        system_prompt: Specification system prompt segments
+        registry: Template registry. Defaults to the process-wide one.
+        max_tokens: Output token limit for the patch
+
+    Returns:
+        (patched specification, outcome), with None in place of the
+        specification when the caller should fall back to full regeneration
+
+    Raises:
+        LLMError: If the model could not be reached; a full regeneration
+            would fail the same way
+    """
+    registry = registry or get_registry()
+    started = time.perf_counter()
+    patch: Optional[list] = None
+    new_spec: Optional[dict] = None
+    error: Optional[LLMError] = None
+    try:
+        response = client.complete(
+            [{"role": "user", "content": f"Current specification:\n{json.dumps(spec, indent=2)}\n\nRequested change:\n{request}"}],
+            list(system_prompt) + [registry.render(SPEC_PATCH_PROMPT_PATH)],
+            max_tokens=max_tokens,
+        )
+        patch = parse_patch(response)
+        if patch is None:
+            outcome = "no_patch"
+        elif any(op.get("value") == FULL_REGENERATION for op in patch if isinstance(op, dict)):
+            outcome = "full_requested"
+        else:
+            candidate = apply_patch(spec, patch)
+            errors = check_structure(candidate)["errors"]
+            if errors:
+                outcome = "invalid: " + "; ".join(errors[:3])
+            else:
+                new_spec, outcome = candidate, "patched"
+    except JsonPatchError as e:
+        outcome = f"apply_failed: {e}"
+    except LLMError as e:
+        outcome, error = f"llm_error: {e}", e
+
+    if new_spec is not None:
+        client.add_message("user", request)
+        client.add_message("assistant", json.dumps(new_spec, indent=2))
+
+    get_telemetry().emit(
+        "spec_edit",
+        wall_s=round(time.perf_counter() - started, 6),
+        mode="patch",
+        outcome=outcome.split(":")[0],
+        detail=outcome,
+        operations=len(patch) if patch else 0,
+        output_tokens=client.last_usage.get("output_tokens"),
+    )
+    if error is not None:
+        raise error
+    return new_spec, outcome
+
+
+async def generate_spec_candidates(
+    client: AsyncClaudeClient,
+    usecase_details: str,
+    system_prompt: Any,
+    candidates: int = 3,
+    deadline: float = 45.0,
+    max_tokens: int = SPEC_MAX_TOKENS,
+) -> Dict[str, Any]:
+    """
+    Generate several specification candidates concurrently and keep the best.
+
+    Every candidate is scored locally with spec_validation.score_spec as it
+    arrives; a candidate whose request or scoring raises gets the lowest
+    score instead of failing the rest. Generation stops once the deadline
+    has passed and at least one valid candidate is in, or when all
+    candidates are done; unfinished ones are cancelled. Candidates do not
+    touch the client's history.
+
+    Args:
+        client: Async client; its semaphore bounds the concurrent requests
+        usecase_details: Enhanced use case JSON sent as the user message
+        system_prompt: Specification system prompt
+        candidates: Number of candidates (K)
+        deadline: Seconds after which the first valid candidate is accepted
+        max_tokens: Output token limit per request
+
+    Returns:
+        {"response", "spec", "score", "index", "finished", "cancelled",
+         "valid", "time_to_valid_s", "elapsed_s", "scores"} for the best
+        candidate, with "response" None when every candidate failed
+    """
+    messages = [{"role": "user", "content": usecase_details}]
+    started = time.perf_counter()
+    # Only the first candidate may be served from the response cache; the
+    # others would all get the same cached reply
+    tasks = {
+        asyncio.ensure_future(client.complete(messages, system_prompt, use_cache=(i == 0), max_tokens=max_tokens)): i
+        for i in range(candidates)
+    }
+    pending = set(tasks)
+    results: List[Dict[str, Any]] = []
+    time_to_valid = None
+
+    try:
+        while pending:
+            remaining = deadline - (time.perf_counter() - started)
+            if time_to_valid is not None and remaining <= 0:
+                break
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=remaining if remaining > 0 else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in done:
+                result: Dict[str, Any] = {"index": tasks[task], "latency_s": round(time.perf_counter() - started, 3)}
+                result.update(response=None, spec=None)
+                try:
+                    result["response"] = task.result()
+                    result["spec"] = extract_json(result["response"])
+                    # Scoring runs V2VApp validation; if it raises, only this candidate fails
+                    result["score"] = score_spec(result["spec"])
+                except Exception as e:
+                    result["score"] = {"valid": False, "score": -1000.0, "errors": [f"{type(e).__name__}: {e}"], "warnings": []}
+                if result["score"]["valid"] and time_to_valid is None:
+                    time_to_valid = result["latency_s"]
+                results.append(result)
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    elapsed = round(time.perf_counter() - started, 3)
+    best = max(results, key=lambda r: (r["score"]["score"], -r["index"]), default=None)
+    selection = {
+        "response": best["response"] if best else None,
+        "spec": best["spec"] if best else None,
+        "score": best["score"] if best else None,
+        "index": best["index"] if best else None,
+        "valid": bool(best and best["score"]["valid"]),
+        "finished": len(results),
+        "cancelled": len(pending),
+        "time_to_valid_s": time_to_valid,
+        "elapsed_s": elapsed,
+        "scores": [
+            {"index": r["index"], "latency_s": r["latency_s"], "score": r["score"]["score"], "valid": r["score"]["valid"]}
+            for r in results
+        ],
+    }
+    get_telemetry().emit(
+        "spec_candidates",
+        wall_s=elapsed,
+        candidates=candidates,
+        finished=selection["finished"],
+        cancelled=selection["cancelled"],
+        valid=selection["valid"],
+        valid_candidates=sum(1 for r in results if r["score"]["valid"]),
+        time_to_valid_s=time_to_valid,
+    )
+    return selection
+
+
+class SpeculativeSpec:
+    """
+    Starts specification generation while the discovery reply is still streaming.
+
+    Discovery deltas are fed to a JsonExtractor. As soon as the handoff object
+    closes, the spec request is sent from a fresh client on a background
+    thread, overlapping it with the rest of the discovery stream. Once the
+    reply is complete, resolve() commits the speculative run if the final
+    handoff payload is the one it started from and cancels it otherwise.
+    """
+
+    def __init__(
+        self,
+        transport: ClaudeTransport,
+        registry: Optional[TemplateRegistry] = None,
+        max_tokens: int = SPEC_MAX_TOKENS,
+    ):
+        """
+        Args:
+            transport: Transport the spec client is created on
+            registry: Template registry. Defaults to the process-wide one.
+            max_tokens: Output token limit per request of the spec reply
+        """
+        self.transport = transport
+        self.registry = registry
+        self.max_tokens = max_tokens
+        self.extractor = JsonExtractor()
+
+        self.enhanced_uc: Optional[dict] = None
+        self.usecase_details: Optional[str] = None
+        self.system_prompt: Optional[List[str]] = None
+        self.client: Optional[ClaudeClient] = None
+
+        self._chunks: List[str] = []
+        self._finished = False
+        self._cond = threading.Condition()
+        self._cancelled = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at: Optional[float] = None
+        self._outcome: Optional[str] = None
+        self._error: Optional[BaseException] = None
+
+    @property
+    def started(self) -> bool:
+        """Whether speculative generation is running or has run."""
+        return self._thread is not None
+
+    def feed(self, delta: str) -> None:
+        """
+        Observe the next delta of the discovery reply.
+
+        Args:
+            delta: Streamed text
+        """
+        if self._thread is not None or self.extractor.done:
+            return
+        parsed = self.extractor.feed(delta)
+        if parsed is None:
+            return
+        enhanced_uc = handoff_payload(parsed)
+        if enhanced_uc is not None:
+            self._start(enhanced_uc)
+
+    def _start(self, enhanced_uc: dict) -> None:
+        self.enhanced_uc = enhanced_uc
+        self.usecase_details = json.dumps(enhanced_uc, indent=4)
+        self.system_prompt = build_spec_system_prompt(self.usecase_details, self.registry)
+        self.client = ClaudeClient(transport=self.transport)
+        self._started_at = time.perf_counter()
+
+        # Run in a copy of the caller's context so telemetry keeps the session
+        context = contextvars.copy_context()
+        self._thread = threading.Thread(target=context.run, args=(self._run,), daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        stream = self.client.stream_message(self.usecase_details, self.system_prompt, max_tokens=self.max_tokens)
+        try:
+            for delta in stream:
+                if self._cancelled.is_set():
+                    break
+                with self._cond:
+                    self._chunks.append(delta)
+                    self._cond.notify_all()
+        except Exception as e:
+            # Raised to the reader by stream(), if the run is committed
+            self._error = e
+        finally:
+            # Closing the generator ends the HTTP stream and frees its slot
+            stream.close()
+            with self._cond:
+                self._finished = True
+                self._cond.notify_all()
+
+    def resolve(self, enhanced_uc: Optional[dict]) -> bool:
+        """
+        Decide whether the speculative run can be used.
+
+        Args:
+            enhanced_uc: Handoff payload parsed from the complete discovery reply
+
+        Returns:
+            True if the run started from exactly this payload; otherwise the
+            run is cancelled and False is returned
+        """
+        if self._thread is None:
+            self._record("not_started")
+            return False
+        if enhanced_uc != self.enhanced_uc:
+            self.cancel()
+            return False
+        self._record("committed")
+        return True
+
+    def cancel(self) -> None:
+        """Stop the speculative run; it is never committed after this."""
+        if self._thread is not None and not self._cancelled.is_set():
+            self._cancelled.set()
+            self._record("cancelled")
+
+    def _record(self, outcome: str) -> None:
+        if self._outcome is not None:
+            return
+        self._outcome = outcome
+        head_start = None
+        if self._started_at is not None:
+            head_start = round(time.perf_counter() - self._started_at, 6)
+        with self._cond:
+            chunks = len(self._chunks)
+        # head_start_s: how long the spec had been generating when discovery ended
+        get_telemetry().emit("speculative_spec", outcome=outcome, head_start_s=head_start, chunks_ready=chunks)
+
+    def stream(self) -> Iterator[str]:
+        """
+        Yield the spec reply: what is already generated at once, then the rest as it arrives.
+
+        Raises:
+            LLMError: If the speculative call failed
+        """
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._chunks) and not self._finished:
+                    self._cond.wait()
+                chunks = self._chunks[index:]
+                finished = self._finished
+            index += len(chunks)
+            yield from chunks
+            if finished and index >= len(self._chunks):
+                if self._error is not None:
+                    raise self._error
+                return
+
+
+def stream_first_spec(
+    usecase_details: str,
+    client: ClaudeClient,
+    render: Callable[[Iterator[str]], str],
+    speculation: Optional[SpeculativeSpec] = None,
+    registry: Optional[TemplateRegistry] = None,
+    max_tokens: int = SPEC_MAX_TOKENS,
+) -> Tuple[str, ClaudeClient, List[str]]:
+    """
+    Generate the first specification, taking over a committed speculative run if there is one.
+
+    If the speculative call fails, before or after its first chunk, the spec
+    is generated again on client, so a failed head start costs time but
+    never the spec turn.
+
+    Args:
+        usecase_details: Enhanced use case JSON
+        client: Client of the session; its history is cleared for the spec
+            conversation unless the speculative run is used
+        render: Consumes the reply's deltas (displaying them, say) and
+            returns the complete reply. Called again from the start when
+            falling back.
+        speculation: Committed speculative run
+        registry: Template registry. Defaults to the process-wide one.
+        max_tokens: Output token limit per request
+
+    Returns:
+        (reply, client holding the spec conversation, spec system prompt)
+
+    Raises:
+        LLMError: If generating the spec on client fails
+    """
+    if speculation is not None:
+        try:
+            return render(speculation.stream()), speculation.client, speculation.system_prompt
+        except Exception as e:
+            # Whatever stopped the background run, the spec is still owed
+            print(f"Speculative spec generation failed, generating the spec again: {e}")
+            get_telemetry().emit("speculative_spec", outcome="failed", detail=str(e))
+
+    system_prompt = build_spec_system_prompt(usecase_details, registry)
+    client.clear_history()
+    return render(client.stream_message(usecase_details, system_prompt, max_tokens=max_tokens)), client, system_prompt
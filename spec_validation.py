@@ -0,0 +1,272 @@
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Set
+
+# "transition to state:<name>" and "variable:<name>" references in state instructions
+_STATE_REF = re.compile(r"state:\s*([A-Za-z_][\w]*)")
+_VARIABLE_REF = re.compile(r"variable:\s*([A-Za-z_][\w]*)")
+
+REQUIRED_KEYS = ("overall_plan", "agent_config", "intro_message")
+REQUIRED_AGENT_KEYS = ("global_prompt", "agent_variables", "states", "initial_state_name")
+
+MIN_STATES = 1
+MAX_STATES = 30
+
+# Validation results kept, keyed by specification content hash
+MAX_CACHED_RESULTS = 256
+
+# V2VApp field locations and the specification paths they come from
+_SPEC_LOCATIONS = (
+    ("llm_config.agent_config", "agent_config"),
+    ("intro_message_config.audio", "intro_message"),
+)
+
+
+class SpecValidationError(ValueError):
+    """Raised when a specification does not build a valid V2VApp."""
+
+    def __init__(self, errors: List[Dict[str, str]]):
+        self.errors = errors
+        super().__init__("; ".join(f"{e['loc']}: {e['msg']}" for e in errors) or "invalid specification")
+
+
+def _transitions(state: Dict[str, Any]) -> Set[str]:
+    """States a state can move to, from next_states and its instructions."""
+    targets = set(state.get("next_states") or [])
+    targets.update(_STATE_REF.findall(str(state.get("instructions", ""))))
+    return targets
+
+
+def check_structure(spec: Any, min_states: int = MIN_STATES, max_states: int = MAX_STATES) -> Dict[str, List[str]]:
+    """
+    Check a specification's structure without calling the SDK.
+
+    Errors make a spec unusable (missing keys, unknown initial state,
+    transitions to states that do not exist). Warnings are quality issues
+    (unreachable states, no way to end the conversation, references to
+    undeclared variables).
+
+    Args:
+        spec: Parsed specification
+        min_states: Fewest states accepted
+        max_states: Most states accepted
+
+    Returns:
+        {"errors": [...], "warnings": [...]}
+    """
+    errors: List[str] = []
+    warnings: List[str] = []
+    if not isinstance(spec, dict):
+        return {"errors": ["specification is not a JSON object"], "warnings": warnings}
+
+    errors.extend(f"missing key: {key}" for key in REQUIRED_KEYS if key not in spec)
+    agent_config = spec.get("agent_config")
+    if not isinstance(agent_config, dict):
+        return {"errors": errors or ["agent_config is not an object"], "warnings": warnings}
+    errors.extend(f"missing key: agent_config.{key}" for key in REQUIRED_AGENT_KEYS if key not in agent_config)
+
+    states = agent_config.get("states")
+    if not isinstance(states, dict) or not states:
+        errors.append("agent_config.states is empty")
+        return {"errors": errors, "warnings": warnings}
+    if not min_states <= len(states) <= max_states:
+        errors.append(f"{len(states)} states, expected {min_states}-{max_states}")
+
+    initial = agent_config.get("initial_state_name")
+    if initial not in states:
+        errors.append(f"initial_state_name {initial!r} is not a state")
+
+    variables = agent_config.get("agent_variables") or {}
+    ends = False
+    for name, state in states.items():
+        if not isinstance(state, dict):
+            errors.append(f"state {name} is not an object")
+            continue
+        for target in sorted(_transitions(state) - set(states)):
+            errors.append(f"state {name} transitions to unknown state {target}")
+        for variable in sorted(set(_VARIABLE_REF.findall(str(state.get("instructions", "")))) - set(variables)):
+            warnings.append(f"state {name} updates undeclared variable {variable}")
+        if "end the conversation" in str(state.get("instructions", "")).lower():
+            ends = True
+    if not ends:
+        warnings.append("no state ends the conversation")
+
+    if initial in states:
+        reached = {initial}
+        queue = deque([initial])
+        while queue:
+            state = states.get(queue.popleft())
+            if not isinstance(state, dict):
+                continue
+            for target in _transitions(state) & set(states):
+                if target not in reached:
+                    reached.add(target)
+                    queue.append(target)
+        warnings.extend(f"state {name} is unreachable from {initial}" for name in states if name not in reached)
+
+    return {"errors": errors, "warnings": warnings}
+
+
+_adapter = None
+_adapter_lock = threading.Lock()
+_results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_results_lock = threading.Lock()
+stats = {"validations": 0, "hits": 0}
+
+
+def get_app_adapter() -> Any:
+    """
+    Return the process-wide TypeAdapter for V2VApp.
+
+    Building the adapter compiles the model's validator, so it is done once
+    on first use instead of on every V2VApp(...) construction.
+    """
+    global _adapter
+    if _adapter is None:
+        with _adapter_lock:
+            if _adapter is None:
+                from pydantic import TypeAdapter
+                from sarvam_agents_sdk import V2VApp
+
+                _adapter = TypeAdapter(V2VApp)
+    return _adapter
+
+
+def spec_hash(spec: Any) -> str:
+    """Content hash of a specification, independent of key order."""
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def build_app_json(spec: dict) -> Dict[str, Any]:
+    """
+    Map a generated specification onto the V2VApp fields.
+
+    Args:
+        spec: Parsed specification
+
+    Returns:
+        V2VApp keyword arguments; the specification itself is not modified
+    """
+    from sarvam_agents_sdk import LanguageName, LLMModelVariant
+
+    agent_config = dict(spec["agent_config"])
+    agent_config["enable_structured_prompt"] = True
+    return {
+        "language_config": {
+            "initial_language_name": LanguageName.HINDI.value,
+            "supported_languages": [LanguageName.HINDI.value],
+        },
+        "llm_config": {
+            "llm_model_variant": LLMModelVariant.TOTA_V6.value,
+            "agent_config": agent_config,
+        },
+        "intro_message_config": {"audio": spec["intro_message"]},
+        "channel_type": "v2v",
+    }
+
+
+def _spec_location(loc: tuple) -> str:
+    path = ".".join(str(part) for part in loc)
+    for app_prefix, spec_prefix in _SPEC_LOCATIONS:
+        if path == app_prefix or path.startswith(app_prefix + "."):
+            return spec_prefix + path[len(app_prefix):]
+    return path
+
+
+def validate_spec(spec: Any) -> Dict[str, Any]:
+    """
+    Validate a specification against V2VApp, memoized by content hash.
+
+    Args:
+        spec: Parsed specification
+
+    Returns:
+        {"valid", "errors", "app_config", "hash"}. errors holds one
+        {"loc", "msg", "type"} dict per field, with loc as a dotted path
+        into the specification; app_config is the JSON-ready app payload
+        of a valid specification
+    """
+    key = spec_hash(spec)
+    with _results_lock:
+        result = _results.get(key)
+        if result is not None:
+            _results.move_to_end(key)
+            stats["hits"] += 1
+            return result
+
+    from pydantic import ValidationError
+
+    errors: List[Dict[str, str]] = []
+    app_config = None
+    if not isinstance(spec, dict):
+        errors.append({"loc": "", "msg": "specification is not a JSON object", "type": "type_error"})
+    else:
+        missing = [k for k in ("agent_config", "intro_message") if k not in spec]
+        errors.extend({"loc": k, "msg": "Field required", "type": "missing"} for k in missing)
+        if not missing:
+            adapter = get_app_adapter()
+            try:
+                app = adapter.validate_python(build_app_json(spec))
+                app_config = adapter.dump_python(app, mode="json")
+            except ValidationError as e:
+                errors.extend(
+                    {"loc": _spec_location(err["loc"]), "msg": err["msg"], "type": err["type"]}
+                    for err in e.errors()
+                )
+            except (TypeError, ValueError) as e:
+                errors.append({"loc": "", "msg": str(e), "type": type(e).__name__})
+
+    result = {"valid": not errors, "errors": errors, "app_config": app_config, "hash": key}
+    with _results_lock:
+        _results[key] = result
+        while len(_results) > MAX_CACHED_RESULTS:
+            _results.popitem(last=False)
+        stats["validations"] += 1
+    return result
+
+
+def validate_app_config(spec: dict) -> List[str]:
+    """
+    Validate a specification against the SDK's V2VApp model.
+
+    Args:
+        spec: Parsed specification
+
+    Returns:
+        Validation errors, empty when the app config builds
+    """
+    return [f"{e['loc']}: {e['msg']}" if e["loc"] else e["msg"] for e in validate_spec(spec)["errors"]]
+
+
+def score_spec(spec: Any, min_states: int = MIN_STATES, max_states: int = MAX_STATES) -> Dict[str, Any]:
+    """
+    Score a specification candidate.
+
+    A candidate is valid when it has no structural errors and passes V2VApp
+    validation. Valid candidates score 100 minus 5 per warning; invalid ones
+    score below zero, so any valid candidate beats every invalid one.
+
+    Args:
+        spec: Parsed specification, or None if the reply did not parse
+        min_states: Fewest states accepted
+        max_states: Most states accepted
+
+    Returns:
+        {"valid", "score", "errors", "warnings"}
+    """
+    if spec is None:
+        return {"valid": False, "score": -100.0, "errors": ["reply is not valid JSON"], "warnings": []}
+
+    result = check_structure(spec, min_states, max_states)
+    errors, warnings = result["errors"], result["warnings"]
+    if not errors:
+        errors = validate_app_config(spec)
+
+    if errors:
+        score = -float(len(errors)) - len(warnings) * 0.1
+    else:
+        score = 100.0 - 5.0 * len(warnings)
+    return {"valid": not errors, "score": score, "errors": errors, "warnings": warnings}
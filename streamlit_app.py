@@ -1,12 +1,31 @@
 import streamlit as st
+import asyncio
 import json
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Iterator, List
 from datetime import datetime
 from dotenv import load_dotenv
-from claude_client import ClaudeClient
+from claude_client import AsyncClaudeClient, ClaudeClient, ClaudeTransport, LLMError, LLMTimeoutError, LLMUnavailableError
 from utils import create_app, update_app
-import re
+from json_extractor import extract_json
+from jinja2 import TemplateNotFound
+from prompt_templates import TemplateRegistry
+from spec_pipeline import (
+    DISCOVERY_MAX_TOKENS,
+    SPEC_MAX_TOKENS,
+    SpeculativeSpec,
+    build_spec_system_prompt,
+    edit_spec_with_patch,
+    generate_spec_candidates,
+    load_discovery_prompt,
+    parse_handoff,
+    stream_first_spec,
+)
+from single_flight import get_single_flight
+from spec_validation import validate_spec
+from telemetry import RingBufferSink, current_session, get_telemetry
 import os
+import time
+import uuid
 from auth_setup import ensure_authentication
 
 load_dotenv()
@@ -23,368 +42,76 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for ChatGPT-like styling
-st.markdown("""
-<style>
-    /* Import Inter font for better typography */
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
-    
-    /* Global dark theme styling */
-    .stApp {
-        background-color: #1a1a1a;
-        color: #e0e0e0;
-        font-family: 'Inter', sans-serif;
-    }
-    
-    /* Main container */
-    .main .block-container {
-        background-color: #1a1a1a;
-        padding: 0 0 8rem 0; /* Add bottom padding so content isn't hidden behind the fixed chat input */
-        max-width: 100%;
-    }
-    
-    /* Header styling */
-    .main-header {
-        text-align: center;
-        color: #e0e0e0;
-        padding: 1.5rem 0;
-        background-color: #1a1a1a;
-        font-size: 1.5rem;
-        font-weight: 600;
-        margin-bottom: 0;
-        border-bottom: 1px solid #333333;
-        font-family: 'Inter', sans-serif;
-    }
-    
-    /* Chat message styling */
-    .chat-message {
-        padding: 1.5rem;
-        margin: 0;
-        border-bottom: 1px solid #333333;
-        font-size: 0.95rem;
-        line-height: 1.6;
-        font-family: 'Inter', sans-serif;
-    }
-    
-    .chat-message:hover {
-        background-color: rgba(255, 255, 255, 0.025);
-    }
-    
-    .user-message {
-        background-color: #1a1a1a;
-        color: #e0e0e0;
-        border-left: none;
-        margin: 0;
-        position: relative;
-    }
-    
-    .user-message::before {
-        content: "You";
-        position: absolute;
-        top: 1rem;
-        left: 1.5rem;
-        font-size: 0.875rem;
-        font-weight: 600;
-        color: #e0e0e0;
-        margin-bottom: 0.5rem;
-    }
-    
-    .user-message .message-content {
-        padding-top: 2rem;
-    }
-    
-    .assistant-message {
-        background-color: #1a1a1a;
-        color: #e0e0e0;
-        border-left: none;
-        margin: 0;
-        position: relative;
-    }
-    
-    .assistant-message::before {
-        content: "Claude";
-        position: absolute;
-        top: 1rem;
-        left: 1.5rem;
-        font-size: 0.875rem;
-        font-weight: 600;
-        color: #e0e0e0;
-        margin-bottom: 0.5rem;
-    }
-    
-    .assistant-message .message-content {
-        padding-top: 2rem;
-    }
-    
-    .system-message {
-        background-color: #404040;
-        color: #cccccc;
-        border: 1px solid #333333;
-        border-radius: 6px;
-        font-style: italic;
-        text-align: center;
-        margin: 1rem;
-        padding: 1rem;
-        font-size: 0.875rem;
-    }
-    
-    /* Phase indicator */
-    .phase-indicator {
-        background-color: #4a4a4a;
-        color: white;
-        padding: 0.75rem 1rem;
-        border-radius: 6px;
-        text-align: center;
-        margin: 1rem;
-        font-weight: 600;
-        font-size: 0.9rem;
-        border: 1px solid #5a5a5a;
-    }
-    
-    /* JSON container */
-    .json-container {
-        background-color: #242424;
-        color: #e0e0e0;
-        padding: 1rem;
-        border-radius: 6px;
-        border: 1px solid #333333;
-        margin: 1rem 0;
-        font-family: 'Monaco', 'Menlo', 'Consolas', monospace;
-        font-size: 0.875rem;
-        line-height: 1.5;
-        overflow-x: auto;
-    }
-    
-    /* Sidebar styling */
-    .css-1d391kg, .css-1cypcdb {
-        background-color: #1a1a1a !important;
-        border-right: 1px solid #333333;
-    }
-    
-    .css-1d391kg .stMarkdown, .css-1cypcdb .stMarkdown {
-        color: #e0e0e0;
-    }
-    
-    /* Button styling */
-    .stButton > button {
-        background-color: #4a4a4a;
-        color: white;
-        border: none;
-        border-radius: 6px;
-        padding: 0.75rem 1rem;
-        font-weight: 600;
-        transition: all 0.2s ease;
-        font-family: 'Inter', sans-serif;
-        font-size: 0.875rem;
-    }
-    
-    .stButton > button:hover {
-        background-color: #5a5a5a;
-        transform: none;
-        box-shadow: none;
-    }
-    
-    .stButton > button:active {
-        background-color: #3a3a3a;
-    }
-    
-    /* Form styling */
-    .stTextArea textarea {
-        background-color: #1a1a1a;
-        color: #e0e0e0;
-        border: 1px solid #4a4a4a;
-        border-radius: 6px;
-        padding: 1rem;
-        font-size: 0.9rem;
-        font-family: 'Inter', sans-serif;
-        transition: border-color 0.2s ease;
-        resize: vertical;
-    }
-    
-    .stTextArea textarea:focus {
-        border-color: #5a5a5a;
-        box-shadow: 0 0 0 2px rgba(90, 90, 90, 0.2);
-        outline: none;
-    }
-    
-    .stTextArea textarea::placeholder {
-        color: #888888;
-    }
-    
-    /* Input styling */
-    .stTextInput input {
-        background-color: #333333;
-        color: #e0e0e0;
-        border: 1px solid #4a4a4a;
-        border-radius: 6px;
-        padding: 0.75rem;
-        font-family: 'Inter', sans-serif;
-    }
-    
-    .stTextInput input:focus {
-        border-color: #5a5a5a;
-        box-shadow: 0 0 0 2px rgba(90, 90, 90, 0.2);
-        outline: none;
-    }
-    
-    /* Info panels */
-    .stAlert {
-        border-radius: 6px;
-        border: 1px solid #333333;
-        background-color: #3a3a3a;
-        color: #e0e0e0;
-    }
-    
-    .stAlert > div {
-        padding: 1rem;
-    }
-    
-    /* Expander styling */
-    .streamlit-expanderHeader {
-        background-color: #333333;
-        color: #e0e0e0;
-        border-radius: 6px;
-        padding: 1rem;
-        font-weight: 600;
-        border: 1px solid #4a4a4a;
-    }
-    
-    .streamlit-expanderContent {
-        background-color: #242424;
-        border: 1px solid #333333;
-        border-radius: 0 0 6px 6px;
-    }
-    
-    /* Success/Error messages */
-    .stSuccess {
-        background-color: #4a4a4a;
-        border: 1px solid #5a5a5a;
-        color: white;
-    }
-    
-    .stError {
-        background-color: #3a3a3a;
-        border: 1px solid #4a4a4a;
-        color: white;
-    }
-    
-    .stWarning {
-        background-color: #454545;
-        border: 1px solid #555555;
-        color: white;
-    }
-    
-    /* Custom scrollbar */
-    .stChatMessage::-webkit-scrollbar {
-        width: 8px;
-    }
-    
-    .stChatMessage::-webkit-scrollbar-track {
-        background: #242424;
-        border-radius: 4px;
-    }
-    
-    .stChatMessage::-webkit-scrollbar-thumb {
-        background: #4a4a4a;
-        border-radius: 4px;
-    }
-    
-    .stChatMessage::-webkit-scrollbar-thumb:hover {
-        background: #5a5a5a;
-    }
-    
-    /* Hide Streamlit branding */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    header {visibility: hidden;}
-    
-    /* Message input area */
-    .stChatInputContainer {
-        background-color: #1a1a1a;
-        border-top: 1px solid #333333;
-        padding: 1rem; /* Minimise horizontal padding so the input can use full width */
-        position: fixed;   /* Pin to the bottom of the viewport */
-        bottom: 0;
-        left: 0;
-        width: 100%;
-        max-width: 100%;
-        z-index: 1000;
-    }
+@st.cache_resource
+def load_css() -> str:
+    """Read the stylesheet once per process."""
+    with open("style.css", "r", encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
 
-    /* Ensure any internal wrappers of st.chat_input also stretch */
-    .stChatInputContainer > div,
-    .stChatInputContainer [data-testid="stChatInput"] {
-        width: 100% !important;
-        max-width: 100% !important;
-    }
+# Custom CSS for ChatGPT-like styling. Streamlit drops elements that are not
+# re-emitted, so the tag is sent on every rerun, but the file is read once.
+st.markdown(load_css(), unsafe_allow_html=True)
 
-    /* Finally, make the native textarea / input span full width */
-    .stChatInputContainer textarea,
-    .stChatInputContainer input {
-        width: 100% !important;
-        max-width: 100% !important;
-        box-sizing: border-box;
-    }
-    
-    /* Code blocks */
-    .stCodeBlock {
-        background-color: #242424;
-        border: 1px solid #333333;
-        border-radius: 6px;
-    }
-    
-    .stCodeBlock code {
-        color: #e0e0e0;
-        font-family: 'Monaco', 'Menlo', 'Consolas', monospace;
-    }
-    
-    /* Responsive design */
-    @media (max-width: 768px) {
-        .main-header {
-            font-size: 1.25rem;
-            padding: 1rem 0;
-        }
-        
-        .chat-message {
-            padding: 1rem;
-        }
-        
-        .user-message::before,
-        .assistant-message::before {
-            font-size: 0.8rem;
-        }
-    }
-    
-    /* Loading animation for ChatGPT-like experience */
-    .loading-dots {
-        display: inline-block;
-        position: relative;
-        margin: 0.5rem 0;
-    }
-    
-    .loading-dots::after {
-        content: '';
-        display: inline-block;
-        width: 4px;
-        height: 4px;
-        border-radius: 50%;
-        background: #5a5a5a;
-        animation: loading 1.4s infinite linear;
-    }
-    
-    @keyframes loading {
-        0%, 20% {
-            background: #5a5a5a;
-        }
-        50% {
-            background: #4a4a4a;
-        }
-        80%, 100% {
-            background: #5a5a5a;
-        }
-    }
-</style>
-""", unsafe_allow_html=True)
+@st.cache_resource
+def get_transport() -> ClaudeTransport:
+    """Credentials, configuration and pooled connections shared by every session."""
+    return ClaudeTransport()
+
+@st.cache_resource
+def get_template_registry() -> TemplateRegistry:
+    """Compiled prompt templates shared by every session in this process."""
+    return TemplateRegistry()
+
+@st.cache_resource
+def get_session_store() -> Optional["SessionStore"]:
+    """Durable session store shared by every session, or None when disabled."""
+    if not SESSION_DB_URL:
+        return None
+    # Imported here so SQLAlchemy is only loaded when sessions are persisted
+    from session_store import SessionStore
+    return SessionStore(SESSION_DB_URL)
+
+@st.cache_resource
+def get_similarity_index() -> Optional["SimilarityIndex"]:
+    """Index of past use cases shared by every session, or None when disabled."""
+    if not SIMILARITY_INDEX_PATH:
+        return None
+    # Imported here so NumPy is only loaded when the index is enabled
+    from similarity_index import SimilarityIndex
+    return SimilarityIndex(SIMILARITY_INDEX_PATH)
+
+# Minimum seconds between placeholder refreshes while a reply is streaming
+STREAM_RENDER_INTERVAL = 0.05
+
+# Messages rendered per page of chat history
+CHAT_PAGE_SIZE = 20
+
+# Calls listed in the sidebar latency panel
+LATENCY_PANEL_CALLS = 10
+
+# Start the spec request as soon as the handoff JSON closes mid-stream
+SPECULATIVE_SPEC = os.getenv("SPECULATIVE_SPEC", "1").lower() in ("1", "true", "yes")
+
+# First specification: candidates generated concurrently (1 = a single
+# streamed reply) and seconds after which the first valid one is accepted
+SPEC_CANDIDATES = int(os.getenv("SPEC_CANDIDATES", "1"))
+SPEC_CANDIDATE_DEADLINE = float(os.getenv("SPEC_CANDIDATE_DEADLINE", "45"))
+
+# Specification edits: "patch" asks for a JSON Patch and regenerates the full
+# spec only when it fails; "full" always regenerates
+SPEC_EDIT_MODE = os.getenv("SPEC_EDIT_MODE", "patch")
+
+# Sessions are saved here and resumed from the ?session=<id> URL parameter,
+# e.g. SESSION_DB_URL=sqlite:////var/lib/app/sessions.db. Empty (the default)
+# keeps them in memory only, so nothing is written to the working directory.
+SESSION_DB_URL = os.getenv("SESSION_DB_URL", "")
+
+# Past use cases, their handoffs and specs; a new use case at least this
+# similar (cosine, 0-1) to a past one is offered its results. Every user is
+# offered every other user's results, so it is off unless a path is set,
+# e.g. SIMILARITY_INDEX_PATH=similarity_index.
+SIMILARITY_INDEX_PATH = os.getenv("SIMILARITY_INDEX_PATH", "")
+SIMILAR_USECASE_THRESHOLD = float(os.getenv("SIMILAR_USECASE_THRESHOLD", "0.6"))
 
 class StreamlitChatbot:
     """Streamlit-based chatbot interface."""
@@ -392,21 +119,52 @@ class StreamlitChatbot:
     def __init__(self):
         """Initialize the Streamlit chatbot."""
         self.initialize_session_state()
+        # Tag this run's telemetry with the session for the latency panel
+        current_session.set(st.session_state.session_id)
         self.setup_client()
         self.load_prompts()
+        self.resume_session()
     
     def initialize_session_state(self):
         """Initialize Streamlit session state variables."""
+        if 'session_id' not in st.session_state:
+            session_id = st.query_params.get("session")
+            store = get_session_store()
+            saved = store.load(session_id) if store is not None and session_id else None
+            if saved is None:
+                session_id = uuid.uuid4().hex
+            st.session_state.session_id = session_id
+            st.session_state.saved_session = saved
+            # Reloading the page (or another replica) resumes from this URL
+            st.query_params["session"] = session_id
+        if 'chat_epoch' not in st.session_state:
+            st.session_state.chat_epoch = 0
+        if 'chat_first_seq' not in st.session_state:
+            st.session_state.chat_first_seq = 0
+        if 'client_recorder' not in st.session_state:
+            st.session_state.client_recorder = None
+        if 'discovery_usecase' not in st.session_state:
+            st.session_state.discovery_usecase = None
+        if 'similar_usecase' not in st.session_state:
+            st.session_state.similar_usecase = None
         if 'client' not in st.session_state:
             st.session_state.client = None
         if 'first_turn' not in st.session_state:
             st.session_state.first_turn = True
         if 'spec_parsed' not in st.session_state:
             st.session_state.spec_parsed = None
+        if 'spec_validation' not in st.session_state:
+            st.session_state.spec_validation = None
         if 'phase' not in st.session_state:
             st.session_state.phase = "discovery"
         if 'chat_history' not in st.session_state:
             st.session_state.chat_history = []
+        if 'next_message_id' not in st.session_state:
+            st.session_state.next_message_id = 0
+        if 'rendered_messages' not in st.session_state:
+            st.session_state.rendered_messages = {}
+        if 'history_pages' not in st.session_state:
+            st.session_state.history_pages = 1
         if 'spec_system_prompt' not in st.session_state:
             st.session_state.spec_system_prompt = None
         if 'initial_usecase' not in st.session_state:
@@ -416,11 +174,98 @@ class StreamlitChatbot:
         """Setup the Claude client."""
         try:
             if st.session_state.client is None:
-                st.session_state.client = ClaudeClient()
+                st.session_state.client = ClaudeClient(transport=get_transport())
         except ValueError as e:
             st.error(f"Error initializing Claude client: {e}")
             st.stop()
     
+    def resume_session(self):
+        """Restore a saved session once, loading only the latest page of chat messages."""
+        saved = st.session_state.pop("saved_session", None)
+        store = get_session_store()
+        if store is None:
+            return
+        from session_store import HistoryRecorder
+        
+        session_id = st.session_state.session_id
+        if saved is None:
+            if st.session_state.client_recorder is None:
+                st.session_state.client_recorder = HistoryRecorder(store, session_id, "client")
+            return
+        
+        st.session_state.phase = saved["phase"]
+        st.session_state.first_turn = saved["first_turn"]
+        st.session_state.spec_system_prompt = saved["spec_system_prompt"]
+        st.session_state.chat_epoch = saved["chat_epoch"]
+        st.session_state.discovery_usecase = saved.get("discovery_usecase")
+        st.session_state.similar_usecase = saved.get("similar_usecase")
+        if saved["spec_parsed"]:
+            self.set_spec(saved["spec_parsed"])
+        
+        chat = store.load_messages(session_id, "chat", saved["chat_epoch"], limit=CHAT_PAGE_SIZE)
+        st.session_state.chat_history = [self._chat_entry(m) for m in chat]
+        st.session_state.chat_first_seq = chat[0]["seq"] if chat else 0
+        st.session_state.next_message_id = saved["chat_seq"]
+        
+        client = st.session_state.client
+        client.conversation_history = [
+            {"role": m["role"], "content": m["content"]}
+            for m in store.load_messages(session_id, "client", saved["client_epoch"])
+        ]
+        client.history_manager.summary = saved.get("history_summary")
+        st.session_state.client_recorder = HistoryRecorder(
+            store, session_id, "client", saved["client_epoch"], client.conversation_history
+        )
+    
+    def save_session(self):
+        """Queue this turn's new messages and the session state; the writes happen in the background."""
+        store = get_session_store()
+        if store is None:
+            return
+        recorder = st.session_state.client_recorder
+        recorder.sync(st.session_state.client.conversation_history)
+        store.save(
+            st.session_state.session_id,
+            {
+                "phase": st.session_state.phase,
+                "first_turn": st.session_state.first_turn,
+                "spec_parsed": st.session_state.spec_parsed,
+                "spec_system_prompt": st.session_state.spec_system_prompt,
+                "history_summary": st.session_state.client.history_manager.summary,
+                "discovery_usecase": st.session_state.discovery_usecase,
+                "similar_usecase": st.session_state.similar_usecase,
+                "chat_epoch": st.session_state.chat_epoch,
+                "chat_seq": st.session_state.next_message_id,
+                "client_epoch": recorder.epoch,
+            },
+        )
+    
+    def load_earlier_messages(self):
+        """Prepend the previous page of chat messages from the session store."""
+        store = get_session_store()
+        if store is None or not st.session_state.chat_first_seq:
+            return
+        older = store.load_messages(
+            st.session_state.session_id,
+            "chat",
+            st.session_state.chat_epoch,
+            before=st.session_state.chat_first_seq,
+            limit=CHAT_PAGE_SIZE,
+        )
+        st.session_state.chat_history[:0] = [self._chat_entry(m) for m in older]
+        st.session_state.chat_first_seq = older[0]["seq"] if older else 0
+    
+    @staticmethod
+    def _chat_entry(message: Dict[str, Any]) -> Dict[str, Any]:
+        """Chat history entry for a stored chat message."""
+        return {
+            "id": message["seq"],
+            "role": message["role"],
+            "content": message["content"],
+            "message_type": message["message_type"] or "text",
+            "timestamp": message["timestamp"] or "",
+        }
+    
     def load_initial_usecase(self) -> str:
         """Load the initial use case from file."""
         try:
@@ -430,96 +275,144 @@ class StreamlitChatbot:
             return ""
     
     def load_prompts(self):
-        """Load prompt templates."""
+        """Load prompt templates from the shared registry."""
         try:
-            with open("v2v.j2", "r", encoding="utf-8") as f:
-                st.session_state.spec_system_prompt_tpl = f.read()
-            
-            with open("question_generation_prompt.j2", "r", encoding="utf-8") as f:
-                st.session_state.question_generation_prompt = f.read()
-        except FileNotFoundError as e:
+            st.session_state.question_generation_prompt = load_discovery_prompt(get_template_registry())
+        except TemplateNotFound as e:
             st.error(f"Error loading prompt templates: {e}")
             st.stop()
     
+    def build_spec_system_prompt(self, usecase_details: str) -> List[str]:
+        """Build the specification system prompt as cacheable segments."""
+        return build_spec_system_prompt(usecase_details, get_template_registry())
+    
     def extract_json(self, text: str) -> Optional[dict]:
         """Extract JSON from Claude's response."""
-        # Direct parse attempt
-        try:
-            return json.loads(text)
-        except Exception:
-            pass
-
-        # Look for fenced code blocks
-        code_blocks = re.findall(r"```(?:json)?\s*([\s\S]*?)\s*```", text, flags=re.IGNORECASE)
-        for block in code_blocks:
-            try:
-                return json.loads(block)
-            except Exception:
-                continue
-
-        # Fallback: substring between first { and last }
-        if "{" in text and "}" in text:
-            candidate = text[text.find("{") : text.rfind("}") + 1]
-            try:
-                return json.loads(candidate)
-            except Exception:
-                pass
-        return None
+        return extract_json(text)
     
     def add_to_chat_history(self, role: str, content: str, message_type: str = "text"):
         """Add message to chat history."""
-        st.session_state.chat_history.append({
+        message = {
+            "id": st.session_state.next_message_id,
             "role": role,
             "content": content,
             "message_type": message_type,
             "timestamp": datetime.now().strftime("%H:%M:%S")
-        })
+        }
+        st.session_state.chat_history.append(message)
+        st.session_state.next_message_id += 1
+        
+        store = get_session_store()
+        if store is not None:
+            store.append(
+                st.session_state.session_id,
+                "chat",
+                st.session_state.chat_epoch,
+                message["id"],
+                role,
+                content,
+                message_type,
+                message["timestamp"],
+            )
     
-    def display_chat_history(self):
-        """Display the chat history."""
-        if not st.session_state.chat_history:
-            # No messages yet; render nothing so the interface stays clean
-            return
+    def render_message_html(self, message: Dict[str, Any], collapsed: bool = False) -> str:
+        """
+        Get the HTML for one chat message, rendering it only once.
         
-        for message in st.session_state.chat_history:
-            role = message["role"]
-            content = message["content"]
-            timestamp = message["timestamp"]
-            message_type = message.get("message_type", "text")
+        Args:
+            message: Chat history entry
+            collapsed: Fold a JSON specification behind a summary line
             
-            if role == "user":
-                st.markdown(f"""
-                <div class="chat-message user-message">
-                    <div class="message-content">
-                        {content}
-                    </div>
+        Returns:
+            HTML fragment for st.markdown
+        """
+        key = (message["id"], collapsed)
+        cached = st.session_state.rendered_messages.get(key)
+        if cached is not None:
+            return cached
+        
+        role = message["role"]
+        content = message["content"]
+        message_type = message.get("message_type", "text")
+        
+        if role == "user":
+            html = f"""
+            <div class="chat-message user-message">
+                <div class="message-content">
+                    {content}
                 </div>
-                """, unsafe_allow_html=True)
-            elif role == "assistant":
-                if message_type == "json":
-                    st.markdown(f"""
-                    <div class="chat-message assistant-message">
-                        <div class="message-content">
-                            <div class="json-container">
-                                <pre>{content}</pre>
-                            </div>
-                        </div>
+            </div>
+            """
+        elif role == "assistant" and message_type == "json":
+            body = f"<pre>{content}</pre>"
+            if collapsed:
+                body = (
+                    f"<details><summary>Earlier specification ({content.count(chr(10)) + 1} lines, "
+                    f"{message['timestamp']})</summary>{body}</details>"
+                )
+            html = f"""
+            <div class="chat-message assistant-message">
+                <div class="message-content">
+                    <div class="json-container">
+                        {body}
                     </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                    <div class="chat-message assistant-message">
-                        <div class="message-content">
-                            {content}
-                        </div>
-                    </div>
-                    """, unsafe_allow_html=True)
-            elif role == "system":
-                st.markdown(f"""
-                <div class="chat-message system-message">
+                </div>
+            </div>
+            """
+        elif role == "assistant":
+            html = f"""
+            <div class="chat-message assistant-message">
+                <div class="message-content">
                     {content}
                 </div>
-                """, unsafe_allow_html=True)
+            </div>
+            """
+        else:
+            html = f"""
+            <div class="chat-message system-message">
+                {content}
+            </div>
+            """
+        
+        st.session_state.rendered_messages[key] = html
+        return html
+    
+    @st.fragment
+    def display_chat_history(self):
+        """
+        Display the most recent pages of the chat history.
+        
+        Runs as a fragment, so paging through older messages reruns only this
+        part of the page. Every specification except the latest is collapsed.
+        """
+        history = st.session_state.chat_history
+        if not history:
+            # No messages yet; render nothing so the interface stays clean
+            return
+        
+        visible = CHAT_PAGE_SIZE * st.session_state.history_pages
+        hidden = max(len(history) - visible, 0)
+        # Messages of a resumed session that are still only in the store
+        unloaded = st.session_state.chat_first_seq
+        if hidden or unloaded:
+            if st.button(f"Show {min(hidden + unloaded, CHAT_PAGE_SIZE)} earlier messages ({hidden + unloaded} hidden)"):
+                if hidden < CHAT_PAGE_SIZE:
+                    self.load_earlier_messages()
+                st.session_state.history_pages += 1
+                st.rerun(scope="fragment")
+        
+        latest_json_id = next(
+            (m["id"] for m in reversed(history) if m.get("message_type") == "json"), None
+        )
+        shown = {}
+        for message in history[hidden:]:
+            collapsed = message.get("message_type") == "json" and message["id"] != latest_json_id
+            html = self.render_message_html(message, collapsed)
+            shown[(message["id"], collapsed)] = html
+            st.markdown(html, unsafe_allow_html=True)
+        # Keep only what is on the page, so the cache is bounded by the visible
+        # pages instead of growing with every message and collapsed spec
+        st.session_state.rendered_messages = shown
     
     def run(self):
         """Main Streamlit app interface."""
@@ -539,6 +432,8 @@ class StreamlitChatbot:
             with chat_container:
                 self.display_chat_history()
             
+            self.render_similar_usecase_offer()
+            
             # Chat input pinned to bottom of the page
             user_input = st.chat_input("Your message:")
             if user_input is not None and user_input.strip():
@@ -552,10 +447,19 @@ class StreamlitChatbot:
             if st.button("🗑️ Clear History"):
                 st.session_state.client.clear_history()
                 st.session_state.chat_history = []
+                st.session_state.next_message_id = 0
+                st.session_state.chat_epoch += 1
+                st.session_state.chat_first_seq = 0
+                st.session_state.rendered_messages = {}
+                st.session_state.history_pages = 1
                 st.session_state.first_turn = True
                 st.session_state.phase = "discovery"
                 st.session_state.spec_parsed = None
+                st.session_state.spec_validation = None
                 st.session_state.spec_system_prompt = None
+                st.session_state.discovery_usecase = None
+                st.session_state.similar_usecase = None
+                self.save_session()
                 st.success("Conversation cleared!")
                 st.rerun()
                 return  # Exit early; no other controls
@@ -572,17 +476,86 @@ class StreamlitChatbot:
                 st.divider()
                 st.subheader("🚀 App Management")
                 
+                validation = st.session_state.spec_validation
+                invalid = validation is not None and not validation["valid"]
+                if validation is None:
+                    st.caption("Specification not validated (Sarvam SDK unavailable)")
+                elif invalid:
+                    st.error("Specification does not match the app schema:")
+                    for error in validation["errors"]:
+                        st.markdown(f"- `{error['loc'] or 'spec'}`: {error['msg']}")
+                else:
+                    st.caption("✅ Specification matches the app schema")
+                
                 app_name = st.text_input("App Name", key="app_name_input")
                 
                 col1, col2 = st.columns(2)
                 with col1:
-                    if st.button("Create App") and app_name:
+                    if st.button("Create App", disabled=invalid) and app_name:
                         self.create_app(app_name)
                 
                 with col2:
                     app_id = st.text_input("App ID", key="app_id_input")
-                    if st.button("Update App") and app_name and app_id:
+                    if st.button("Update App", disabled=invalid) and app_name and app_id:
                         self.update_app(app_name, app_id)
+            
+            self.render_latency_panel()
+    
+    def render_latency_panel(self):
+        """Render per-call latency and token usage for this session."""
+        buffer = get_telemetry().find_sink(RingBufferSink)
+        if buffer is None:
+            return
+        records = buffer.records(session=st.session_state.session_id, limit=LATENCY_PANEL_CALLS)
+        if not records:
+            return
+        
+        st.divider()
+        with st.expander("⏱️ Latency", expanded=False):
+            last_llm = next((r for r in reversed(records) if r["kind"] == "llm"), None)
+            if last_llm is not None:
+                col1, col2 = st.columns(2)
+                col1.metric("Last turn", f"{last_llm['wall_s']:.2f}s")
+                if last_llm.get("ttft_s") is not None:
+                    col2.metric("TTFT", f"{last_llm['ttft_s']:.2f}s")
+                continued = ""
+                if last_llm.get("continuations"):
+                    continued = f" · continued {last_llm['continuations']}× (+{last_llm['continuation_s']:.2f}s)"
+                if last_llm.get("truncated"):
+                    continued += " · still cut off at max_tokens"
+                st.caption(
+                    f"{last_llm.get('input_tokens', 0)} in / {last_llm.get('output_tokens', 0)} out / "
+                    f"{last_llm.get('cache_read_tokens', 0)} cached tokens · "
+                    f"finish: {last_llm.get('finish_reason') or '-'}{continued}"
+                )
+            
+            rows = [
+                {
+                    "call": r.get("operation") or r["kind"],
+                    "status": r.get("status", "ok"),
+                    "endpoint": r.get("endpoint"),
+                    "hedged": r.get("hedged"),
+                    "wall ms": round(r["wall_s"] * 1000, 1),
+                    "queue ms": round(r.get("queue_s", 0) * 1000, 1),
+                    "ttft ms": round(r["ttft_s"] * 1000, 1) if r.get("ttft_s") is not None else None,
+                    "http ms": round(r["http_s"] * 1000, 1) if r.get("http_s") is not None else None,
+                    "out tokens": r.get("output_tokens"),
+                    "continued": r.get("continuations"),
+                }
+                for r in reversed(records)
+            ]
+            st.dataframe(rows, hide_index=True, use_container_width=True)
+            
+            # Process-wide: repeated deploys and completions answered by another call
+            absorbed = {
+                operation: counts["coalesced"] + counts["memo_hits"]
+                for operation, counts in get_single_flight().get_stats().items()
+            }
+            if any(absorbed.values()):
+                st.caption(
+                    "Duplicate calls joined: "
+                    + ", ".join(f"{operation} {count}" for operation, count in absorbed.items() if count)
+                )
     
     def render_info_panel(self):
         """Render the information panel."""
@@ -602,8 +575,8 @@ class StreamlitChatbot:
         """Render the chat input area."""
         # Auto-submit initial use case on first turn
         if st.session_state.first_turn and st.session_state.phase == "discovery" and st.session_state.initial_usecase:
-            self.process_message(st.session_state.initial_usecase)
             st.session_state.first_turn = False
+            self.process_message(st.session_state.initial_usecase)
             st.rerun()
         
         # Chat input pinned to bottom of the page
@@ -625,57 +598,317 @@ class StreamlitChatbot:
                 else:
                     self.handle_specification_phase(user_input)
         
+        except LLMTimeoutError as e:
+            self.report_error(f"Claude did not answer in time ({e}). Please send your message again.")
+        except LLMUnavailableError as e:
+            self.report_error(f"Claude is unavailable in every configured region ({e}). Please try again shortly.")
+        except LLMError as e:
+            self.report_error(f"Error communicating with Claude: {e}")
         except Exception as e:
-            st.error(f"Error processing message: {e}")
-            self.add_to_chat_history("system", f"Error: {e}")
+            self.report_error(f"Error processing message: {e}")
+        
+        self.save_session()
+    
+    def report_error(self, message: str):
+        """Show an error and keep it in the chat history."""
+        st.error(message)
+        self.add_to_chat_history("system", f"Error: {message}")
+    
+    def stream_response(
+        self,
+        user_input: str,
+        system_prompt: Any,
+        message_type: str = "text",
+        deltas: Optional[Iterator[str]] = None,
+        observer: Optional[Callable[[str], None]] = None,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """
+        Stream Claude's reply into a temporary placeholder.
+        
+        Args:
+            user_input: Message to send to Claude
+            system_prompt: System prompt for the current phase
+            message_type: 'json' renders the partial reply as a code block
+            deltas: Reply already being generated elsewhere; rendered instead
+                of sending user_input
+            observer: Called with every delta as it arrives
+            max_tokens: Output token limit per request for the current phase;
+                a reply that reaches it is continued in the same stream
+            
+        Returns:
+            The complete response text
+        """
+        placeholder = st.empty()
+        response = ""
+        last_render = 0.0
+        
+        try:
+            if deltas is None:
+                deltas = st.session_state.client.stream_message(user_input, system_prompt, max_tokens=max_tokens)
+            for delta in deltas:
+                response += delta
+                if observer is not None:
+                    observer(delta)
+                now = time.monotonic()
+                if now - last_render < STREAM_RENDER_INTERVAL:
+                    continue
+                last_render = now
+            
+                if message_type == "json":
+                    placeholder.markdown(f"""
+                    <div class="chat-message assistant-message">
+                        <div class="message-content">
+                            <div class="json-container">
+                                <pre>{response}</pre>
+                            </div>
+                        </div>
+                    </div>
+                    """, unsafe_allow_html=True)
+                else:
+                    placeholder.markdown(f"""
+                    <div class="chat-message assistant-message">
+                        <div class="message-content">
+                            {response}
+                        </div>
+                    </div>
+                    """, unsafe_allow_html=True)
+        finally:
+            # The final message is rendered from chat history on the next
+            # rerun; a failed stream leaves no partial reply behind
+            placeholder.empty()
+        return response
     
     def handle_discovery_phase(self, user_input: str):
         """Handle discovery phase conversation."""
-        response = st.session_state.client.send_message(
+        if st.session_state.discovery_usecase is None:
+            st.session_state.discovery_usecase = user_input
+            if self.offer_similar_usecase(user_input):
+                # Wait for the user to pick a starting point before calling the model
+                return
+        elif st.session_state.similar_usecase is not None:
+            # Typing instead of choosing declines the offer; the use case was never sent
+            st.session_state.similar_usecase = None
+            user_input = f"{st.session_state.discovery_usecase}\n\n{user_input}"
+        self.run_discovery_turn(user_input)
+    
+    def run_discovery_turn(self, user_input: str):
+        """Send one discovery message, speculatively starting the spec if enabled."""
+        speculation = None
+        if SPECULATIVE_SPEC and SPEC_CANDIDATES <= 1:
+            speculation = SpeculativeSpec(get_transport(), get_template_registry())
+        try:
+            self._handle_discovery_reply(user_input, speculation)
+        finally:
+            # Never leave a speculative run going after an error or a rerun
+            if speculation is not None:
+                speculation.cancel()
+    
+    def _handle_discovery_reply(self, user_input: str, speculation: Optional[SpeculativeSpec]):
+        response = self.stream_response(
             user_input, 
-            st.session_state.question_generation_prompt
+            st.session_state.question_generation_prompt,
+            observer=speculation.feed if speculation is not None else None,
+            max_tokens=DISCOVERY_MAX_TOKENS,
         )
         
-        # Try to extract JSON from response
-        parsed = self.extract_json(response)
+        # Try to extract the handoff JSON from response
+        enhanced_uc = parse_handoff(response)
+        committed = speculation is not None and speculation.resolve(enhanced_uc)
         
-        if isinstance(parsed, dict) and parsed.get("handoff") is True:
+        if enhanced_uc is not None:
             # Switch to specification phase
             self.add_to_chat_history("assistant", response)
             self.add_to_chat_history("system", "Switching to specification mode...")
-            
-            # Prepare for specification phase
-            enhanced_uc = parsed.copy()
-            enhanced_uc.pop("handoff", None)
-            enhanced_uc_str = json.dumps(enhanced_uc, indent=4)
-            
+            self.start_specification(enhanced_uc, speculation if committed else None)
+        else:
+            # Continue in discovery phase
+            self.add_to_chat_history("assistant", response)
+    
+    def start_specification(self, enhanced_uc: Dict[str, Any], speculation: Optional[SpeculativeSpec] = None):
+        """
+        Generate the first specification and switch to the specification phase.
+        
+        Args:
+            enhanced_uc: Handoff payload from discovery
+            speculation: Committed speculative run already generating the spec
+        """
+        self.remember_usecase(enhanced_uc=enhanced_uc)
+        
+        # Prepare for specification phase
+        enhanced_uc_str = json.dumps(enhanced_uc, indent=4)
+        
+        if SPEC_CANDIDATES > 1 and speculation is None:
             # Build system prompt
-            st.session_state.spec_system_prompt = st.session_state.spec_system_prompt_tpl.replace(
-                "{{ usecase_details }}", enhanced_uc_str
-            )
+            st.session_state.spec_system_prompt = self.build_spec_system_prompt(enhanced_uc_str)
             
             # Clear client history for clean context
             st.session_state.client.clear_history()
             
             # Get initial specification
-            spec_response = st.session_state.client.send_message(
-                enhanced_uc_str, 
-                st.session_state.spec_system_prompt
+            spec_response = self.select_spec_candidate(enhanced_uc_str)
+        else:
+            # A committed speculative client already holds the clean spec
+            # conversation; if its run failed, the spec is requested again
+            # on the session's client
+            spec_response, client, system_prompt = stream_first_spec(
+                enhanced_uc_str,
+                st.session_state.client,
+                lambda deltas: self.stream_response(enhanced_uc_str, None, "json", deltas=deltas),
+                speculation=speculation,
+                registry=get_template_registry(),
+                max_tokens=SPEC_MAX_TOKENS,
             )
+            st.session_state.client = client
+            st.session_state.spec_system_prompt = system_prompt
+        
+        # Parse and store initial specification
+        spec_parsed = self.extract_json(spec_response)
+        if spec_parsed:
+            self.set_spec(spec_parsed)
+            self.add_to_chat_history("assistant", json.dumps(spec_parsed, indent=2), "json")
+        else:
+            self.add_to_chat_history("assistant", spec_response)
+        
+        # Switch phase
+        st.session_state.phase = "specification"
+    
+    def offer_similar_usecase(self, usecase: str) -> bool:
+        """
+        Look up past use cases similar to a new one and offer the closest.
+        
+        Args:
+            usecase: The user's first message
             
-            # Parse and store initial specification
-            spec_parsed = self.extract_json(spec_response)
-            if spec_parsed:
-                st.session_state.spec_parsed = spec_parsed
-                self.add_to_chat_history("assistant", json.dumps(spec_parsed, indent=2), "json")
-            else:
-                self.add_to_chat_history("assistant", spec_response)
+        Returns:
+            True if an offer is now waiting for the user
+        """
+        index = get_similarity_index()
+        if index is None:
+            return False
+        matches = index.search(
+            usecase, k=1, min_score=SIMILAR_USECASE_THRESHOLD, exclude=st.session_state.session_id
+        )
+        if not matches or not matches[0]["payload"].get("enhanced_uc"):
+            return False
+        st.session_state.similar_usecase = matches[0]
+        self.add_to_chat_history(
+            "system",
+            f"This looks like an earlier use case ({matches[0]['score']:.0%} similar). "
+            "You can start from its results instead of a full discovery."
+        )
+        return True
+    
+    def render_similar_usecase_offer(self):
+        """Let the user reuse a similar past use case, its specification, or neither."""
+        match = st.session_state.similar_usecase
+        if match is None:
+            return
+        
+        payload = match["payload"]
+        with st.container(border=True):
+            st.markdown(f"**Similar earlier use case** ({match['score']:.0%} match)")
+            # Only the bot's purpose; the earlier user's own words stay private
+            purpose = (
+                payload["enhanced_uc"].get("enhanced_use_case", {})
+                .get("conversation_design", {})
+                .get("bot_primary_purpose")
+            )
+            if isinstance(purpose, str):
+                st.caption(purpose[:300])
+            col1, col2, col3 = st.columns(3)
+            use_spec = col1.button("Start from its specification", disabled=not payload.get("spec"))
+            use_usecase = col2.button("Reuse its use case")
+            discover = col3.button("Continue discovery")
+        
+        if not (use_spec or use_usecase or discover):
+            return
+        st.session_state.similar_usecase = None
+        try:
+            with st.spinner("Thinking..."):
+                if use_spec:
+                    self.adopt_specification(payload["enhanced_uc"], payload["spec"])
+                elif use_usecase:
+                    self.add_to_chat_history("system", "Reusing the earlier use case; switching to specification mode...")
+                    self.start_specification(payload["enhanced_uc"])
+                else:
+                    self.run_discovery_turn(st.session_state.discovery_usecase)
+        except Exception as e:
+            st.error(f"Error processing message: {e}")
+            self.add_to_chat_history("system", f"Error: {e}")
+        self.save_session()
+        st.rerun()
+    
+    def adopt_specification(self, enhanced_uc: Dict[str, Any], spec: Dict[str, Any]):
+        """
+        Skip discovery and generation by starting from an earlier specification.
+        
+        The client history is left as if the spec had just been generated, so
+        the user's edits work exactly as after a normal handoff.
+        
+        Args:
+            enhanced_uc: Handoff payload the spec was generated from
+            spec: Earlier specification
+        """
+        enhanced_uc_str = json.dumps(enhanced_uc, indent=4)
+        st.session_state.spec_system_prompt = self.build_spec_system_prompt(enhanced_uc_str)
+        st.session_state.client.clear_history()
+        st.session_state.client.add_message("user", enhanced_uc_str)
+        st.session_state.client.add_message("assistant", json.dumps(spec, indent=2))
+        
+        self.add_to_chat_history("system", "Starting from the earlier specification. Ask for any changes, such as the company name.")
+        self.set_spec(spec)
+        self.add_to_chat_history("assistant", json.dumps(spec, indent=2), "json")
+        st.session_state.phase = "specification"
+        self.remember_usecase(enhanced_uc=enhanced_uc)
+    
+    def remember_usecase(self, **payload: Any):
+        """
+        Record this session's use case and results in the similarity index.
+        
+        Args:
+            **payload: enhanced_uc and/or spec to store
+        """
+        index = get_similarity_index()
+        usecase = st.session_state.discovery_usecase
+        if index is None or not usecase:
+            return
+        session_id = st.session_state.session_id
+        if not index.update(session_id, **payload):
+            index.add(session_id, usecase, payload)
+    
+    def select_spec_candidate(self, usecase_details: str) -> str:
+        """
+        Generate SPEC_CANDIDATES specifications concurrently and keep the best.
+        
+        The client history is left as if the chosen candidate were the only reply.
+        
+        Args:
+            usecase_details: Enhanced use case JSON
             
-            # Switch phase
-            st.session_state.phase = "specification"
-        else:
-            # Continue in discovery phase
-            self.add_to_chat_history("assistant", response)
+        Returns:
+            The chosen candidate's response text
+        """
+        client = AsyncClaudeClient(transport=get_transport(), max_concurrency=SPEC_CANDIDATES)
+        with st.spinner(f"Generating {SPEC_CANDIDATES} specification candidates..."):
+            selection = asyncio.run(
+                generate_spec_candidates(
+                    client,
+                    usecase_details,
+                    st.session_state.spec_system_prompt,
+                    candidates=SPEC_CANDIDATES,
+                    deadline=SPEC_CANDIDATE_DEADLINE,
+                )
+            )
+        
+        if selection["response"] is None:
+            raise LLMError("no specification candidate succeeded")
+        
+        st.session_state.client.add_message("user", usecase_details)
+        st.session_state.client.add_message("assistant", selection["response"])
+        if not selection["valid"]:
+            st.warning("No candidate passed validation: " + "; ".join(selection["score"]["errors"][:3]))
+        return selection["response"]
     
     def handle_specification_phase(self, user_input: str):
         """Handle specification phase conversation."""
@@ -683,19 +916,54 @@ class StreamlitChatbot:
             st.error("System prompt not initialized for specification phase.")
             return
         
-        response = st.session_state.client.send_message(
+        if SPEC_EDIT_MODE == "patch" and st.session_state.spec_parsed:
+            with st.spinner("Applying your change..."):
+                patched, outcome = edit_spec_with_patch(
+                    st.session_state.client,
+                    st.session_state.spec_parsed,
+                    user_input,
+                    st.session_state.spec_system_prompt,
+                    get_template_registry(),
+                )
+            if patched is not None:
+                self.set_spec(patched)
+                self.add_to_chat_history("assistant", json.dumps(patched, indent=2), "json")
+                return
+            print(f"Patch edit fell back to full regeneration: {outcome}")
+        
+        response = self.stream_response(
             user_input, 
-            st.session_state.spec_system_prompt
+            st.session_state.spec_system_prompt,
+            "json",
+            max_tokens=SPEC_MAX_TOKENS,
         )
         
         # Try to parse as JSON
         parsed = self.extract_json(response)
         if parsed:
-            st.session_state.spec_parsed = parsed
+            self.set_spec(parsed)
             self.add_to_chat_history("assistant", json.dumps(parsed, indent=2), "json")
         else:
             self.add_to_chat_history("assistant", response)
     
+    def set_spec(self, spec: Dict[str, Any]):
+        """
+        Store a new specification and validate it against the app schema.
+        
+        Results are memoized by spec content, so deploying the same spec
+        later only makes the network call.
+        
+        Args:
+            spec: Parsed specification
+        """
+        st.session_state.spec_parsed = spec
+        self.remember_usecase(spec=spec)
+        try:
+            st.session_state.spec_validation = validate_spec(spec)
+        except ImportError as e:
+            print(f"Spec validation skipped: {e}")
+            st.session_state.spec_validation = None
+    
     def export_specification(self):
         """Export the current specification to a file."""
         if st.session_state.spec_parsed:
@@ -0,0 +1,305 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Session the current call belongs to; set by the app at the start of each run
+current_session: ContextVar[Optional[str]] = ContextVar("telemetry_session", default=None)
+
+# Upper bounds in seconds of the Prometheus latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Record fields exported as Prometheus token counters
+TOKEN_FIELDS = ("input_tokens", "output_tokens", "cache_read_tokens", "cache_creation_tokens")
+
+
+class JsonlSink:
+    """Appends every record to a JSON Lines file."""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: File the records are appended to
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def emit(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class RingBufferSink:
+    """
+    Keeps the most recent records of each session in memory.
+
+    Every session has a buffer of its own, so a busy session never evicts
+    the records of another. Records emitted outside a session share one
+    buffer. Buffers of the least recently active sessions are dropped
+    beyond max_sessions.
+    """
+
+    def __init__(self, max_records: int = 1000, max_sessions: int = 64):
+        """
+        Args:
+            max_records: Number of records kept per session
+            max_sessions: Number of session buffers kept
+        """
+        self.max_records = max_records
+        self.max_sessions = max_sessions
+        self._buffers: "OrderedDict[Optional[str], deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def emit(self, record: Dict[str, Any]) -> None:
+        session = record.get("session")
+        with self._lock:
+            buffer = self._buffers.get(session)
+            if buffer is None:
+                buffer = self._buffers[session] = deque(maxlen=self.max_records)
+                while len(self._buffers) > self.max_sessions:
+                    self._buffers.popitem(last=False)
+            else:
+                self._buffers.move_to_end(session)
+            buffer.append(record)
+
+    def records(
+        self,
+        kind: Optional[str] = None,
+        session: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get buffered records, oldest first.
+
+        Args:
+            kind: Only records of this kind
+            session: Only records of this session. None returns the records
+                of every session.
+            limit: Only the most recent `limit` matching records
+
+        Returns:
+            Matching records
+        """
+        with self._lock:
+            if session is not None:
+                records = list(self._buffers.get(session, ()))
+            else:
+                records = sorted(
+                    (r for buffer in self._buffers.values() for r in buffer), key=lambda r: r["ts"]
+                )
+        if kind is not None:
+            records = [r for r in records if r["kind"] == kind]
+        if limit is not None:
+            records = records[-limit:]
+        return records
+
+    def close(self) -> None:
+        pass
+
+
+class PrometheusSink:
+    """
+    Aggregates records into Prometheus metrics.
+
+    Exposes a per-kind call counter, a latency histogram and token counters
+    in the text exposition format. With a path, the metrics are also written
+    there (at most every write_interval seconds and on close) for a
+    node_exporter textfile collector.
+    """
+
+    def __init__(self, path: Optional[str] = None, prefix: str = "create_w_ai", write_interval: float = 10.0):
+        """
+        Args:
+            path: Optional .prom file the metrics are written to
+            prefix: Metric name prefix
+            write_interval: Minimum seconds between file writes
+        """
+        self.path = path
+        self.prefix = prefix
+        self.write_interval = write_interval
+        self._lock = threading.Lock()
+        self._calls: Dict[Tuple[str, str], int] = {}
+        self._buckets: Dict[str, List[int]] = {}
+        self._latency: Dict[str, List[float]] = {}
+        self._tokens: Dict[Tuple[str, str], int] = {}
+        self._last_write = 0.0
+
+    def emit(self, record: Dict[str, Any]) -> None:
+        kind = record["kind"]
+        wall = record.get("wall_s")
+        with self._lock:
+            key = (kind, record.get("status", "ok"))
+            self._calls[key] = self._calls.get(key, 0) + 1
+            if wall is not None:
+                buckets = self._buckets.setdefault(kind, [0] * len(LATENCY_BUCKETS))
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if wall <= bound:
+                        buckets[i] += 1
+                latency = self._latency.setdefault(kind, [0.0, 0])
+                latency[0] += wall
+                latency[1] += 1
+            for field in TOKEN_FIELDS:
+                if record.get(field):
+                    key = (kind, field[: -len("_tokens")])
+                    self._tokens[key] = self._tokens.get(key, 0) + record[field]
+
+        if self.path and time.monotonic() - self._last_write >= self.write_interval:
+            self.write()
+
+    def render(self) -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_calls_total Instrumented calls by kind and status.",
+            f"# TYPE {p}_calls_total counter",
+        ]
+        with self._lock:
+            for (kind, status), count in sorted(self._calls.items()):
+                lines.append(f'{p}_calls_total{{kind="{kind}",status="{status}"}} {count}')
+
+            lines.append(f"# HELP {p}_call_duration_seconds Wall time of instrumented calls.")
+            lines.append(f"# TYPE {p}_call_duration_seconds histogram")
+            for kind in sorted(self._buckets):
+                for bound, count in zip(LATENCY_BUCKETS, self._buckets[kind]):
+                    lines.append(f'{p}_call_duration_seconds_bucket{{kind="{kind}",le="{bound}"}} {count}')
+                total, count = self._latency[kind]
+                lines.append(f'{p}_call_duration_seconds_bucket{{kind="{kind}",le="+Inf"}} {count}')
+                lines.append(f'{p}_call_duration_seconds_sum{{kind="{kind}"}} {total:.6f}')
+                lines.append(f'{p}_call_duration_seconds_count{{kind="{kind}"}} {count}')
+
+            lines.append(f"# HELP {p}_tokens_total LLM tokens by kind and type.")
+            lines.append(f"# TYPE {p}_tokens_total counter")
+            for (kind, token_type), count in sorted(self._tokens.items()):
+                lines.append(f'{p}_tokens_total{{kind="{kind}",type="{token_type}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write(self) -> None:
+        """Atomically replace the metrics file."""
+        self._last_write = time.monotonic()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.path)
+
+    def close(self) -> None:
+        if self.path:
+            self.write()
+
+
+class Telemetry:
+    """Fans structured call records out to a set of sinks."""
+
+    def __init__(self, sinks: Optional[List[Any]] = None):
+        """
+        Args:
+            sinks: Objects with emit(record) and close() methods
+        """
+        self.sinks = list(sinks or [])
+
+    def add_sink(self, sink: Any) -> None:
+        self.sinks.append(sink)
+
+    def find_sink(self, sink_type: type) -> Any:
+        """Return the first sink of the given type, or None."""
+        for sink in self.sinks:
+            if isinstance(sink, sink_type):
+                return sink
+        return None
+
+    def emit(self, kind: str, **fields: Any) -> Dict[str, Any]:
+        """
+        Emit one record.
+
+        Args:
+            kind: Record kind, e.g. "llm" or "apps_http"
+            **fields: Record fields
+
+        Returns:
+            The emitted record
+        """
+        record = {"kind": kind, "ts": time.time(), "session": current_session.get(), **fields}
+        for sink in self.sinks:
+            try:
+                sink.emit(record)
+            except Exception as e:
+                # Telemetry must never break the call it describes
+                print(f"Error emitting telemetry to {type(sink).__name__}: {e}")
+        return record
+
+    @contextmanager
+    def span(self, kind: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Time a block and emit one record for it.
+
+        The block can add fields to the yielded dict. wall_s and status
+        ("ok", "error" or "cancelled") are filled in when the block exits.
+
+        Args:
+            kind: Record kind
+            **fields: Initial record fields
+        """
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            yield fields
+        except (GeneratorExit, KeyboardInterrupt):
+            status = "cancelled"
+            raise
+        except BaseException as e:
+            # asyncio.CancelledError is a BaseException since Python 3.8
+            status = "cancelled" if type(e).__name__ == "CancelledError" else "error"
+            if status == "error":
+                fields.setdefault("error", str(e))
+            raise
+        finally:
+            fields["wall_s"] = round(time.perf_counter() - started, 6)
+            fields.setdefault("status", status)
+            self.emit(kind, **fields)
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
+
+
+_default_telemetry = None
+_default_lock = threading.Lock()
+
+
+def get_telemetry() -> Telemetry:
+    """
+    Return the process-wide telemetry.
+
+    It always keeps in-memory ring buffers (TELEMETRY_BUFFER_SIZE records per
+    session, default 1000, for up to TELEMETRY_BUFFER_SESSIONS sessions,
+    default 64) and Prometheus aggregates, and also writes JSONL to
+    TELEMETRY_JSONL_PATH and a .prom file to TELEMETRY_PROMETHEUS_PATH when
+    those variables are set.
+    """
+    global _default_telemetry
+    if _default_telemetry is None:
+        with _default_lock:
+            if _default_telemetry is None:
+                sinks: List[Any] = [
+                    RingBufferSink(
+                        int(os.getenv("TELEMETRY_BUFFER_SIZE", "1000")),
+                        int(os.getenv("TELEMETRY_BUFFER_SESSIONS", "64")),
+                    ),
+                    PrometheusSink(os.getenv("TELEMETRY_PROMETHEUS_PATH") or None),
+                ]
+                if os.getenv("TELEMETRY_JSONL_PATH"):
+                    sinks.append(JsonlSink(os.getenv("TELEMETRY_JSONL_PATH")))
+                _default_telemetry = Telemetry(sinks)
+                atexit.register(_default_telemetry.close)
+    return _default_telemetry
@@ -0,0 +1,49 @@
+import json
+
+from bulk_deploy import load_deployments, validate_deployments
+
+
+def write_jsonl(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records), encoding="utf-8")
+
+
+def test_jsonl_records_without_a_name_are_rejected(tmp_path):
+    path = tmp_path / "specs.jsonl"
+    write_jsonl(
+        path,
+        [
+            {"agent_config": {}},
+            {"spec": {"agent_config": {}}},
+            {"id": "", "status": "ok", "spec": {"agent_config": {}}},
+        ],
+    )
+
+    deployments = load_deployments(str(path))
+
+    assert [d["app_name"] for d in deployments] == [None, None, None]
+    assert [d["source"] for d in deployments] == ["specs.jsonl:1", "specs.jsonl:2", "specs.jsonl:3"]
+    assert validate_deployments(deployments) == {i: "record has no app_name" for i in range(3)}
+
+
+def test_jsonl_names_come_from_the_record(tmp_path):
+    path = tmp_path / "specs.jsonl"
+    write_jsonl(
+        path,
+        [
+            {"app_name": "support-bot", "app_id": "app-1", "spec": {}},
+            {"id": 7, "status": "ok", "spec": {}},
+            {"id": 8, "status": "error", "error": "timeout"},
+        ],
+    )
+
+    deployments = load_deployments(str(path))
+
+    assert [(d["app_name"], d["app_id"]) for d in deployments] == [("support-bot", "app-1"), ("7", None)]
+
+
+def test_directory_specs_are_named_after_their_files(tmp_path):
+    (tmp_path / "billing.json").write_text('{"agent_config": {}}', encoding="utf-8")
+
+    deployments = load_deployments(str(tmp_path))
+
+    assert deployments == [{"app_name": "billing", "app_id": None, "spec": {"agent_config": {}}, "source": "billing.json"}]
@@ -0,0 +1,102 @@
+import threading
+import time
+import types
+
+import pytest
+
+import claude_client
+import single_flight
+from claude_client import ClaudeClient, ClaudeTransport
+from request_policy import Endpoint, RequestPolicy
+from single_flight import SingleFlight
+from telemetry import current_session
+
+REPLY = "The reply, streamed in a few pieces."
+
+
+class FakeLiteLLM:
+    """Streams REPLY in slow pieces and counts the requests it receives."""
+
+    def __init__(self):
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def completion(self, client=None, stream=False, **params):
+        with self._lock:
+            self.requests += 1
+
+        def chunk(content, finish_reason=None, usage=None):
+            return types.SimpleNamespace(
+                choices=[types.SimpleNamespace(finish_reason=finish_reason, delta=types.SimpleNamespace(content=content))],
+                usage=usage,
+            )
+
+        def chunks():
+            for i in range(0, len(REPLY), 8):
+                time.sleep(0.02)
+                yield chunk(REPLY[i : i + 8])
+            usage = types.SimpleNamespace(prompt_tokens=10, completion_tokens=5)
+            yield chunk(None, "stop", usage)
+
+        return chunks()
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = FakeLiteLLM()
+    monkeypatch.setattr(claude_client, "_litellm", fake)
+    monkeypatch.setattr(single_flight, "_default_flight", SingleFlight())
+    return fake
+
+
+@pytest.fixture
+def transport():
+    policy = RequestPolicy([Endpoint("model", api_base="http://unused")], hedge_percentile=0)
+    transport = ClaudeTransport(provider="openai", api_key="unused", model="model", policy=policy)
+    transport._http_handler = object()
+    return transport
+
+
+def stream_concurrently(transport, sessions):
+    """Stream the same message from one client per session at once; returns the replies and usages."""
+    results = [None] * len(sessions)
+
+    def run(i):
+        current_session.set(sessions[i])
+        client = ClaudeClient(transport=transport)
+        results[i] = ("".join(client.stream_message("Hello", "system")), client.last_usage)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(sessions))]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_identical_streams_in_one_session_share_one_request(llm, transport):
+    results = stream_concurrently(transport, ["session-1"] * 3)
+
+    assert llm.requests == 1
+    assert [reply for reply, _ in results] == [REPLY] * 3
+    # Callers sharing the stream record the usage of the request that was sent
+    assert all(usage["output_tokens"] == 5 for _, usage in results)
+
+
+def test_streams_of_different_sessions_are_not_shared(llm, transport):
+    results = stream_concurrently(transport, ["session-1", "session-2"])
+
+    assert llm.requests == 2
+    assert [reply for reply, _ in results] == [REPLY] * 2
+
+
+def test_streams_bypassing_the_cache_are_not_shared(llm, transport):
+    token = current_session.set("session-1")
+    try:
+        for _ in range(2):
+            client = ClaudeClient(transport=transport)
+            assert "".join(client.stream_message("Hello", "system", use_cache=False)) == REPLY
+    finally:
+        current_session.reset(token)
+    assert llm.requests == 2
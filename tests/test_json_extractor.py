@@ -0,0 +1,43 @@
+from json_extractor import JsonExtractor, extract_json, find_json_object
+
+SPEC = '{"agent_config": {"states": {"Greeting": {"instructions": "Say {hello} and \\"bye\\"}"}}}}'
+
+
+def test_bare_object():
+    assert extract_json('  {"a": 1}\n') == {"a": 1}
+
+
+def test_fenced_object():
+    assert extract_json('```json\n{"a": [1, 2]}\n```') == {"a": [1, 2]}
+
+
+def test_prose_wrapped_object():
+    text = 'Here is the spec {as requested}:\n' + SPEC + '\nLet me know if {anything} should change. }'
+    found = find_json_object(text)
+    assert found is not None
+    parsed, start, end = found
+    assert parsed["agent_config"]["states"]["Greeting"]["instructions"] == 'Say {hello} and "bye"}'
+    assert text[start:end] == SPEC
+
+
+def test_braces_inside_strings():
+    assert extract_json('{"a": "}{", "b": {"c": "{"}}') == {"a": "}{", "b": {"c": "{"}}
+
+
+def test_truncated_object_is_not_replaced_by_a_nested_one():
+    assert extract_json('Sure: {"agent_config": {"states": {"Greeting": {"next": "End"}}') is None
+    assert extract_json('{"a": "unterminated') is None
+
+
+def test_no_object():
+    assert extract_json("No JSON here, only {placeholders}.") is None
+
+
+def test_streaming_reports_the_object_when_it_closes():
+    extractor = JsonExtractor()
+    chunks = ['Thinking... {"handoff": tr', 'ue, "note": "a } in', ' a string"}', " trailing prose"]
+    results = [extractor.feed(chunk) for chunk in chunks]
+    assert results[:2] == [None, None]
+    assert results[2] == {"handoff": True, "note": "a } in a string"}
+    assert extractor.done
+
@@ -0,0 +1,101 @@
+import pytest
+
+from json_patch import JsonPatchError, apply_patch, parse_pointer
+
+
+@pytest.fixture
+def doc():
+    return {"name": "bot", "states": {"Greeting": {"next": ["Verify"]}}, "tags": ["a", "b"], "a/b": 1, "m~n": 2}
+
+
+def test_add(doc):
+    patched = apply_patch(doc, [
+        {"op": "add", "path": "/company", "value": "Acme"},
+        {"op": "add", "path": "/tags/1", "value": "x"},
+        {"op": "add", "path": "/tags/-", "value": "z"},
+    ])
+    assert patched["company"] == "Acme"
+    assert patched["tags"] == ["a", "x", "b", "z"]
+
+
+def test_remove(doc):
+    patched = apply_patch(doc, [{"op": "remove", "path": "/tags/0"}, {"op": "remove", "path": "/name"}])
+    assert patched["tags"] == ["b"]
+    assert "name" not in patched
+
+
+def test_replace(doc):
+    patched = apply_patch(doc, [{"op": "replace", "path": "/states/Greeting/next/0", "value": "End"}])
+    assert patched["states"]["Greeting"]["next"] == ["End"]
+
+
+def test_move_and_copy(doc):
+    patched = apply_patch(doc, [
+        {"op": "copy", "from": "/states/Greeting", "path": "/states/Welcome"},
+        {"op": "move", "from": "/name", "path": "/title"},
+    ])
+    assert patched["states"]["Welcome"] == {"next": ["Verify"]}
+    assert patched["states"]["Welcome"] is not patched["states"]["Greeting"]
+    assert patched["title"] == "bot"
+    assert "name" not in patched
+
+
+def test_escaped_pointer_tokens(doc):
+    assert parse_pointer("/a~1b") == ["a/b"]
+    patched = apply_patch(doc, [{"op": "replace", "path": "/a~1b", "value": 3}, {"op": "remove", "path": "/m~0n"}])
+    assert patched["a/b"] == 3
+    assert "m~n" not in patched
+
+
+def test_original_is_not_modified(doc):
+    apply_patch(doc, [{"op": "add", "path": "/states/Greeting/next/-", "value": "End"}])
+    assert doc["states"]["Greeting"]["next"] == ["Verify"]
+
+
+def test_passing_test_op(doc):
+    assert apply_patch(doc, [{"op": "test", "path": "/tags", "value": ["a", "b"]}]) == doc
+
+
+def test_failing_test_op_applies_nothing(doc):
+    patch = [
+        {"op": "replace", "path": "/name", "value": "other"},
+        {"op": "test", "path": "/name", "value": "bot"},
+    ]
+    with pytest.raises(JsonPatchError, match="test failed"):
+        apply_patch(doc, patch)
+    assert doc["name"] == "bot"
+
+
+@pytest.mark.parametrize(
+    "operation",
+    [
+        {"op": "remove", "path": "/missing"},
+        {"op": "replace", "path": "/states/Missing/next", "value": 1},
+        {"op": "add", "path": "/tags/5", "value": "x"},
+        {"op": "add", "path": "/tags/01", "value": "x"},
+        {"op": "remove", "path": "/tags/-"},
+        {"op": "add", "path": "/name/first", "value": "x"},
+        {"op": "add", "path": "name", "value": "x"},
+        {"op": "remove", "path": ""},
+        {"op": "move", "from": "/states", "path": "/states/Greeting/inner"},
+    ],
+)
+def test_bad_paths(doc, operation):
+    with pytest.raises(JsonPatchError):
+        apply_patch(doc, [operation])
+
+
+@pytest.mark.parametrize(
+    "patch",
+    [
+        {"op": "add", "path": "/x", "value": 1},
+        [{"op": "rename", "path": "/name"}],
+        [{"op": "add", "path": "/x"}],
+        [{"op": "copy", "path": "/x"}],
+        [{"path": "/x", "value": 1}],
+        ["add /x"],
+    ],
+)
+def test_malformed_patches(doc, patch):
+    with pytest.raises(JsonPatchError):
+        apply_patch(doc, patch)
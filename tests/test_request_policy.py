@@ -0,0 +1,162 @@
+import threading
+import time
+
+import pytest
+
+from request_policy import (
+    AttemptAbandoned,
+    CircuitBreaker,
+    Endpoint,
+    LLMError,
+    LLMUnavailableError,
+    RequestPolicy,
+    attempt_abandoned,
+)
+
+PRIMARY = Endpoint("model", location="primary")
+SECONDARY = Endpoint("model", location="secondary")
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def test_breaker_opens_after_repeated_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A failed trial re-opens the circuit, a successful one closes it
+    breaker.record_failure()
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_fails_over_on_server_error():
+    policy = RequestPolicy([PRIMARY, SECONDARY], hedge_percentile=0)
+    timing = {}
+
+    def call(endpoint):
+        if endpoint is PRIMARY:
+            raise StatusError(503)
+        return endpoint.name
+
+    assert policy.run(call, timing) == SECONDARY.name
+    assert timing == {"hedged": False, "failovers": 1, "endpoint": SECONDARY.name}
+    assert policy.stats[PRIMARY.name]["failures"] == 1
+
+
+def test_open_circuit_skips_the_endpoint():
+    policy = RequestPolicy([PRIMARY, SECONDARY], hedge_percentile=0, failure_threshold=1)
+    called = []
+
+    def call(endpoint):
+        called.append(endpoint)
+        if endpoint is PRIMARY:
+            raise StatusError(500)
+        return "ok"
+
+    policy.run(call)
+    policy.run(call)
+    assert called == [PRIMARY, SECONDARY, SECONDARY]
+    assert policy.available() == [SECONDARY]
+
+
+def test_no_failover_on_bad_request():
+    policy = RequestPolicy([PRIMARY, SECONDARY], hedge_percentile=0)
+    called = []
+
+    def call(endpoint):
+        called.append(endpoint)
+        raise StatusError(400)
+
+    with pytest.raises(LLMError) as raised:
+        policy.run(call)
+    assert not isinstance(raised.value, LLMUnavailableError)
+    assert called == [PRIMARY]
+    # The endpoint answered, so its circuit stays closed
+    assert policy.breakers[PRIMARY].state == "closed"
+
+
+def test_every_endpoint_failing_is_unavailable():
+    policy = RequestPolicy([PRIMARY, SECONDARY], hedge_percentile=0)
+
+    def call(endpoint):
+        raise StatusError(502)
+
+    with pytest.raises(LLMUnavailableError) as raised:
+        policy.run(call)
+    assert len(raised.value.errors) == 2
+
+
+def test_nothing_to_race_runs_on_the_callers_thread():
+    policy = RequestPolicy([PRIMARY, SECONDARY], hedge_percentile=0)
+    assert policy.run(lambda endpoint: threading.current_thread()) is threading.current_thread()
+
+
+def test_hedge_wins_over_a_slow_endpoint():
+    policy = RequestPolicy([PRIMARY, SECONDARY], timeout=5)
+    policy.hedge_delay = lambda endpoint, kind: 0.05
+    timing = {}
+
+    def call(endpoint):
+        time.sleep(0.5 if endpoint is PRIMARY else 0.01)
+        return endpoint.name
+
+    assert policy.run(call, timing) == SECONDARY.name
+    assert timing["hedged"] is True
+    assert policy.stats[SECONDARY.name]["hedges"] == 1
+
+
+def test_timing_accumulates_across_calls_sharing_a_record():
+    policy = RequestPolicy([PRIMARY, SECONDARY], hedge_percentile=0)
+    timing = {"hedged": True}
+
+    def call(endpoint):
+        if endpoint is PRIMARY:
+            raise StatusError(503)
+        return "ok"
+
+    policy.run(call, timing)
+    policy.run(call, timing)
+    assert timing["hedged"] is True
+    assert timing["failovers"] == 2
+
+
+def test_abandoned_hedge_is_not_held_against_its_endpoint():
+    policy = RequestPolicy([PRIMARY, SECONDARY], timeout=5)
+    policy.hedge_delay = lambda endpoint, kind: 0.02
+    sent = []
+
+    def call(endpoint):
+        if endpoint is SECONDARY:
+            # Waits for a connection slot until the primary has answered
+            time.sleep(0.2)
+            if attempt_abandoned():
+                raise AttemptAbandoned()
+        sent.append(endpoint)
+        time.sleep(0.05)
+        return endpoint.name
+
+    assert policy.run(call) == PRIMARY.name
+    time.sleep(0.3)
+    assert sent == [PRIMARY]
+    assert policy.stats[SECONDARY.name]["failures"] == 0
+    assert policy.breakers[SECONDARY].state == "closed"
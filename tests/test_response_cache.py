@@ -0,0 +1,30 @@
+from response_cache import ResponseCache
+
+
+def test_disk_tier_is_trimmed_below_its_limits(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.db"), max_memory_entries=2, max_disk_entries=10)
+    for i in range(25):
+        cache.set(f"key-{i}", "x" * 10)
+
+    stats = cache.stats()
+    assert stats["disk_entries"] <= 10
+    # Running totals match the table
+    assert (cache._disk_entries, cache._disk_bytes) == (stats["disk_entries"], stats["disk_bytes"])
+    # The most recent entries survive
+    assert cache.get("key-24") == "x" * 10
+    assert cache.get("key-0") is None
+
+
+def test_running_totals_follow_replacements_and_survive_reopening(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(path, max_disk_bytes=100)
+    cache.set("a", "x" * 40)
+    cache.set("a", "x" * 60)
+    cache.set("b", "x" * 50)
+
+    # Replacing "a" freed its old size; "b" pushed the total over 100 bytes
+    assert cache.stats()["disk_bytes"] == 50
+    assert (cache._disk_entries, cache._disk_bytes) == (1, 50)
+
+    reopened = ResponseCache(path, max_disk_bytes=100)
+    assert (reopened._disk_entries, reopened._disk_bytes) == (1, 50)
@@ -0,0 +1,147 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from single_flight import SingleFlight, flight_key
+
+
+def test_flight_key_ignores_key_order():
+    assert flight_key("op", {"a": 1, "b": [1, 2]}) == flight_key("op", {"b": [1, 2], "a": 1})
+    assert flight_key("op", {"a": 1}) != flight_key("other", {"a": 1})
+
+
+def test_concurrent_calls_join_one_run():
+    flight = SingleFlight(memo_ttl=0)
+    runs = []
+
+    def work():
+        runs.append(1)
+        time.sleep(0.2)
+        return {"id": len(runs)}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: flight.run("create_app", {"app": 1}, work), range(8)))
+
+    assert len(runs) == 1
+    assert all(result == {"id": 1} for result, _ in results)
+    assert sum(shared for _, shared in results) == 7
+    assert flight.get_stats()["create_app"] == {"calls": 8, "runs": 1, "coalesced": 7, "memo_hits": 0, "errors": 0}
+
+
+def test_result_is_memoized_for_the_ttl():
+    flight = SingleFlight(memo_ttl=0.2)
+    runs = []
+
+    def work():
+        runs.append(1)
+        return len(runs)
+
+    assert flight.run("op", 1, work) == (1, False)
+    assert flight.run("op", 1, work) == (1, True)
+    time.sleep(0.25)
+    assert flight.run("op", 1, work) == (2, False)
+    assert flight.get_stats()["op"]["memo_hits"] == 1
+
+
+def test_errors_reach_waiters_and_are_not_memoized():
+    flight = SingleFlight(memo_ttl=10)
+    errors = []
+
+    def fail():
+        time.sleep(0.1)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flight.run("op", 1, fail)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == ["boom"] * 3
+    assert flight.get_stats()["op"]["errors"] == 1
+    # The next call runs again instead of getting the failure
+    assert flight.run("op", 1, lambda: "ok") == ("ok", False)
+
+
+def test_waiter_takes_over_an_abandoned_call():
+    flight = SingleFlight(memo_ttl=0)
+    outcome = []
+
+    def interrupted():
+        time.sleep(0.1)
+        raise KeyboardInterrupt
+
+    def leader():
+        try:
+            flight.run("op", 1, interrupted)
+        except KeyboardInterrupt:
+            outcome.append("interrupted")
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    time.sleep(0.02)
+    result = flight.run("op", 1, lambda: "ran here")
+    thread.join()
+
+    assert outcome == ["interrupted"]
+    assert result == ("ran here", False)
+    # The waiter's call is counted once although it ran after waiting
+    assert flight.get_stats()["op"]["calls"] == 2
+
+
+def test_memo_is_bounded():
+    flight = SingleFlight(memo_ttl=10, max_memoized=2)
+    for i in range(3):
+        flight.run("op", i, lambda: i)
+    with pytest.raises(RuntimeError):
+        flight.run("op", 0, lambda: (_ for _ in ()).throw(RuntimeError("evicted, so it runs")))
+    assert flight.run("op", 2, lambda: "not run") == (2, True)
+
+
+def test_stream_is_passed_on_live_and_replayed_to_waiters():
+    flight = SingleFlight(memo_ttl=10)
+    runs = []
+
+    def items():
+        runs.append(1)
+        for item in "abc":
+            time.sleep(0.05)
+            yield item
+
+    def consume():
+        return list(flight.stream("op", 1, items, "".join, lambda result: [result]))
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        results = list(pool.map(lambda _: consume(), range(3)))
+
+    assert len(runs) == 1
+    assert sorted(results) == [["a", "b", "c"], ["abc"], ["abc"]]
+    # Memoized like run()
+    assert consume() == ["abc"]
+
+
+def test_stream_abandoned_midway_is_run_by_a_waiter():
+    flight = SingleFlight(memo_ttl=0)
+
+    def items():
+        yield from "abc"
+        time.sleep(0.1)
+
+    leader = flight.stream("op", 1, items, "".join, lambda result: [result])
+    assert next(leader) == "a"
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(list(flight.stream("op", 1, items, "".join, lambda r: [r]))))
+    waiter.start()
+    time.sleep(0.05)
+    leader.close()
+    waiter.join()
+
+    assert results == [["a", "b", "c"]]
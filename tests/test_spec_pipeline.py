@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+from claude_client import LLMError, LLMTimeoutError
+import spec_pipeline
+from spec_pipeline import edit_spec_with_patch, generate_spec_candidates, parse_patch, stream_first_spec
+
+
+class FakeClient:
+    """Stands in for ClaudeClient: complete() and stream_message() return a fixed reply or raise."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.last_usage = {}
+        self.history = []
+        self.cleared = False
+
+    def complete(self, messages, system_prompt=None, max_tokens=None):
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        return self.reply
+
+    def stream_message(self, message, system_prompt=None, max_tokens=None):
+        if isinstance(self.reply, Exception):
+            raise self.reply
+        yield from (self.reply[:5], self.reply[5:])
+
+    def add_message(self, role, content):
+        self.history.append((role, content))
+
+    def clear_history(self):
+        self.cleared = True
+        self.history = []
+
+
+class FailedSpeculation:
+    """Stands in for a committed SpeculativeSpec whose background call failed after one chunk."""
+
+    def __init__(self):
+        self.client = FakeClient("unused")
+        self.system_prompt = ["speculative system"]
+
+    def stream(self):
+        yield '{"agent_'
+        raise LLMError("connection reset")
+
+
+def test_parse_bare_patch():
+    assert parse_patch('[{"op": "remove", "path": "/a"}]') == [{"op": "remove", "path": "/a"}]
+
+
+def test_parse_patch_amid_prose_brackets():
+    reply = 'See note [1]. Patch:\n```json\n[{"op": "add", "path": "/a", "value": "x]"}]\n```\nDone [ok].'
+    assert parse_patch(reply) == [{"op": "add", "path": "/a", "value": "x]"}]
+
+
+def test_parse_wrapped_patch():
+    assert parse_patch('{"patch": [{"op": "remove", "path": "/b"}]}') == [{"op": "remove", "path": "/b"}]
+
+
+@pytest.mark.parametrize("reply", ['[{"op": "remove", "path": "/a"}, {"op": "add"', "No change needed [yet]."])
+def test_parse_no_patch(reply):
+    assert parse_patch(reply) is None
+
+
+def test_patch_that_does_not_apply_falls_back():
+    client = FakeClient('[{"op": "remove", "path": "/missing"}]')
+    spec, outcome = edit_spec_with_patch(client, {"a": 1}, "drop it", ["system"])
+    assert spec is None
+    assert outcome.startswith("apply_failed")
+    assert client.history == []
+
+
+def test_llm_errors_are_raised_not_turned_into_a_fallback():
+    with pytest.raises(LLMTimeoutError):
+        edit_spec_with_patch(FakeClient(LLMTimeoutError("slow")), {"a": 1}, "change", ["system"])
+
+
+def test_failed_speculation_falls_back_to_a_fresh_spec_request():
+    client = FakeClient('{"agent_config": {}}')
+    client.history = [("user", "discovery")]
+    rendered = []
+
+    def render(deltas):
+        rendered.append("")
+        for delta in deltas:
+            rendered[-1] += delta
+        return rendered[-1]
+
+    reply, spec_client, system_prompt = stream_first_spec("{}", client, render, speculation=FailedSpeculation())
+
+    assert reply == '{"agent_config": {}}'
+    # The partial speculative reply was rendered, then replaced
+    assert rendered == ['{"agent_', '{"agent_config": {}}']
+    assert spec_client is client
+    assert client.cleared and client.history == []
+    assert system_prompt != ["speculative system"]
+
+
+class FakeAsyncClient:
+    """Stands in for AsyncClaudeClient: the n-th complete() call returns the n-th reply."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+
+    async def complete(self, messages, system_prompt=None, use_cache=True, max_tokens=None):
+        return self.replies.pop(0)
+
+
+def test_a_candidate_whose_scoring_raises_fails_alone(monkeypatch):
+    def score_spec(spec):
+        if spec == {"broken": True}:
+            raise ImportError("validator unavailable")
+        return {"valid": True, "score": 100.0, "errors": [], "warnings": []}
+
+    monkeypatch.setattr(spec_pipeline, "score_spec", score_spec)
+    client = FakeAsyncClient(['{"broken": true}', '{"agent_config": {}}'])
+
+    selection = asyncio.run(generate_spec_candidates(client, "{}", ["system"], candidates=2))
+
+    assert selection["spec"] == {"agent_config": {}}
+    assert selection["valid"] and selection["finished"] == 2
+    failed = next(s for s in selection["scores"] if s["index"] == 0)
+    assert failed["score"] == -1000.0 and not failed["valid"]
@@ -0,0 +1,44 @@
+from telemetry import RingBufferSink, Telemetry, current_session
+
+
+def emit_in(telemetry, session, count, kind="llm"):
+    token = current_session.set(session)
+    try:
+        for i in range(count):
+            telemetry.emit(kind, n=i)
+    finally:
+        current_session.reset(token)
+
+
+def test_a_busy_session_does_not_evict_another():
+    sink = RingBufferSink(max_records=10)
+    telemetry = Telemetry([sink])
+
+    emit_in(telemetry, "quiet", 3)
+    emit_in(telemetry, "busy", 50, kind="apps_http")
+
+    assert [r["n"] for r in sink.records(kind="llm", session="quiet")] == [0, 1, 2]
+    assert len(sink.records(session="busy")) == 10
+
+
+def test_records_of_every_session_are_merged_oldest_first():
+    sink = RingBufferSink()
+    telemetry = Telemetry([sink])
+    emit_in(telemetry, "a", 1)
+    emit_in(telemetry, None, 1)
+    emit_in(telemetry, "b", 1)
+
+    assert [r["session"] for r in sink.records()] == ["a", None, "b"]
+    assert [r["session"] for r in sink.records(limit=1)] == ["b"]
+
+
+def test_least_recently_active_sessions_are_dropped():
+    sink = RingBufferSink(max_sessions=2)
+    telemetry = Telemetry([sink])
+    emit_in(telemetry, "a", 1)
+    emit_in(telemetry, "b", 1)
+    emit_in(telemetry, "a", 1)
+    emit_in(telemetry, "c", 1)
+
+    assert sink.records(session="b") == []
+    assert len(sink.records(session="a")) == 2
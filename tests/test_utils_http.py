@@ -0,0 +1,160 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+import utils
+from benchmarks.stub_apps_server import StubAppsServer
+
+POOL_SIZE = 4
+BACKOFF_FACTOR = 0.05
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Stub apps server with utils pointed at it, a fresh session and an empty token cache."""
+    server = StubAppsServer(latency=0.01, seed=0).start()
+    monkeypatch.setattr(utils, "base_url", server.base_url)
+    monkeypatch.setattr(utils, "token_cache", utils.TokenCache(utils._login))
+    monkeypatch.setattr(utils, "_session", None)
+    monkeypatch.setenv("APPS_POOL_SIZE", str(POOL_SIZE))
+    monkeypatch.setenv("APPS_BACKOFF_FACTOR", str(BACKOFF_FACTOR))
+    monkeypatch.setenv("APPS_BACKOFF_JITTER", "0")
+    yield server
+    if utils._session is not None:
+        utils._session.close()
+    server.shutdown()
+    server.server_close()
+
+
+def apps_url(server, app_id=None):
+    url = f"{server.base_url}/api/app-authoring/orgs/{utils.org_id}/workspaces/{utils.workspace_id}/apps"
+    return f"{url}/{app_id}" if app_id else url
+
+
+def deploy_all(server, count):
+    def put(i):
+        return utils._send_authorized("PUT", apps_url(server, f"app-{i}"), {"app_name": f"app-{i}"}).status_code
+
+    # As many workers as pooled connections; the pool does not block, extra
+    # callers would open (and then discard) connections of their own
+    with ThreadPoolExecutor(max_workers=POOL_SIZE) as pool:
+        return list(pool.map(put, range(count)))
+
+
+def test_concurrent_deploys_reuse_connections(server):
+    assert deploy_all(server, 40) == [200] * 40
+    connections = server.counters["connections"]
+    assert connections <= POOL_SIZE
+
+    # A second burst is served entirely by the pooled keep-alive connections
+    assert deploy_all(server, 40) == [200] * 40
+    assert server.counters["connections"] == connections
+
+
+def test_one_login_per_token_lifetime(server, monkeypatch):
+    # Tokens are refreshed 60 s before expiry, so these are usable for 0.5 s
+    server.token_ttl = 60.5
+    monkeypatch.setattr(utils, "token_cache", utils.TokenCache(utils._login, refresh_margin=60))
+
+    deploy_all(server, 20)
+    assert server.counters["logins"] == 1
+
+    time.sleep(0.6)
+    deploy_all(server, 20)
+    assert server.counters["logins"] == 2
+    assert utils.token_cache.stats["refreshes"] == 2
+
+
+def test_401_refreshes_the_token_once_and_retries(server):
+    utils.get_token()
+    with server.lock:
+        # The server forgets every token, as after a restart
+        server.valid_tokens.clear()
+
+    response = utils._send_authorized("PUT", apps_url(server, "app-1"), {"app_name": "app-1"})
+
+    assert response.status_code == 200
+    assert server.counters["logins"] == 2
+    assert utils.token_cache.stats["invalidations"] == 1
+
+
+def test_post_503_is_retried_with_backoff(server):
+    utils.get_token()
+    server.error_rate = 1.0
+    server.reset_counters()
+
+    started = time.perf_counter()
+    with pytest.raises(requests.HTTPError) as raised:
+        utils._send_authorized("POST", apps_url(server), {"app_name": "app"})
+    elapsed = time.perf_counter() - started
+
+    assert raised.value.response.status_code == 503
+    # The first try and APPS_MAX_RETRIES (3) retries
+    assert server.counters["requests"] == 4
+    assert len(raised.value.response.raw.retries.history) == 3
+    # urllib3 sleeps 0, 2 and 4 times the backoff factor between them
+    assert elapsed >= 6 * BACKOFF_FACTOR
+
+
+def test_post_500_is_not_retried(server):
+    utils.get_token()
+    server.error_rate = 1.0
+    server.error_status = 500
+    server.reset_counters()
+
+    with pytest.raises(requests.HTTPError) as raised:
+        utils._send_authorized("POST", apps_url(server), {"app_name": "app"})
+
+    assert raised.value.response.status_code == 500
+    # The server may have created the app; a retry could create it twice
+    assert server.counters["requests"] == 1
+
+
+def test_put_500_is_retried(server):
+    utils.get_token()
+    server.error_rate = 1.0
+    server.error_status = 500
+    server.reset_counters()
+
+    with pytest.raises(requests.HTTPError):
+        utils._send_authorized("PUT", apps_url(server, "app-1"), {"app_name": "app-1"})
+
+    assert server.counters["requests"] == 4
+
+
+def test_slow_server_is_bounded_by_timeout_and_retry_budget(server, monkeypatch):
+    read_timeout = 0.2
+    monkeypatch.setattr(utils, "request_timeout", (1, read_timeout))
+    utils.get_token()
+    # Every app call hangs far longer than the read timeout
+    server.slow_rate = 1.0
+    server.slow_latency = 5.0
+    server.reset_counters()
+
+    started = time.perf_counter()
+    with pytest.raises(requests.RequestException):
+        utils._send_authorized("PUT", apps_url(server, "app-1"), {"app_name": "app-1"})
+    elapsed = time.perf_counter() - started
+
+    # The first try and 3 retries each time out; backoff adds 0, 2 and 4 factors
+    assert server.counters["requests"] == 4
+    budget = 4 * (read_timeout + server.latency) + 6 * BACKOFF_FACTOR
+    assert elapsed < budget + 0.5
+
+
+def test_slow_post_is_not_retried_after_a_read_timeout(server, monkeypatch):
+    monkeypatch.setattr(utils, "request_timeout", (1, 0.2))
+    utils.get_token()
+    server.slow_rate = 1.0
+    server.slow_latency = 5.0
+    server.reset_counters()
+
+    started = time.perf_counter()
+    with pytest.raises(requests.RequestException):
+        utils._send_authorized("POST", apps_url(server), {"app_name": "app"})
+
+    # The server may still create the app, so the request is not repeated
+    assert server.counters["requests"] == 1
+    assert time.perf_counter() - started < 0.2 + 0.5
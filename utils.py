@@ -1,53 +1,234 @@
-import requests
+import base64
+import copy
 import json
-from typing import Optional
-from pydantic import TypeAdapter
-from sarvam_datatypes import resource_id_from_name
-from sarvam_agents_sdk import LanguageName, ChannelType, LLMModelVariant, AppStatus, App, V2VApp
-from sarvam_datatypes import get_ist_datetime
+import os
+import threading
+import time
+from single_flight import get_single_flight
+from spec_validation import SpecValidationError, validate_spec
+from telemetry import get_telemetry
 
 
 
 org_id = "sarvamai"
 workspace_id = "default"
-
-def get_token():
-    url = "https://apps-qa.sarvam.ai/api/auth/login"
+base_url = os.getenv("APPS_BASE_URL", "https://apps-qa.sarvam.ai")
+
+# (connect, read) timeouts in seconds for the app-authoring API
+request_timeout = (
+    float(os.getenv("APPS_CONNECT_TIMEOUT", "5")),
+    float(os.getenv("APPS_READ_TIMEOUT", "30")),
+)
+
+
+class TokenCache:
+    """Thread-safe cache for the apps-qa bearer token."""
+
+    def __init__(self, fetch, refresh_margin=60, default_ttl=300):
+        """
+        Args:
+            fetch: Callable returning a fresh access token (without "Bearer ")
+            refresh_margin: Seconds before expiry at which the token is refreshed
+            default_ttl: Lifetime assumed when the token carries no exp claim
+        """
+        self.fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+        self.stats = {"hits": 0, "refreshes": 0, "invalidations": 0}
+
+    @staticmethod
+    def token_expiry(token):
+        """Read the exp claim of a JWT without verifying it. Returns None if absent."""
+        try:
+            payload = token.split(".")[1]
+            payload += "=" * (-len(payload) % 4)
+            return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+        except Exception:
+            return None
+
+    def get(self):
+        """Return a valid "Bearer ..." header value, refreshing it if needed."""
+        if self._token is not None and time.time() < self._expires_at - self.refresh_margin:
+            self.stats["hits"] += 1
+            return self._token
+
+        # Callers that arrive during a refresh wait here and reuse its result
+        with self._lock:
+            if self._token is not None and time.time() < self._expires_at - self.refresh_margin:
+                self.stats["hits"] += 1
+                return self._token
+
+            access_token = self.fetch()
+            self._expires_at = self.token_expiry(access_token) or time.time() + self.default_ttl
+            self._token = "Bearer " + access_token
+            self.stats["refreshes"] += 1
+            return self._token
+
+    def invalidate(self, token=None):
+        """Drop the cached token, unless it has already been replaced by a newer one."""
+        with self._lock:
+            if token is None or token == self._token:
+                self._token = None
+                self._expires_at = 0.0
+                self.stats["invalidations"] += 1
+
+
+def _apps_retry_class():
+    """
+    Define AppsRetry. Called when the first session is created, so importing
+    utils does not load urllib3.
+    """
+    from urllib3.util.retry import Retry
+
+    class AppsRetry(Retry):
+        """Retry policy for the app-authoring API.
+
+        GET and PUT are idempotent and are retried on 429, 5xx and read timeouts.
+        POST creates an app, so it is only retried when the server signals it did
+        not process the request. Connection errors are retried for every method.
+        """
+
+        POST_RETRY_STATUSES = frozenset([429, 503])
+
+        def is_retry(self, method, status_code, has_retry_after=False):
+            if method.upper() == "POST":
+                return status_code in self.POST_RETRY_STATUSES
+            return super().is_retry(method, status_code, has_retry_after)
+
+    return AppsRetry
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the shared keep-alive session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                retry = _apps_retry_class()(
+                    total=int(os.getenv("APPS_MAX_RETRIES", "3")),
+                    connect=2,
+                    backoff_factor=float(os.getenv("APPS_BACKOFF_FACTOR", "0.5")),
+                    backoff_jitter=float(os.getenv("APPS_BACKOFF_JITTER", "0.5")),
+                    backoff_max=10,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=frozenset(["GET", "PUT"]),
+                    respect_retry_after_header=True,
+                    raise_on_status=False,
+                )
+                pool_size = int(os.getenv("APPS_POOL_SIZE", "10"))
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _login():
+    url = f"{base_url}/api/auth/login"
     payload = {
     "org_id": "sarvamai",
     "user_id": "admin",
     "password": "leading-chamois"
     }
     
-    response = requests.post(url, json=payload)
+    response = get_session().post(url, json=payload, timeout=request_timeout)
     response.raise_for_status()
-    token = response.json()
-    token = "Bearer " + token["access_token"]
-    return token
+    return response.json()["access_token"]
+
+
+token_cache = TokenCache(_login)
+
+
+def get_token():
+    return token_cache.get()
+
+
+def _send_authorized(method, url, payload, operation=None):
+    """
+    Send an authenticated request, refreshing the token and retrying once on a 401.
+
+    Emits one "apps_http" telemetry record with the time spent getting a token
+    (auth_s), the time on the wire including urllib3 retries (http_s), the
+    final status and the retry count.
+    """
+    with get_telemetry().span("apps_http", operation=operation, method=method) as call:
+        started = time.perf_counter()
+        token = get_token()
+        auth_s = time.perf_counter() - started
+        http_s = 0.0
+        for attempt in range(2):
+            headers = {
+                "authorization": token,
+                "content-type": "application/json",
+            }
+            started = time.perf_counter()
+            response = get_session().request(method, url, headers=headers, json=payload, timeout=request_timeout)
+            http_s += time.perf_counter() - started
+            if response.status_code != 401 or attempt:
+                break
+            started = time.perf_counter()
+            token_cache.invalidate(token)
+            token = get_token()
+            auth_s += time.perf_counter() - started
+
+        retries = getattr(getattr(response.raw, "retries", None), "history", ())
+        call.update(
+            auth_s=round(auth_s, 6),
+            http_s=round(http_s, 6),
+            http_status=response.status_code,
+            auth_retries=attempt,
+            retries=len(retries),
+        )
+        response.raise_for_status()
+        return response
 
 
 def update_app(app_name, app_id, app_config):
-    # app_id = resource_id_from_name(app_name)
-    headers = {
-        "authorization": get_token(),   
-        "content-type": "application/json",
-    }
+    # A double click or rerun that repeats an update joins the one in flight
+    # (or reuses its result for a few seconds) instead of sending it again
+    result, _ = get_single_flight().run(
+        "update_app",
+        {"app_name": app_name, "app_id": app_id, "app_config": app_config},
+        lambda: _update_app(app_name, app_id, app_config),
+    )
+    return result
+
 
-    update_url = f"https://apps-qa.sarvam.ai/api/app-authoring/orgs/{org_id}/workspaces/{workspace_id}/apps/{app_id}"
+def _update_app(app_name, app_id, app_config):
+    # app_id = resource_id_from_name(app_name)
+    update_url = f"{base_url}/api/app-authoring/orgs/{org_id}/workspaces/{workspace_id}/apps/{app_id}"
     app_config = create_app_config(app_config, app_name, app_id)
     payload = {"app": app_config, "app_name": app_name}
-    response = requests.put(update_url, headers=headers, json=payload)
-    response.raise_for_status()
+    response = _send_authorized("PUT", update_url, payload, operation="update_app")
     return response.json()
 
 
 def create_app(app_name, app_config=None):
-    headers = {
-        "authorization": get_token(),
-        "content-type": "application/json",
-    }
-    
-    create_url = f"https://apps-qa.sarvam.ai/api/app-authoring/orgs/{org_id}/workspaces/{workspace_id}/apps"
+    # Repeating a create would make a duplicate app, so identical creates
+    # share one request
+    result, _ = get_single_flight().run(
+        "create_app",
+        {"app_name": app_name, "app_config": app_config},
+        lambda: _create_app(app_name, app_config),
+    )
+    return result
+
+
+def _create_app(app_name, app_config=None):
+    from sarvam_datatypes import resource_id_from_name
+
+    create_url = f"{base_url}/api/app-authoring/orgs/{org_id}/workspaces/{workspace_id}/apps"
     
     app_id = resource_id_from_name(app_name)
     payload = {"app_name": app_name}
@@ -58,68 +239,17 @@ def create_app(app_name, app_config=None):
         app_config = create_app_config(app_config, app_name, app_id)
         payload["app"] = app_config
     
-    response = requests.post(create_url, headers=headers, json=payload)
-    response.raise_for_status()
+    response = _send_authorized("POST", create_url, payload, operation="create_app")
     return response.json()
 
 
 def create_app_config(generated_app_config, app_name, app_id):
-
-    intro_message_config = {}
-    intro_message_config["audio"] = generated_app_config["intro_message"]
-    model_variant = LLMModelVariant.TOTA_V6.value
-    print("type(generated_app_config)", type(generated_app_config))
-    agent_config = generated_app_config["agent_config"]
-    agent_config["enable_structured_prompt"] = True
-
-    app_json = {
-            "language_config": {
-                "initial_language_name": LanguageName.HINDI.value,
-                "supported_languages": [LanguageName.HINDI.value],
-            },
-            "llm_config": {
-                "llm_model_variant": model_variant,
-                "agent_config": agent_config,
-            },
-            "intro_message_config": intro_message_config,
-            "channel_type": "v2v",
-        }
-    # print("App attributes:")
-    # print(f"App.__dict__: {App.__dict__}")
-    # print(f"App.__annotations__: {App.__annotations__}")
-    # print(f"App.__fields__: {App.__fields__}")
-    # print(f"App.model_fields: {App.model_fields}")
-
-    
-    try:
-        app = V2VApp(
-            **app_json,
-        )
-        return app.model_dump(mode="json")
-    except Exception as e:
-        import traceback
-        print("Full error traceback:")
-        print(traceback.format_exc())
-        print(f"Error type: {type(e).__name__}")
-        print(f"Error message: {str(e)}")
-        print(f"app_json keys: {list(app_json.keys())}")
-        print(f"app_json content: {app_json}")
-        raise
-
-    
-    
-    
-
-
-
-
-
-
-
-
-
-    
-
-
-
-
+    # Validation is memoized by spec content, so a spec already checked in the
+    # app is not validated again at deploy time
+    result = validate_spec(generated_app_config)
+    if not result["valid"]:
+        print(f"Invalid app config for {app_name}:")
+        for error in result["errors"]:
+            print(f"  {error['loc']}: {error['msg']}")
+        raise SpecValidationError(result["errors"])
+    return copy.deepcopy(result["app_config"])